@@ -139,7 +139,7 @@ if uploaded_file is not None:
         json_data = uploaded_file.read().decode('utf-8')
         template_file = os.path.join(current_dir, "app/template/Template_HemeSight.xlsx")
         if st.button('Run'):
-            output_stream, proteinpaint_path, disco_path = process_hemsight(
+            output_stream, proteinpaint_stream, disco_stream = process_hemsight(
                 analysis_type, json_data, template_file, date, normal_sample, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel
             )
             
@@ -156,7 +156,7 @@ if uploaded_file is not None:
             with col2:
                 st.download_button(
                     label="Download ProteinPaint Data",
-                    data=open(proteinpaint_path, 'rb').read(),
+                    data=proteinpaint_stream.getvalue(),
                     file_name=file_name + 'proteinpaint.tsv',
                     mime='text/tab-separated-values'
                 )
@@ -164,13 +164,13 @@ if uploaded_file is not None:
             with col3:
                 st.download_button(
                     label="Download Disco Data",
-                    data=open(disco_path, 'rb').read(),
+                    data=disco_stream.getvalue(),
                     file_name=file_name + 'disco.tsv',
                     mime='text/tab-separated-values'
                 )
             
             # ZIP file with all outputs
-            zip_buffer = create_zip_file(file_name, output_stream, proteinpaint_path, disco_path)
+            zip_buffer = create_zip_file(file_name, output_stream, proteinpaint_stream, disco_stream)
             
             # Bulk download button
             st.markdown("### 一括ダウンロード")
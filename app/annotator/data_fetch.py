@@ -5,10 +5,35 @@ import pandas as pd
 import requests
 import streamlit as st
 from bs4 import BeautifulSoup
+from utils.annotation_cache import annotation_cache
+from utils.compiled_db import open_compact_census, read_census
+from utils.clinvar_local import clinvar_store, use_local_clinvar
+from utils.frequency_local import frequency_store, local_frequency_mode
+from utils.reference_data import first_row_index, reference_registry, tp53_classes
 from .parameter import DBPaths, URLs, Constants
 
 
-def fetch_tommo_data(transcript_id, hgvs_p, alt, dbsnp):
+def fetch_tommo_data(transcript_id, hgvs_p, alt, dbsnp, variant=None):
+    """Fetch frequency information from ToMMo database (cached)"""
+    mode = local_frequency_mode()
+    if mode:
+        found = frequency_store.lookup(variant)
+        if found:
+            return f"{found[0]}: {round(found[1] * 100, 3)}%"
+        if mode == 'local':
+            return "-"
+
+    cache_key = f"{transcript_id}:{hgvs_p}|{alt}|{dbsnp}"
+    cached = annotation_cache.get('tommo/annotator', cache_key)
+    if cached is not None:
+        return cached
+    frequency = _fetch_tommo_data(transcript_id, hgvs_p, alt, dbsnp)
+    if frequency != "-":
+        annotation_cache.set('tommo/annotator', cache_key, frequency)
+    return frequency
+
+
+def _fetch_tommo_data(transcript_id, hgvs_p, alt, dbsnp):
     """Fetch frequency information from ToMMo database"""
     primary_keys = Constants.TOMMO_PRIMARY_KEYS
     fallback_key = Constants.TOMMO_FALLBACK_KEY
@@ -52,6 +77,19 @@ def fetch_tommo_data(transcript_id, hgvs_p, alt, dbsnp):
 
 
 def fetch_clinvar_data(transcript_id, hgvs_c, dbsnp):
+    """Fetch ClinVar data and pathogenicity using Entrez API (cached)"""
+    if use_local_clinvar():
+        return clinvar_store.lookup(transcript_id, hgvs_c, dbsnp)
+    cache_key = f"{transcript_id}:{hgvs_c}|{dbsnp}"
+    cached = annotation_cache.get('clinvar/annotator', cache_key)
+    if cached is not None:
+        return tuple(cached)
+    clinvar_data = _fetch_clinvar_data(transcript_id, hgvs_c, dbsnp)
+    annotation_cache.set('clinvar/annotator', cache_key, list(clinvar_data))
+    return clinvar_data
+
+
+def _fetch_clinvar_data(transcript_id, hgvs_c, dbsnp):
     """Fetch ClinVar data and pathogenicity using Entrez API"""
     if 'dup' in hgvs_c:
         hgvs_c = hgvs_c.split('dup')[0] + 'dup'
@@ -99,10 +137,8 @@ def fetch_tp53_data(position, ref, alt, gene_symbol):
         return 'Not TP53'
 
     try:
-        tp53_df = pd.read_csv(DBPaths.TP53_CSV, sep=',', encoding='utf-8')
-        tp53_df['TP53_GRCh38'] = tp53_df['g_description_GRCh38'].str.replace('g.', '', regex=False)
-        match = tp53_df[tp53_df['TP53_GRCh38'].str.contains(f"{position}{ref}>{alt}", na=False)]
-        return match.iloc[0]['TransactivationClass'] if not match.empty else 'NA'
+        classes = tp53_classes(position, ref, alt, genome='GRCh38', path=DBPaths.TP53_CSV)
+        return classes.get('TransactivationClass', 'NA')
     except Exception as e:
         st.warning(f"TP53データ取得エラー: {e}")
         return 'NA'
@@ -116,22 +152,40 @@ def fetch_role_tier(gene_symbol):
             st.warning("CGCファイルが見つかりません。")
             return None, None, None, None, None
 
-        cgc_df = pd.read_csv(cgc_path, sep='\t', encoding='utf-8')
-        match = cgc_df[cgc_df['GENE_SYMBOL'] == gene_symbol]
-        if not match.empty:
-            return (
-                match.iloc[0]['ROLE_IN_CANCER'],
-                str(match.iloc[0]['TIER']),
-                match.iloc[0]['TUMOUR_TYPES_SOMATIC'],
-                match.iloc[0]['TUMOUR_TYPES_GERMLINE'],
-                match.iloc[0]['CANCER_SYNDROME']
-            )
-        return None, None, None, None, None
+        cgc_index = reference_registry.load('annotator_cgc_index', cgc_path, _read_cgc_index)
+        return cgc_index.get(gene_symbol, (None, None, None, None, None))
     except Exception as e:
         st.warning(f"Cancer Gene Censusデータ取得エラー: {e}")
         return None, None, None, None, None
 
 
+def _read_cgc_index(path):
+    cgc_df = pd.read_csv(path, sep='\t', encoding='utf-8')
+    cgc_df = cgc_df.dropna(subset=['GENE_SYMBOL']).drop_duplicates(subset='GENE_SYMBOL', keep='first')
+    return {
+        row['GENE_SYMBOL']: (
+            row['ROLE_IN_CANCER'],
+            str(row['TIER']),
+            row['TUMOUR_TYPES_SOMATIC'],
+            row['TUMOUR_TYPES_GERMLINE'],
+            row['CANCER_SYNDROME']
+        )
+        for row in cgc_df.to_dict('records')
+    }
+
+
+def _read_cosmic_index(path):
+    """(gene, cDNA) / (gene, protein) -> first row position, plus the sample count columns"""
+    cosmic_df = read_census('cmc_alldata', path, Constants.COSMIC_COLUMNS)
+    cosmic_df['row'] = range(len(cosmic_df))
+    return (
+        first_row_index(cosmic_df, ['GENE_NAME', 'Mutation CDS'], 'row'),
+        first_row_index(cosmic_df, ['GENE_NAME', 'Mutation AA'], 'row'),
+        cosmic_df['COSMIC_SAMPLE_TESTED'].to_numpy(),
+        cosmic_df['COSMIC_SAMPLE_MUTATED'].to_numpy(),
+    )
+
+
 def fetch_cosmic_data(gene_symbol, hgvs_c, hgvs_p):
     """Fetch sample information from COSMIC database"""
     try:
@@ -140,15 +194,22 @@ def fetch_cosmic_data(gene_symbol, hgvs_c, hgvs_p):
             st.warning("COSMICファイルが見つかりません。")
             return None, None
 
-        cosmic_df = pd.read_csv(cosmic_path, sep='\t', compression='gzip', encoding='utf-8', low_memory=False)
-        match = cosmic_df[
-            (cosmic_df['GENE_NAME'] == gene_symbol) &
-            ((cosmic_df['Mutation CDS'] == hgvs_c) | (cosmic_df['Mutation AA'] == hgvs_p))
-        ]
-        return (
-            match.iloc[0]['COSMIC_SAMPLE_TESTED'] if not match.empty else None,
-            match.iloc[0]['COSMIC_SAMPLE_MUTATED'] if not match.empty else None
+        # コンパイル済みのインデックスがあればメモリマップ上で二分探索する
+        census = open_compact_census('cmc_alldata', cosmic_path)
+        if census is not None:
+            rows = [row for row in (census.find('cds', gene_symbol, hgvs_c), census.find('aa', gene_symbol, hgvs_p)) if row is not None]
+            if not rows:
+                return None, None
+            return census.value('COSMIC_SAMPLE_TESTED', min(rows)), census.value('COSMIC_SAMPLE_MUTATED', min(rows))
+
+        cds_index, aa_index, sample_tested, sample_mutated = reference_registry.load(
+            'annotator_cosmic_index', cosmic_path, _read_cosmic_index
         )
+        # cDNA・アミノ酸のどちらかが一致する行のうち、元の並びで最初の行を使う
+        rows = [index[(gene_symbol, key)] for index, key in [(cds_index, hgvs_c), (aa_index, hgvs_p)] if (gene_symbol, key) in index]
+        if not rows:
+            return None, None
+        return sample_tested[min(rows)], sample_mutated[min(rows)]
     except Exception as e:
         st.warning(f"COSMICデータ取得エラー: {e}")
         return None, None
@@ -1,6 +1,6 @@
 import streamlit as st
-import pandas as pd
 
+from utils.reference_data import civic_feature_urls
 from .parameter import URLs, DBPaths
 
 def generate_links(chromosome, position, ref, alt, transcript_id, gene_symbol, hgvs_c, hgvs_p):
@@ -54,9 +54,8 @@ def generate_civic_link(gene_symbol):
             st.warning("CiVICファイルが見つかりません。")
             return None
 
-        civic_df = pd.read_csv(civic_path, sep='\t', encoding='utf-8')
-        match = civic_df[civic_df['name'] == gene_symbol]
-        return f'=HYPERLINK("{match.iloc[0]["feature_civic_url"]}", "CiVIC")' if not match.empty else None
+        civic_url = civic_feature_urls(civic_path).get(gene_symbol)
+        return f'=HYPERLINK("{civic_url}", "CiVIC")' if civic_url is not None else None
     except Exception as e:
         st.warning(f"CiVICリンク生成エラー: {e}")
         return None
@@ -69,10 +68,9 @@ def generate_civic_html_link(gene_symbol):
             st.warning("CiVICファイルが見つかりません。")
             return "N/A"
 
-        civic_df = pd.read_csv(civic_path, sep='\t', encoding='utf-8')
-        match = civic_df[civic_df['name'] == gene_symbol]
-        if not match.empty:
-            return f'<a href="{match.iloc[0]["feature_civic_url"]}" target="_blank">CiVIC</a>'
+        civic_url = civic_feature_urls(civic_path).get(gene_symbol)
+        if civic_url is not None:
+            return f'<a href="{civic_url}" target="_blank">CiVIC</a>'
         return "N/A"
     except Exception as e:
         st.warning(f"CiVICリンク生成エラー: {e}")
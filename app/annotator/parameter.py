@@ -15,8 +15,8 @@ class DBPaths:
 
     @staticmethod
     def get_cosmic_tsv_gz():
-        """COSMICのTSV GZIPファイルを取得（例: cosmic_v94_hg19.tsv.gz）"""
-        candidates = glob.glob("./app/db/CancerMutationCensus_AllData_v*_GRCh37_va.tsv.gz")
+        """COSMICのTSV GZIPファイルを取得（例: CancerMutationCensus_AllData_v101_GRCh37.tsv.gz）"""
+        candidates = glob.glob("./app/db/CancerMutationCensus_AllData_v*_GRCh37*.tsv.gz")
         return sorted(candidates)[-1] if candidates else None
 
     @staticmethod
@@ -52,6 +52,7 @@ class Constants:
     """その他の定数"""
     TOMMO_PRIMARY_KEYS = ['TOMMO', '60KJPN', '38KJPN', '14KJPN', '8.3KJPN']
     TOMMO_FALLBACK_KEY = 'GnomAD_exomes'
+    COSMIC_COLUMNS = ['GENE_NAME', 'Mutation CDS', 'Mutation AA', 'COSMIC_SAMPLE_TESTED', 'COSMIC_SAMPLE_MUTATED']
 
 
 class SummaryViewerF1:
@@ -1,82 +1,81 @@
-import xml.etree.ElementTree as ET
 import pandas as pd
-from typing import Tuple, Union
+from typing import BinaryIO, Tuple, Union
 import re
 
-def parse_foundationone_xml(xml_content: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
-    ns = {
-        'rr': 'http://integration.foundationmedicine.com/reporting',
-        'vr': 'http://foundationmedicine.com/compbio/variant-report-external'
-    }
+from utils.panel_report import foundationone_report, genminetop_report, guardant360_report, hemesight_report
+
 
-    root = ET.fromstring(xml_content)
-    report = root.find('.//vr:variant-report', namespaces=ns)
+def _first(records):
+    return records[0] if records else None
 
-    ref_id = root.findtext('.//rr:ReferenceID', namespaces=ns)
-    disease = report.attrib.get('disease', '')
-    gender = report.attrib.get('gender', '')
-    sample = report.find('.//vr:samples/vr:sample', namespaces=ns).attrib.get('name', '')
+
+def _foundationone_tables(report):
+    """Build the parse_foundationone_xml tables from a FoundationOneReport"""
+    ref_id = report.reference_id
+    variant_report = report.variant_reports[0]
+    disease = variant_report.disease or ''
+    gender = variant_report.gender or ''
+    sample = report.samples[0].name or ''
 
     # short variants
     short_variants = []
-    for sv in root.findall('.//vr:short-variant', namespaces=ns):
+    for sv in report.short_variants:
         short_variants.append({
             'ReferenceID': ref_id,
             'Gender': gender,
             'Disease': disease,
-            'Gene': sv.attrib.get('gene'),
-            'Position': sv.attrib.get('position'),
-            'Transcript': sv.attrib.get('transcript'),
-            'CDS_Effect': sv.attrib.get('cds-effect'),
-            'Protein_Effect': sv.attrib.get('protein-effect'),
-            'Functional_Effect': sv.attrib.get('functional-effect'),
-            'Allele_Fraction': sv.attrib.get('allele-fraction'),
-            'Depth': sv.attrib.get('depth'),
-            'Status': sv.attrib.get('status'),
+            'Gene': sv.gene,
+            'Position': sv.position,
+            'Transcript': sv.transcript,
+            'CDS_Effect': sv.cds_effect,
+            'Protein_Effect': sv.protein_effect,
+            'Functional_Effect': sv.functional_effect,
+            'Allele_Fraction': sv.allele_fraction,
+            'Depth': sv.depth,
+            'Status': sv.status,
         })
     df_sv = pd.DataFrame(short_variants)
 
     # CNAs
     cna = []
-    for cn in root.findall('.//vr:copy-number-alteration', namespaces=ns):
+    for cn in report.copy_number_alterations:
         cna.append({
             'ReferenceID': ref_id,
             'Gender': gender,
             'Disease': disease,
-            'Gene': cn.attrib.get('gene'),
-            'Position': cn.attrib.get('position'),
-            'CopyNumber': cn.attrib.get('copy-number'),
-            'Ratio': cn.attrib.get('ratio'),
-            'Type': cn.attrib.get('type'),
-            'Status': cn.attrib.get('status'),
+            'Gene': cn.gene,
+            'Position': cn.position,
+            'CopyNumber': cn.copy_number,
+            'Ratio': cn.ratio,
+            'Type': cn.type,
+            'Status': cn.status,
         })
     df_cna = pd.DataFrame(cna)
 
     # Rearrangements
     re_list = []
-    for re in root.findall('.//vr:rearrangement', namespaces=ns):
+    for re in report.rearrangements:
         re_list.append({
             'ReferenceID': ref_id,
             'Gender': gender,
             'Disease': disease,
-            'TargetedGene': re.attrib.get('targeted-gene'),
-            'OtherGene': re.attrib.get('other-gene'),
-            'Description': re.attrib.get('description'),
-            'Type': re.attrib.get('type'),
-            'Allele_Fraction': re.attrib.get('allele-fraction'),
-            'Percent_Reads': re.attrib.get('percent-reads'),
-            'Supporting_Read_Pairs': re.attrib.get('supporting-read-pairs'),
-            'Status': re.attrib.get('status'),
+            'TargetedGene': re.targeted_gene,
+            'OtherGene': re.other_gene,
+            'Description': re.description,
+            'Type': re.type,
+            'Allele_Fraction': re.allele_fraction,
+            'Percent_Reads': re.percent_reads,
+            'Supporting_Read_Pairs': re.supporting_read_pairs,
+            'Status': re.status,
         })
     df_re = pd.DataFrame(re_list)
 
     # MSI / TMB
-    biomarkers = root.find('.//vr:biomarkers', namespaces=ns)
-    msi_status = biomarkers.find('.//vr:microsatellite-instability', namespaces=ns).attrib.get('status', '')
-    tmb_elem = biomarkers.find('.//vr:tumor-mutation-burden', namespaces=ns)
-    tmb_score = tmb_elem.attrib.get('score', '')
-    tmb_status = tmb_elem.attrib.get('status', '')
-    tmb_unit = tmb_elem.attrib.get('unit', '')
+    msi_status = report.microsatellite_instabilities[0].status or ''
+    tmb = report.tumor_mutation_burdens[0]
+    tmb_score = tmb.score or ''
+    tmb_status = tmb.status or ''
+    tmb_unit = tmb.unit or ''
 
     df_msi_tmb = pd.DataFrame([{
         'ReferenceID': ref_id,
@@ -89,20 +88,20 @@ def parse_foundationone_xml(xml_content: str) -> Tuple[pd.DataFrame, pd.DataFram
 
     # Non-human content
     non_human_list = []
-    for nh in root.findall('.//vr:non-human', namespaces=ns):
+    for nh in report.non_humans:
         non_human_list.append({
             'ReferenceID': ref_id,
             'Gender': gender,
             'Disease': disease,
-            'Organism': nh.attrib.get('organism'),
-            'ReadsPerMillion': nh.attrib.get('reads-per-million'),
-            'Status': nh.attrib.get('status'),
+            'Organism': nh.organism,
+            'ReadsPerMillion': nh.reads_per_million,
+            'Status': nh.status,
         })
     df_nh = pd.DataFrame(non_human_list)
 
     # Quality control
-    qc_elem = report.find('.//vr:quality-control', namespaces=ns)
-    qc_status = qc_elem.attrib.get('status', '') if qc_elem is not None else ''
+    qc = _first(report.quality_controls)
+    qc_status = qc.status or '' if qc is not None else ''
     df_qc = pd.DataFrame([{
         'ReferenceID': ref_id,
         'Gender': gender,
@@ -112,148 +111,132 @@ def parse_foundationone_xml(xml_content: str) -> Tuple[pd.DataFrame, pd.DataFram
 
     return df_sv, df_cna, df_re, df_msi_tmb, df_nh, df_qc
 
-def parse_genminetop_xml(xml_content: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+def parse_foundationone_xml(xml_content: Union[str, bytes]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    return _foundationone_tables(foundationone_report(xml_content))
+
+def stream_foundationone_xml(source: BinaryIO) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
-    Parse GenMineTOP XML format
-    Returns: short_variants, copy_number_alterations, fusions, expression, tmb, quality_control
+    parse_foundationone_xml for an uploaded file, read with iterparse straight from its buffer
+    The parsed report is cached by content, so the report generator and the viewers share one parse.
     """
-    root = ET.fromstring(xml_content)
-    
+    return _foundationone_tables(foundationone_report(source))
+
+
+
+def _add_genminetop_alteration(alterations, item):
+    """Route one Alteration to its section by type (rows are completed with ReportID later)"""
+    variant_type = item.type
+
+    # Short Variants (SNVs, Insertions, Deletions)
+    if variant_type in ['snv', 'insertion', 'deletion']:
+        alterations['sv'].append({
+            'Gene': item.gene or '',
+            'Transcript': item.transcript,
+            'Locus': item.locus,
+            'Ref': item.ref,
+            'Alt': item.alt,
+            'Cytoband': item.cytoband,
+            'Origin': item.origin,
+            'Type': variant_type,
+            'CDS_Effect': item.cds_change,
+            'Protein_Effect': item.protein_change,
+            'Allele_Frequency': item.allele_frequency,
+            'Status': item.status,
+            'AG_Class': item.ag_class,
+            'ClinVar_ID': item.clinvar_id,
+            'COSMIC_ID': item.cosmic_id,
+            'Clinical_Significance': item.clinical_significance,
+        })
+
+    # Copy Number Alterations
+    elif variant_type in ['cnv-amplification', 'cnv-deletion']:
+        alterations['cna'].append({
+            'Gene': item.gene or '',
+            'Transcript': item.transcript,
+            'Locus': item.locus,
+            'Cytoband': item.cytoband,
+            'Origin': item.origin,
+            'Type': variant_type,
+            'Copy_Number': item.num_copy,
+            'Ratio': item.ratio,
+            'Status': item.status,
+        })
+
+    # Fusions/Rearrangements
+    elif variant_type == 'fusion':
+        # Handle multiple genes in fusion
+        if item.gene is not None:
+            genes = item.gene_items if item.gene_items else [item.gene]
+            gene_str = ' - '.join(genes) if genes else ''
+        else:
+            gene_str = ''
+            
+        alterations['fusions'].append({
+            'Genes': gene_str,
+            'Transcript': ' - '.join(item.transcript_items),
+            'Locus': ' - '.join(item.locus_items),
+            'Cytoband': ' - '.join(item.cytoband_items),
+            'Origin': item.origin,
+            'Type': variant_type,
+            'Num_Reads': item.num_reads,
+            'Frame': item.frame,
+            'Status': item.status,
+            'Vendor_ID': item.vendor_id,
+        })
+
+    # Gene Expression (keeping separately as it's substantial data)
+    elif variant_type == 'expression':
+        alterations['expression'].append({
+            'Gene': item.gene or '',
+            'Transcript': _first(item.transcript_items),
+            'Origin': item.origin,
+            'Type': variant_type,
+            'Num_Reads': item.num_reads,
+            'TPM': item.tpm,
+            'Normal_Mean_TPM': item.normal_tpm_mean,
+            'Normal_SD_TPM': item.normal_tpm_sd,
+            'Normal_N': item.normal_n,
+            'Status': item.status,
+        })
+
+
+def _genminetop_tables(report):
+    """Build the parse_genminetop_xml tables from a GenMineTopReport"""
+    # alterations/item を type ごとに各セクションへ振り分ける
+    alterations = {'sv': [], 'cna': [], 'fusions': [], 'expression': []}
+    for item in report.alterations:
+        _add_genminetop_alteration(alterations, item)
+
     # Extract basic information
-    report_id = root.findtext('.//id')
-    patient_sex = root.findtext('.//patient/sex')
-    patient_age = root.findtext('.//patient/age')
-    c_cat_id = root.findtext('.//patient/c-cat-id')
-    pathology = root.findtext('.//specimen/pathology')
-    hospital = root.findtext('.//owner/hospital')
+    report_id = report.field('report_id')
     
     # Basic information DataFrame
     basic_info = []
     basic_info.append({
         'ReportID': report_id,
-        'Sex': patient_sex,
-        'Age': patient_age,
-        'C_CAT_ID': c_cat_id,
-        'Pathology': pathology,
-        'Hospital': hospital,
+        'Sex': report.field('sex'),
+        'Age': report.field('age'),
+        'C_CAT_ID': report.field('c_cat_id'),
+        'Pathology': report.field('pathology'),
+        'Hospital': report.field('hospital'),
     })
     
     df_basic_info = pd.DataFrame(basic_info)
-    
-    # Short Variants (SNVs, Insertions, Deletions)
-    short_variants = []
-    for item in root.findall('.//alterations/item'):
-        variant_type = item.findtext('type')
-        if variant_type in ['snv', 'insertion', 'deletion']:
-            gene_elem = item.find('gene')
-            gene = gene_elem.text if gene_elem is not None else ''
-            
-            short_variants.append({
-                'ReportID': report_id,
-                'Gene': gene,
-                'Transcript': item.findtext('transcript'),
-                'Locus': item.findtext('locus'),
-                'Ref': item.findtext('ref'),
-                'Alt': item.findtext('alt'),
-                'Cytoband': item.findtext('cytoband'),
-                'Origin': item.findtext('origin'),
-                'Type': variant_type,
-                'CDS_Effect': item.findtext('coding-dna-alteration'),
-                'Protein_Effect': item.findtext('protein-alteration'),
-                'Allele_Frequency': item.findtext('allele-frequency'),
-                'Status': item.findtext('status'),
-                'AG_Class': item.findtext('ag-class'),
-                'ClinVar_ID': item.findtext('.//clinvar/id/item'),
-                'COSMIC_ID': item.findtext('.//cosmic/id/item'),
-                'Clinical_Significance': item.findtext('.//clinical-significance/item'),
-            })
-    
-    df_sv = pd.DataFrame(short_variants)
-    
-    # Copy Number Alterations
-    cna_list = []
-    for item in root.findall('.//alterations/item'):
-        variant_type = item.findtext('type')
-        if variant_type in ['cnv-amplification', 'cnv-deletion']:
-            gene_elem = item.find('gene')
-            gene = gene_elem.text if gene_elem is not None else ''
-            
-            cna_list.append({
-                'ReportID': report_id,
-                'Gene': gene,
-                'Transcript': item.findtext('transcript'),
-                'Locus': item.findtext('locus'),
-                'Cytoband': item.findtext('cytoband'),
-                'Origin': item.findtext('origin'),
-                'Type': variant_type,
-                'Copy_Number': item.findtext('num-copy'),
-                'Ratio': item.findtext('ratio'),
-                'Status': item.findtext('status'),
-            })
-    
-    df_cna = pd.DataFrame(cna_list)
-    
-    # Fusions/Rearrangements
-    fusions = []
-    for item in root.findall('.//alterations/item'):
-        variant_type = item.findtext('type')
-        if variant_type == 'fusion':
-            gene_elem = item.find('gene')
-            if gene_elem is not None:
-                # Handle multiple genes in fusion
-                genes = [g.text for g in gene_elem.findall('item')] if gene_elem.findall('item') else [gene_elem.text]
-                gene_str = ' - '.join(genes) if genes else ''
-            else:
-                gene_str = ''
-                
-            fusions.append({
-                'ReportID': report_id,
-                'Genes': gene_str,
-                'Transcript': ' - '.join([t.text for t in item.findall('.//transcript/item')]),
-                'Locus': ' - '.join([l.text for l in item.findall('.//locus/item')]),
-                'Cytoband': ' - '.join([c.text for c in item.findall('.//cytoband/item')]),
-                'Origin': item.findtext('origin'),
-                'Type': variant_type,
-                'Num_Reads': item.findtext('num-reads'),
-                'Frame': item.findtext('frame'),
-                'Status': item.findtext('status'),
-                'Vendor_ID': item.findtext('.//id/vendor'),
-            })
-    
-    df_fusions = pd.DataFrame(fusions)
-    
-    # Gene Expression (keeping separately as it's substantial data)
-    expression_list = []
-    for item in root.findall('.//alterations/item'):
-        variant_type = item.findtext('type')
-        if variant_type == 'expression':
-            gene_elem = item.find('gene')
-            gene = gene_elem.text if gene_elem is not None else ''
-            
-            expression_list.append({
-                'ReportID': report_id,
-                'Gene': gene,
-                'Transcript': item.findtext('.//transcript/item'),
-                'Origin': item.findtext('origin'),
-                'Type': variant_type,
-                'Num_Reads': item.findtext('num-reads'),
-                'TPM': item.findtext('tpm'),
-                'Normal_Mean_TPM': item.findtext('.//normal-expression/tpm/mean'),
-                'Normal_SD_TPM': item.findtext('.//normal-expression/tpm/sd'),
-                'Normal_N': item.findtext('.//normal-expression/tpm/n'),
-                'Status': item.findtext('status'),
-            })
-    
-    df_expression = pd.DataFrame(expression_list)
+
+    # ReportID を先頭列として各行に付与
+    df_sv, df_cna, df_fusions, df_expression = (
+        pd.DataFrame([{'ReportID': report_id, **row} for row in alterations[section]])
+        for section in ['sv', 'cna', 'fusions', 'expression']
+    )
     
     # TMB and Mutational Signatures
-    tmb_elem = root.find('.//marker/tmb/exon')
-    signature_values = [int(item.text) for item in root.findall('.//marker/signature/values/item')]
+    tmb = _first(report.tmb)
+    signature_values = [int(value) for value in report.signature_values]
     
     tmb_data = {
         'ReportID': report_id,
-        'TMB_Non_Synonymous': tmb_elem.findtext('num-non-synonymous-alterations') if tmb_elem is not None else '',
-        'TMB_Frequency': tmb_elem.findtext('frequency-non-synonymous-alterations') if tmb_elem is not None else '',
+        'TMB_Non_Synonymous': tmb.count if tmb is not None else '',
+        'TMB_Frequency': tmb.score if tmb is not None else '',
         'Signature_Values': ','.join(map(str, signature_values)),
     }
     
@@ -262,33 +245,45 @@ def parse_genminetop_xml(xml_content: str) -> Tuple[pd.DataFrame, pd.DataFrame,
     # Quality Control
     qc_data = []
     
-    # Tumor content
-    tumor_content_elem = root.find('.//qc/tumor-content')
-    estimated_purity = tumor_content_elem.findtext('.//estimated/value') if tumor_content_elem is not None else ''
-    nuclei_purity = tumor_content_elem.findtext('.//nuclei/value') if tumor_content_elem is not None else ''
-    
-    # Sequencing QC for DNA
-    normal_dna = root.find('.//qc/sequence/normal/dna')
-    tumor_dna = root.find('.//qc/sequence/tumor/dna')
-    tumor_rna = root.find('.//qc/sequence/tumor/rna')
-    
+    qc = _first(report.qc)
+
+    def qc_text(section, path):
+        # section（tumor-content・sequence/*/dna など）がなければ空文字、あれば path のテキスト（なければ None）
+        if qc is None or not qc.has(section):
+            return ''
+        return qc.text(f'{section}/{path}')
+
     qc_data.append({
         'ReportID': report_id,
-        'Estimated_Tumor_Purity': estimated_purity,
-        'Nuclei_Tumor_Purity': nuclei_purity,
-        'Normal_DNA_Mean_Depth': normal_dna.findtext('.//mean-depth/value') if normal_dna is not None else '',
-        'Normal_DNA_Status': normal_dna.findtext('status') if normal_dna is not None else '',
-        'Tumor_DNA_Mean_Depth': tumor_dna.findtext('.//mean-depth/value') if tumor_dna is not None else '',
-        'Tumor_DNA_Status': tumor_dna.findtext('status') if tumor_dna is not None else '',
-        'Tumor_RNA_Total_Reads': tumor_rna.findtext('.//num-total-reads/value') if tumor_rna is not None else '',
-        'Tumor_RNA_Status': tumor_rna.findtext('status') if tumor_rna is not None else '',
-        'SNP_Correlation': root.findtext('.//qc/sequence/snp-correlation/value'),
+        'Estimated_Tumor_Purity': qc_text('tumor-content', 'estimated/value'),
+        'Nuclei_Tumor_Purity': qc_text('tumor-content', 'nuclei/value'),
+        'Normal_DNA_Mean_Depth': qc_text('sequence/normal/dna', 'mean-depth/value'),
+        'Normal_DNA_Status': qc_text('sequence/normal/dna', 'status'),
+        'Tumor_DNA_Mean_Depth': qc_text('sequence/tumor/dna', 'mean-depth/value'),
+        'Tumor_DNA_Status': qc_text('sequence/tumor/dna', 'status'),
+        'Tumor_RNA_Total_Reads': qc_text('sequence/tumor/rna', 'num-total-reads/value'),
+        'Tumor_RNA_Status': qc_text('sequence/tumor/rna', 'status'),
+        'SNP_Correlation': report.field('snp_correlation'),
     })
     
     df_qc = pd.DataFrame(qc_data)
     
     return df_basic_info, df_sv, df_cna, df_fusions, df_expression, df_tmb, df_qc
 
+def parse_genminetop_xml(xml_content: Union[str, bytes]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    Parse GenMineTOP XML format
+    Returns: short_variants, copy_number_alterations, fusions, expression, tmb, quality_control
+    """
+    return _genminetop_tables(genminetop_report(xml_content))
+
+def stream_genminetop_xml(source: BinaryIO) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """
+    parse_genminetop_xml for an uploaded file, read with iterparse straight from its buffer
+    The parsed report is cached by content, so the report generator and the extractor share one parse.
+    """
+    return _genminetop_tables(genminetop_report(source))
+
 def parse_guardant360_excel(file_content: bytes, filename: str) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Parse Guardant360 Excel format (Interim files)
@@ -300,8 +295,8 @@ def parse_guardant360_excel(file_content: bytes, filename: str) -> Tuple[pd.Data
     report_id = sample_id_match.group(2) if sample_id_match else ''
     
     try:
-        # Read all sheets
-        excel_data = pd.read_excel(file_content, sheet_name=None, engine='openpyxl')
+        # Read all sheets (opened once and shared with the report generator)
+        excel_data = guardant360_report(file_content)
         
         # SNV data
         df_snv = pd.DataFrame()
@@ -497,8 +492,7 @@ def detect_file_format(content: Union[str, bytes], filename: str) -> str:
         
         elif filename.lower().endswith('.json'):
             try:
-                import json
-                data = json.loads(content)
+                data = hemesight_report(content)
                 if data.get("testInfo", {}).get("softwareName", "").startswith("ヘムサイト解析プログラム"):
                     return "hemesight"
                 else:
@@ -509,8 +503,15 @@ def detect_file_format(content: Union[str, bytes], filename: str) -> str:
     return "unknown"
 
 
-def detect_xml_format(xml_content: str) -> str:
-    """Detect whether XML is FoundationOne or GenMineTOP format"""
+def detect_xml_format(xml_content: Union[str, bytes, memoryview]) -> str:
+    """Detect whether XML is FoundationOne or GenMineTOP format (text, or the raw bytes / buffer of the file)"""
+    if not isinstance(xml_content, str):
+        # バイト列はデコードせずにそのまま検索
+        if re.search(rb'foundationmedicine\.com', xml_content):
+            return 'foundationone'
+        elif re.search(rb'todai-oncopanel', xml_content):
+            return 'genminetop'
+        return 'unknown'
     if 'foundationmedicine.com' in xml_content:
         return 'foundationone'
     elif 'todai-oncopanel' in xml_content:
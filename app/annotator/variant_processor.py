@@ -2,6 +2,7 @@ import streamlit as st
 import genebe as gnb
 from annotator.link_generator import generate_links
 from annotator.data_fetch import fetch_tommo_data, fetch_clinvar_data, fetch_tp53_data, fetch_role_tier, fetch_cosmic_data
+from utils.annotation_cache import annotation_cache
 
 def process_variant(grc, variant):
     """Parse and annotate a variant, returning results"""
@@ -20,7 +21,11 @@ def process_variant(grc, variant):
             chromosome, position, ref, alt = hg38.split('-')
             position_hg19 = variant.split('-')[1]
 
-        genebe_json = gnb.annotate_variants_list([f"{hg38}"], flatten_consequences=False, genome="hg38")
+        genebe_json = annotation_cache.get('genebe', hg38, 'hg38')
+        if genebe_json is None:
+            genebe_json = gnb.annotate_variants_list([f"{hg38}"], flatten_consequences=False, genome="hg38")
+            if genebe_json:
+                annotation_cache.set('genebe', hg38, genebe_json, 'hg38')
 
         if not genebe_json:
             return None
@@ -87,7 +92,7 @@ def process_variant(grc, variant):
             'AlphaMissense Prediction': genebe_json[0].get('alphamissense_prediction'),
             'gnomAD Exomes AF': f"{genebe_json[0].get('gnomad_exomes_af', 0):.3e}" if genebe_json[0].get('gnomad_exomes_af') is not None else "N/A",
             'gnomAD Genomes AF': f"{genebe_json[0].get('gnomad_genomes_af', 0):.3e}" if genebe_json[0].get('gnomad_genomes_af') is not None else "N/A",
-            'TOMMO_dbSNP': fetch_tommo_data(transcript_id, hgvs_p, alt, genebe_json[0].get('dbsnp')),
+            'TOMMO_dbSNP': fetch_tommo_data(transcript_id, hgvs_p, alt, genebe_json[0].get('dbsnp'), hg38),
             'TP53': fetch_tp53_data(position, ref, alt, gene_symbol),
             **{k: v for k, v in zip(
                 ['Role in Cancer_CancerGeneCensus', 'Tier_CancerGeneCensus', 'Tumor Type Somatic_CancerGeneCensus', 'Tumor Type Germline_CancerGeneCensus', 'Cancer Syndrome_CancerGeneCensus'],
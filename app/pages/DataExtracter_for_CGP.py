@@ -1,15 +1,16 @@
 import streamlit as st
 import pandas as pd
 from io import BytesIO
-import json
 from annotator.parser import (
-    parse_foundationone_xml, 
-    parse_genminetop_xml, 
+    stream_foundationone_xml, 
+    stream_genminetop_xml, 
     parse_guardant360_excel,
     parse_hemesight_json,
     detect_xml_format, 
     detect_file_format
 )
+from utils.panel_report import hemesight_report
+from utils.xlsx_stream import write_frames
 
 st.set_page_config(
     page_title="DataExtracter for CGP",
@@ -58,12 +59,13 @@ if uploaded_files:
     for file in uploaded_files:
         try:
             if file.name.lower().endswith('.xml'):
-                content = file.read().decode("utf-8")
-                format_type = detect_xml_format(content)
+                # アップロードされたバイト列のまま判定し、iterparse で逐次読み込む
+                with file.getbuffer() as buffer:
+                    format_type = detect_xml_format(buffer)
                 file_formats[file.name] = format_type
                 
                 if format_type == 'foundationone':
-                    df_sv, df_cna, df_re, df_msi_tmb, df_nh, df_qc = parse_foundationone_xml(content)
+                    df_sv, df_cna, df_re, df_msi_tmb, df_nh, df_qc = stream_foundationone_xml(file)
                     foundationone_data['sv'].append(df_sv)
                     foundationone_data['cna'].append(df_cna)
                     foundationone_data['re'].append(df_re)
@@ -72,7 +74,7 @@ if uploaded_files:
                     foundationone_data['qc'].append(df_qc)
                     
                 elif format_type == 'genminetop':
-                    df_basic_info, df_sv, df_cna, df_fusions, df_expression, df_tmb, df_qc = parse_genminetop_xml(content)
+                    df_basic_info, df_sv, df_cna, df_fusions, df_expression, df_tmb, df_qc = stream_genminetop_xml(file)
                     genminetop_data['basic_info'].append(df_basic_info)
                     genminetop_data['sv'].append(df_sv)
                     genminetop_data['cna'].append(df_cna)
@@ -105,7 +107,7 @@ if uploaded_files:
                 file_formats[file.name] = format_type
                 
                 if format_type == 'hemesight':
-                    json_data = json.loads(content)
+                    json_data = hemesight_report(content)
                     df_case, df_short, df_rearrangement, df_sequencing = parse_hemesight_json(json_data)
                     hemesight_data['case'].append(df_case)
                     hemesight_data['sv'].append(df_short)
@@ -318,71 +320,73 @@ if uploaded_files:
     st.header("💾 Export Data")
     
     # Create Excel file with all data
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        # FoundationOne data
-        if any(foundationone_data.values()):
-            if not foundationone_combined['sv'].empty:
-                foundationone_combined['sv'].to_excel(writer, index=False, sheet_name='F1_ShortVariants')
-            if not foundationone_combined['cna'].empty:
-                foundationone_combined['cna'].to_excel(writer, index=False, sheet_name='F1_CopyNumber')
-            if not foundationone_combined['re'].empty:
-                foundationone_combined['re'].to_excel(writer, index=False, sheet_name='F1_Rearrangements')
-            if not foundationone_combined['msi_tmb'].empty:
-                foundationone_combined['msi_tmb'].to_excel(writer, index=False, sheet_name='F1_MSI_TMB')
-            if not foundationone_combined['nh'].empty:
-                foundationone_combined['nh'].to_excel(writer, index=False, sheet_name='F1_NonHuman')
-            if not foundationone_combined['qc'].empty:
-                foundationone_combined['qc'].to_excel(writer, index=False, sheet_name='F1_QualityControl')
-        
-        # GenMineTOP data
-        if any(genminetop_data.values()):
-            if not genminetop_combined['sv'].empty:
-                genminetop_combined['sv'].to_excel(writer, index=False, sheet_name='GenMineTOP_ShortVariants')
-            if not genminetop_combined['cna'].empty:
-                genminetop_combined['cna'].to_excel(writer, index=False, sheet_name='GenMineTOP_CopyNumber')
-            if not genminetop_combined['fusions'].empty:
-                genminetop_combined['fusions'].to_excel(writer, index=False, sheet_name='GenMineTOP_Fusions')
-            if not genminetop_combined['expression'].empty:
-                genminetop_combined['expression'].to_excel(writer, index=False, sheet_name='GenMineTOP_Expression')
-            if not genminetop_combined['tmb'].empty:
-                genminetop_combined['tmb'].to_excel(writer, index=False, sheet_name='GenMineTOP_TMB')
-            if not genminetop_combined['qc'].empty:
-                genminetop_combined['qc'].to_excel(writer, index=False, sheet_name='GenMineTOP_QualityControl')
-        
-        # Guardant360 data
-        if any(guardant360_data.values()):
-            if not guardant360_combined['snv'].empty:
-                guardant360_combined['snv'].to_excel(writer, index=False, sheet_name='Guardant360_SNV')
-            if not guardant360_combined['indels'].empty:
-                guardant360_combined['indels'].to_excel(writer, index=False, sheet_name='Guardant360_Indels')
-            if not guardant360_combined['cna'].empty:
-                guardant360_combined['cna'].to_excel(writer, index=False, sheet_name='Guardant360_CopyNumber')
-            if not guardant360_combined['fusions'].empty:
-                guardant360_combined['fusions'].to_excel(writer, index=False, sheet_name='Guardant360_Fusions')
-            if not guardant360_combined['msi'].empty:
-                guardant360_combined['msi'].to_excel(writer, index=False, sheet_name='Guardant360_MSI')
-            if not guardant360_combined['qc'].empty:
-                guardant360_combined['qc'].to_excel(writer, index=False, sheet_name='Guardant360_QualityControl')
-        
-        # HemeSight data
-        if any(hemesight_data.values()):
-            if not hemesight_combined['case'].empty:
-                hemesight_combined['case'].to_excel(writer, index=False, sheet_name='HemeSight_CaseInfo')
-            if not hemesight_combined['sv'].empty:
-                hemesight_combined['sv'].to_excel(writer, index=False, sheet_name='HemeSight_ShortVariants')
-            if not hemesight_combined['rearrangement'].empty:
-                hemesight_combined['rearrangement'].to_excel(writer, index=False, sheet_name='HemeSight_Rearrangements')
-            if not hemesight_combined['sequencing'].empty:
-                hemesight_combined['sequencing'].to_excel(writer, index=False, sheet_name='HemeSight_Sequencing')
-                
-        # File format summary
-        format_summary = pd.DataFrame([
-            {'Filename': filename, 'Format': fmt} 
-            for filename, fmt in file_formats.items()
-        ])
-        format_summary.to_excel(writer, index=False, sheet_name='File_Formats')
+    # シートごとの DataFrame をまとめ、行単位の定メモリ出力で書き出す
+    frames = {}
+    # FoundationOne data
+    if any(foundationone_data.values()):
+        if not foundationone_combined['sv'].empty:
+            frames['F1_ShortVariants'] = foundationone_combined['sv']
+        if not foundationone_combined['cna'].empty:
+            frames['F1_CopyNumber'] = foundationone_combined['cna']
+        if not foundationone_combined['re'].empty:
+            frames['F1_Rearrangements'] = foundationone_combined['re']
+        if not foundationone_combined['msi_tmb'].empty:
+            frames['F1_MSI_TMB'] = foundationone_combined['msi_tmb']
+        if not foundationone_combined['nh'].empty:
+            frames['F1_NonHuman'] = foundationone_combined['nh']
+        if not foundationone_combined['qc'].empty:
+            frames['F1_QualityControl'] = foundationone_combined['qc']
     
+    # GenMineTOP data
+    if any(genminetop_data.values()):
+        if not genminetop_combined['sv'].empty:
+            frames['GenMineTOP_ShortVariants'] = genminetop_combined['sv']
+        if not genminetop_combined['cna'].empty:
+            frames['GenMineTOP_CopyNumber'] = genminetop_combined['cna']
+        if not genminetop_combined['fusions'].empty:
+            frames['GenMineTOP_Fusions'] = genminetop_combined['fusions']
+        if not genminetop_combined['expression'].empty:
+            frames['GenMineTOP_Expression'] = genminetop_combined['expression']
+        if not genminetop_combined['tmb'].empty:
+            frames['GenMineTOP_TMB'] = genminetop_combined['tmb']
+        if not genminetop_combined['qc'].empty:
+            frames['GenMineTOP_QualityControl'] = genminetop_combined['qc']
+    
+    # Guardant360 data
+    if any(guardant360_data.values()):
+        if not guardant360_combined['snv'].empty:
+            frames['Guardant360_SNV'] = guardant360_combined['snv']
+        if not guardant360_combined['indels'].empty:
+            frames['Guardant360_Indels'] = guardant360_combined['indels']
+        if not guardant360_combined['cna'].empty:
+            frames['Guardant360_CopyNumber'] = guardant360_combined['cna']
+        if not guardant360_combined['fusions'].empty:
+            frames['Guardant360_Fusions'] = guardant360_combined['fusions']
+        if not guardant360_combined['msi'].empty:
+            frames['Guardant360_MSI'] = guardant360_combined['msi']
+        if not guardant360_combined['qc'].empty:
+            frames['Guardant360_QualityControl'] = guardant360_combined['qc']
+    
+    # HemeSight data
+    if any(hemesight_data.values()):
+        if not hemesight_combined['case'].empty:
+            frames['HemeSight_CaseInfo'] = hemesight_combined['case']
+        if not hemesight_combined['sv'].empty:
+            frames['HemeSight_ShortVariants'] = hemesight_combined['sv']
+        if not hemesight_combined['rearrangement'].empty:
+            frames['HemeSight_Rearrangements'] = hemesight_combined['rearrangement']
+        if not hemesight_combined['sequencing'].empty:
+            frames['HemeSight_Sequencing'] = hemesight_combined['sequencing']
+            
+    # File format summary
+    format_summary = pd.DataFrame([
+        {'Filename': filename, 'Format': fmt} 
+        for filename, fmt in file_formats.items()
+    ])
+    frames['File_Formats'] = format_summary
+
+    output = BytesIO()
+    write_frames(output, frames)
     output.seek(0)
 
     st.download_button(
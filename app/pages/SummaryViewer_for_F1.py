@@ -10,8 +10,9 @@ import altair as alt
 from matplotlib.patches import Patch
 import streamlit as st
 
-from annotator.parser import parse_foundationone_xml
+from annotator.parser import stream_foundationone_xml
 from annotator.parameter import SummaryViewerF1
+from utils.xlsx_stream import write_frames
 
 
 st.set_page_config(
@@ -39,8 +40,7 @@ if uploaded_files:
     all_sv, all_cna, all_re, all_msi_tmb, all_nh, all_qc = [], [], [], [], [], []
 
     for file in uploaded_files:
-        content = file.read().decode("utf-8")
-        df_sv, df_cna, df_re, df_msi_tmb, df_nh, df_qc = parse_foundationone_xml(content)
+        df_sv, df_cna, df_re, df_msi_tmb, df_nh, df_qc = stream_foundationone_xml(file)
         all_sv.append(df_sv)
         all_cna.append(df_cna)
         all_re.append(df_re)
@@ -66,13 +66,14 @@ if uploaded_files:
 
     # --- Excel出力 ---
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df_sv_all.to_excel(writer, index=False, sheet_name='ShortVariants')
-        df_cna_all.to_excel(writer, index=False, sheet_name='CopyNumber')
-        df_re_all.to_excel(writer, index=False, sheet_name='Rearrangements')
-        df_msi_tmb_all.to_excel(writer, index=False, sheet_name='MSI_TMB')
-        df_nh_all.to_excel(writer, index=False, sheet_name='NonHuman')
-        df_qc_all.to_excel(writer, index=False, sheet_name='QualityControl')
+    write_frames(output, {
+        'ShortVariants': df_sv_all,
+        'CopyNumber': df_cna_all,
+        'Rearrangements': df_re_all,
+        'MSI_TMB': df_msi_tmb_all,
+        'NonHuman': df_nh_all,
+        'QualityControl': df_qc_all,
+    })
     output.seek(0)
 
     st.download_button(
@@ -0,0 +1,132 @@
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from .parameter import Cache
+
+
+class AnnotationCache:
+    """SQLite-backed cache for external annotation lookups (GeneBe / ClinVar / ToMMo)"""
+
+    def __init__(self, path, ttl, max_entries):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS annotation ('
+                ' source TEXT NOT NULL, variant TEXT NOT NULL, genome TEXT NOT NULL,'
+                ' value TEXT NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL,'
+                ' PRIMARY KEY (source, variant, genome))'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS idx_accessed_at ON annotation (accessed_at)')
+            self.conn.commit()
+        return self.conn
+
+    def _ttl(self, source):
+        # 'clinvar/annotator' のような派生ソースは親ソースの有効期限を使う
+        return self.ttl.get(source.split('/')[0])
+
+    def get(self, source, variant, genome='hg38'):
+        """Return the cached value, or None if missing or expired"""
+        try:
+            with self.lock:
+                conn = self._connect()
+                row = conn.execute(
+                    'SELECT value, created_at FROM annotation WHERE source = ? AND variant = ? AND genome = ?',
+                    (source, variant, genome)
+                ).fetchone()
+                if row is None:
+                    return None
+                value, created_at = row
+                now = time.time()
+                ttl = self._ttl(source)
+                if ttl is not None and now - created_at > ttl:
+                    conn.execute(
+                        'DELETE FROM annotation WHERE source = ? AND variant = ? AND genome = ?',
+                        (source, variant, genome)
+                    )
+                    conn.commit()
+                    return None
+                conn.execute(
+                    'UPDATE annotation SET accessed_at = ? WHERE source = ? AND variant = ? AND genome = ?',
+                    (now, source, variant, genome)
+                )
+                conn.commit()
+            return json.loads(value)
+        except sqlite3.Error as e:
+            print(f"[Cache error] {e} - {source}: {variant}")
+            return None
+
+    def set(self, source, variant, value, genome='hg38'):
+        """Store a JSON-serializable value and evict the least recently used entries over the cap"""
+        try:
+            now = time.time()
+            with self.lock:
+                conn = self._connect()
+                conn.execute(
+                    'INSERT OR REPLACE INTO annotation (source, variant, genome, value, created_at, accessed_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (source, variant, genome, json.dumps(value), now, now)
+                )
+                count = conn.execute('SELECT COUNT(*) FROM annotation').fetchone()[0]
+                if count > self.max_entries:
+                    conn.execute(
+                        'DELETE FROM annotation WHERE rowid IN '
+                        '(SELECT rowid FROM annotation ORDER BY accessed_at LIMIT ?)',
+                        (count - self.max_entries,)
+                    )
+                conn.commit()
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            print(f"[Cache error] {e} - {source}: {variant}")
+
+    def purge(self, source=None, expired_only=False):
+        """Delete cached entries (all, one source, or only expired ones) and return the number removed"""
+        with self.lock:
+            conn = self._connect()
+            removed = 0
+            sources = [row[0] for row in conn.execute('SELECT DISTINCT source FROM annotation')]
+            now = time.time()
+            for name in sources:
+                if source and name.split('/')[0] != source:
+                    continue
+                if expired_only:
+                    ttl = self._ttl(name)
+                    if ttl is None:
+                        continue
+                    cursor = conn.execute(
+                        'DELETE FROM annotation WHERE source = ? AND created_at < ?', (name, now - ttl)
+                    )
+                else:
+                    cursor = conn.execute('DELETE FROM annotation WHERE source = ?', (name,))
+                removed += cursor.rowcount
+            conn.commit()
+            conn.execute('VACUUM')
+        return removed
+
+
+annotation_cache = AnnotationCache(Cache.PATH, Cache.TTL, Cache.MAX_ENTRIES)
+
+
+if __name__ == '__main__':
+    # 使い方: cd app && python -m utils.annotation_cache purge [--source clinvar] [--expired]
+    parser = argparse.ArgumentParser(description='Manage the ExPReSS annotation cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    purge_parser = subparsers.add_parser('purge', help='delete cached annotations')
+    purge_parser.add_argument('--source', choices=sorted(Cache.TTL), help='purge only this source')
+    purge_parser.add_argument('--expired', action='store_true', help='purge only entries past their TTL')
+    args = parser.parse_args()
+
+    if args.command == 'purge':
+        removed = annotation_cache.purge(args.source, args.expired)
+        print(f"Removed {removed} entries from {annotation_cache.path}")
@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+
+from .parameter import RateLimit
+
+
+class HostRateLimiter:
+    """Cap concurrent connections and requests per second for each host"""
+
+    def __init__(self, host_limits):
+        self.host_limits = host_limits
+        self.lock = threading.Lock()
+        self.semaphores = {}
+        self.next_slot = {}
+
+    def _key(self, url):
+        host = urlparse(url).hostname or ''
+        # サブドメイン違い（eutils / www）は同じ上限を共有する
+        for key in self.host_limits:
+            if host == key or host.endswith('.' + key):
+                return key
+        return None
+
+    def acquire(self, url):
+        key = self._key(url)
+        if key is None:
+            return None
+        limit = self.host_limits[key]
+        with self.lock:
+            semaphore = self.semaphores.setdefault(key, threading.BoundedSemaphore(limit))
+        semaphore.acquire()
+        # 1秒あたりの上限を超えないよう、次に送信できる時刻まで待機
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(key, now))
+            self.next_slot[key] = slot + 1.0 / limit
+        if slot > now:
+            time.sleep(slot - now)
+        return semaphore
+
+    def request(self, method, url, **kwargs):
+        semaphore = self.acquire(url)
+        try:
+            return requests.request(method, url, **kwargs)
+        finally:
+            if semaphore is not None:
+                semaphore.release()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+
+host_limiter = HostRateLimiter(RateLimit.HOST_LIMITS)
+
+
+def run_annotations(tasks, progress_text=None, label=""):
+    """Run per-variant annotation tasks concurrently and return results in the original order"""
+    results = [None] * len(tasks)
+    if not tasks:
+        return results
+
+    with ThreadPoolExecutor(max_workers=RateLimit.MAX_WORKERS) as executor:
+        futures = {executor.submit(task): i for i, task in enumerate(tasks)}
+        # 進捗表示は Streamlit のコンテキストを持つメインスレッドから更新する
+        for done, future in enumerate(as_completed(futures), 1):
+            results[futures[future]] = future.result()
+            if progress_text is not None:
+                progress_text.text(f"Processing {done} of {len(tasks)} variants.... φ(..) {label}")
+    return results
@@ -0,0 +1,216 @@
+import argparse
+import csv
+import gzip
+import os
+import re
+import sqlite3
+import threading
+
+from .parameter import ClinVarLocal
+
+
+HGVS_NAME = re.compile(r'^(?P<transcript>[NX][MR]_\d+(?:\.\d+)?)(?:\([^)]*\))?:(?P<cds>c\.[^ ]+)')
+
+
+def _open_text(path):
+    return gzip.open(path, 'rt', encoding='utf-8') if path.endswith('.gz') else open(path, encoding='utf-8')
+
+
+def _hgvs_keys(transcript_id, cds_change):
+    # バージョン付き・バージョンなしの両方で引けるようにする
+    keys = [f'hgvs:{transcript_id}:{cds_change}']
+    if '.' in transcript_id:
+        keys.append(f"hgvs:{transcript_id.split('.')[0]}:{cds_change}")
+    return keys
+
+
+def _rs_key(dbsnp):
+    rs_number = str(dbsnp).lower().removeprefix('rs') if dbsnp else ''
+    return f'rs:{rs_number}' if rs_number.isdigit() and rs_number != '-1' else None
+
+
+def _variant_key(chromosome, position, ref, alt):
+    chromosome = str(chromosome).replace('chr', '')
+    return f'var:{chromosome}-{position}-{ref}-{alt}'
+
+
+def _read_variant_summary(path):
+    """Yield (variation_id, germline_sig, germline_status, somatic_sig, somatic_status, keys) from variant_summary.txt"""
+    with _open_text(path) as handle:
+        reader = csv.DictReader(handle, delimiter='\t')
+        for row in reader:
+            variation_id = row.get('VariationID')
+            if not variation_id:
+                continue
+            keys = []
+            match = HGVS_NAME.match(row.get('Name', ''))
+            if match:
+                keys.extend(_hgvs_keys(match.group('transcript'), match.group('cds')))
+            rs_key = _rs_key(row.get('RS# (dbSNP)'))
+            if rs_key:
+                keys.append(rs_key)
+            # chr-pos-ref-alt はパイプラインに合わせて GRCh38 のみ
+            if row.get('Assembly') == 'GRCh38' and row.get('PositionVCF', 'na') not in ('', 'na', '-1'):
+                keys.append(_variant_key(row['Chromosome'], row['PositionVCF'], row['ReferenceAlleleVCF'], row['AlternateAlleleVCF']))
+            yield (
+                variation_id,
+                row.get('ClinicalSignificance', 'NA'),
+                row.get('ReviewStatus', 'NA'),
+                row.get('Oncogenicity', 'NA'),
+                row.get('ReviewStatusOncogenicity', 'NA'),
+                keys,
+            )
+
+
+def _read_vcf(path):
+    """Yield the same records as _read_variant_summary from a ClinVar GRCh38 VCF"""
+
+    def info_value(info, key):
+        # VCF では空白が '_' に置き換えられているため元に戻す
+        value = info.get(key)
+        return value.replace('_', ' ') if value else 'NA'
+
+    with _open_text(path) as handle:
+        for line in handle:
+            if line.startswith('#'):
+                continue
+            fields = line.rstrip('\n').split('\t')
+            if len(fields) < 8:
+                continue
+            chromosome, position, variation_id, ref, alt = fields[:5]
+            info = dict(item.split('=', 1) for item in fields[7].split(';') if '=' in item)
+            keys = [_variant_key(chromosome, position, ref, alt)]
+            for rs_number in info.get('RS', '').split('|'):
+                rs_key = _rs_key(rs_number)
+                if rs_key:
+                    keys.append(rs_key)
+            yield (
+                variation_id,
+                info_value(info, 'CLNSIG'),
+                info_value(info, 'CLNREVSTAT'),
+                info_value(info, 'ONC'),
+                info_value(info, 'ONCREVSTAT'),
+                keys,
+            )
+
+
+def build_clinvar_store(source_path, store_path=ClinVarLocal.PATH, batch_size=50000):
+    """Compile a ClinVar variant_summary.txt(.gz) or VCF into the indexed local store"""
+    is_vcf = '.vcf' in os.path.basename(source_path)
+    records = _read_vcf(source_path) if is_vcf else _read_variant_summary(source_path)
+
+    # 作成中のファイルに書き込み、完了後に置き換える（実行中のアプリは旧ストアを読み続けられる）
+    tmp_path = store_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(store_path), exist_ok=True)
+    conn = sqlite3.connect(tmp_path)
+    conn.execute('PRAGMA journal_mode=OFF')
+    conn.execute('PRAGMA synchronous=OFF')
+    conn.execute(
+        'CREATE TABLE classification ('
+        ' variation_id TEXT PRIMARY KEY, germline_sig TEXT, germline_status TEXT,'
+        ' somatic_sig TEXT, somatic_status TEXT)'
+    )
+    conn.execute('CREATE TABLE lookup (key TEXT NOT NULL, variation_id TEXT NOT NULL)')
+
+    count = 0
+    classifications, lookups = [], []
+    for variation_id, germline_sig, germline_status, somatic_sig, somatic_status, keys in records:
+        classifications.append((variation_id, germline_sig, germline_status, somatic_sig, somatic_status))
+        lookups.extend((key, variation_id) for key in keys)
+        count += 1
+        if len(classifications) >= batch_size:
+            conn.executemany('INSERT OR REPLACE INTO classification VALUES (?, ?, ?, ?, ?)', classifications)
+            conn.executemany('INSERT INTO lookup VALUES (?, ?)', lookups)
+            classifications, lookups = [], []
+    conn.executemany('INSERT OR REPLACE INTO classification VALUES (?, ?, ?, ?, ?)', classifications)
+    conn.executemany('INSERT INTO lookup VALUES (?, ?)', lookups)
+
+    # 同じキー・IDの重複行を除いてからインデックスを作成
+    conn.execute('CREATE TABLE lookup_unique AS SELECT DISTINCT key, variation_id FROM lookup')
+    conn.execute('DROP TABLE lookup')
+    conn.execute('ALTER TABLE lookup_unique RENAME TO lookup')
+    conn.execute('CREATE INDEX idx_lookup_key ON lookup (key)')
+    conn.commit()
+    conn.close()
+    os.replace(tmp_path, store_path)
+    return count
+
+
+class ClinVarStore:
+    """Read-only lookups against the compiled local ClinVar store"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = None
+        self.mtime = None
+
+    def available(self):
+        return os.path.exists(self.path)
+
+    def _connect(self):
+        # 月次の再構築でファイルが置き換えられたら接続し直す
+        mtime = os.path.getmtime(self.path)
+        if self.conn is None or mtime != self.mtime:
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = sqlite3.connect(f'file:{self.path}?mode=ro', uri=True, check_same_thread=False)
+            self.mtime = mtime
+        return self.conn
+
+    def _find(self, keys):
+        with self.lock:
+            conn = self._connect()
+            for key in keys:
+                row = conn.execute(
+                    'SELECT c.germline_sig, c.germline_status, c.somatic_sig, c.somatic_status, c.variation_id '
+                    'FROM lookup l JOIN classification c ON c.variation_id = l.variation_id '
+                    'WHERE l.key = ? ORDER BY CAST(c.variation_id AS INTEGER) LIMIT 1',
+                    (key,)
+                ).fetchone()
+                if row:
+                    return tuple(row)
+        return None
+
+    def lookup(self, transcript_id, cds_change, dbsnp, variant=None):
+        """Return (germline_sig, germline_status, somatic_sig, somatic_status, clinvar_id) like fetch_clinvar"""
+        if not self.available():
+            return ("", "", "", "", "")
+        keys = []
+        if transcript_id and cds_change:
+            keys.extend(_hgvs_keys(transcript_id, cds_change))
+        if variant and len(str(variant).split('-')) == 4:
+            keys.append(_variant_key(*str(variant).split('-')))
+        rs_key = _rs_key(dbsnp)
+        if rs_key:
+            keys.append(rs_key)
+        found = self._find(keys) if keys else None
+        return found if found else ("", "", "", "", "")
+
+
+clinvar_store = ClinVarStore(ClinVarLocal.PATH)
+
+
+def use_local_clinvar():
+    """Whether ClinVar lookups should be answered from the local store for this deployment"""
+    if ClinVarLocal.BACKEND == 'local':
+        return True
+    if ClinVarLocal.BACKEND == 'auto':
+        return clinvar_store.available()
+    return False
+
+
+if __name__ == '__main__':
+    # 使い方: cd app && python -m utils.clinvar_local build variant_summary.txt.gz
+    parser = argparse.ArgumentParser(description='Build the local ClinVar store')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='compile variant_summary.txt(.gz) or a ClinVar VCF')
+    build_parser.add_argument('source', help='path to variant_summary.txt.gz or clinvar.vcf.gz (GRCh38)')
+    build_parser.add_argument('--output', default=ClinVarLocal.PATH, help='path of the compiled store')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        count = build_clinvar_store(args.source, args.output)
+        print(f"Compiled {count} ClinVar records into {args.output}")
@@ -0,0 +1,258 @@
+import argparse
+import bisect
+import glob
+import json
+import os
+import re
+import shutil
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from .parameter import Database
+from .reference_data import reference_registry
+
+
+# コンパイル対象のデータセット（ソースファイルのパターンと必要な列）
+DATASETS = {
+    'cmc_slim': {
+        'pattern': Database.COSMIC_37_PATH,
+        'columns': ['GENE_NAME', 'Mutation CDS', 'COSMIC_SAMPLE_MUTATED'],
+    },
+    'cmc_alldata': {
+        'pattern': Database.COSMIC_37_ALLDATA_PATH,
+        'columns': ['GENE_NAME', 'Mutation CDS', 'Mutation AA', 'COSMIC_SAMPLE_TESTED', 'COSMIC_SAMPLE_MUTATED'],
+        # 二分探索用のソート済みキー（遺伝子 + cDNA / 遺伝子 + アミノ酸）
+        'indexes': {
+            'cds': ['GENE_NAME', 'Mutation CDS'],
+            'aa': ['GENE_NAME', 'Mutation AA'],
+        },
+    },
+}
+
+MANIFEST_NAME = 'manifest.json'
+# 保存形式を変えたら上げる（古い形式のコンパイル結果は作り直すまで使わない）
+FORMAT_VERSION = 2
+
+
+def _column_file(column):
+    return re.sub(r'[^0-9A-Za-z]+', '_', column)
+
+
+def dataset_dir(dataset):
+    return os.path.join(Database.COMPILED_DIR, dataset)
+
+
+def _save_strings(base, values):
+    # 文字列は UTF-8 で連結したバイト列と開始位置の配列で保存（固定長 <U 配列のように最長の値に合わせて膨らまない）
+    encoded = [value.encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(value) for value in encoded], out=offsets[1:])
+    np.save(f'{base}.bytes.npy', np.frombuffer(b''.join(encoded), dtype=np.uint8))
+    np.save(f'{base}.offsets.npy', offsets)
+
+
+def _load_strings(base):
+    data = np.load(f'{base}.bytes.npy').tobytes()
+    offsets = np.load(f'{base}.offsets.npy').tolist()
+    values = np.empty(len(offsets) - 1, dtype=object)
+    values[:] = [data[start:end].decode('utf-8') for start, end in zip(offsets, offsets[1:])]
+    return values
+
+
+def build_dataset(dataset, source_path=None):
+    """Compile one COSMIC census TSV into per-column .npy files with a version manifest"""
+    spec = DATASETS[dataset]
+    if source_path is None:
+        candidates = sorted(glob.glob(spec['pattern']))
+        if not candidates:
+            raise FileNotFoundError(f"No file matching pattern: {spec['pattern']}")
+        source_path = candidates[-1]
+
+    compression = 'gzip' if source_path.endswith('.gz') else None
+    df = pd.read_csv(source_path, sep='\t', encoding='utf-8', compression=compression,
+                     usecols=spec['columns'], low_memory=False)
+
+    # 作成中のディレクトリに書き込み、完了後に置き換える
+    output_dir = dataset_dir(dataset)
+    tmp_dir = output_dir + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    columns = {}
+    for column in spec['columns']:
+        name = _column_file(column)
+        series = df[column]
+        if pd.api.types.is_numeric_dtype(series):
+            np.save(os.path.join(tmp_dir, f'{name}.npy'), series.to_numpy())
+            columns[column] = {'file': name, 'kind': 'numeric', 'dtype': str(series.dtype)}
+        else:
+            # 文字列列はソート済みの辞書（ユニーク値）とコードに分けて保存（欠損値はコード -1）
+            codes, uniques = pd.factorize(series, sort=True)
+            np.save(os.path.join(tmp_dir, f'{name}.codes.npy'), codes.astype(np.int32))
+            _save_strings(os.path.join(tmp_dir, f'{name}.values'), uniques)
+            columns[column] = {'file': name, 'kind': 'category', 'dtype': 'str'}
+
+    indexes = {}
+    for index_name, (gene_column, mutation_column) in spec.get('indexes', {}).items():
+        # (遺伝子コード, 変異コード) を1つの int64 キーにまとめ、安定ソートで元の行順を保つ
+        gene_codes = np.load(os.path.join(tmp_dir, f'{_column_file(gene_column)}.codes.npy')).astype(np.int64)
+        mutation_codes = np.load(os.path.join(tmp_dir, f'{_column_file(mutation_column)}.codes.npy')).astype(np.int64)
+        rows = np.flatnonzero((gene_codes >= 0) & (mutation_codes >= 0))
+        keys = (gene_codes[rows] << 32) | mutation_codes[rows]
+        order = np.argsort(keys, kind='stable')
+        np.save(os.path.join(tmp_dir, f'index_{index_name}.keys.npy'), keys[order])
+        np.save(os.path.join(tmp_dir, f'index_{index_name}.rows.npy'), rows[order].astype(np.int64))
+        indexes[index_name] = [gene_column, mutation_column]
+
+    stat = os.stat(source_path)
+    version = re.search(r'_v(\d+)_', os.path.basename(source_path))
+    manifest = {
+        'dataset': dataset,
+        'format': FORMAT_VERSION,
+        'source': os.path.basename(source_path),
+        'source_size': stat.st_size,
+        'source_mtime': stat.st_mtime,
+        'cosmic_version': version.group(1) if version else None,
+        'rows': len(df),
+        'columns': columns,
+        'indexes': indexes,
+        'built_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+    return manifest
+
+
+def read_manifest(dataset):
+    path = os.path.join(dataset_dir(dataset), MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def is_current(dataset, source_path):
+    """Whether the compiled dataset was built from exactly this source file"""
+    manifest = read_manifest(dataset)
+    if manifest is None or manifest.get('format') != FORMAT_VERSION or manifest['source'] != os.path.basename(source_path):
+        return False
+    stat = os.stat(source_path)
+    return manifest['source_size'] == stat.st_size and manifest['source_mtime'] == stat.st_mtime
+
+
+def load_columns(dataset, columns, mmap_mode=None):
+    """Read only the requested columns of a compiled dataset into a DataFrame"""
+    manifest = read_manifest(dataset)
+    if manifest is None:
+        raise FileNotFoundError(f"Compiled dataset not found: {dataset_dir(dataset)}")
+
+    data = {}
+    for column in columns:
+        info = manifest['columns'][column]
+        base = os.path.join(dataset_dir(dataset), info['file'])
+        if info['kind'] == 'numeric':
+            data[column] = np.load(f'{base}.npy', mmap_mode=mmap_mode)
+        else:
+            codes = np.load(f'{base}.codes.npy', mmap_mode=mmap_mode)
+            values = _load_strings(f'{base}.values')
+            # コード -1 は末尾に追加した欠損値を指す
+            data[column] = np.append(values, np.nan)[codes]
+    return pd.DataFrame(data, columns=columns)
+
+
+class CompactCensus:
+    """Memory-mapped, binary-searched view of a compiled census shared through the OS page cache"""
+
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.manifest = read_manifest(dataset)
+        if self.manifest is None or not self.manifest.get('indexes'):
+            raise FileNotFoundError(f"Compiled index not found: {dataset_dir(dataset)}")
+        self.base = dataset_dir(dataset)
+        self.arrays = {}
+        self.lock = threading.Lock()
+
+    def _array(self, name):
+        with self.lock:
+            if name not in self.arrays:
+                self.arrays[name] = np.load(os.path.join(self.base, f'{name}.npy'), mmap_mode='r')
+            return self.arrays[name]
+
+    def _string(self, file, code):
+        data = self._array(f'{file}.values.bytes')
+        offsets = self._array(f'{file}.values.offsets')
+        return data[offsets[code]:offsets[code + 1]].tobytes()
+
+    def _code(self, column, value):
+        # 辞書はコードポイント順にソート済みで、UTF-8 のバイト順と一致するためバイト列のまま二分探索
+        file = self.manifest['columns'][column]['file']
+        target = value.encode('utf-8')
+        count = len(self._array(f'{file}.values.offsets')) - 1
+        i = bisect.bisect_left(range(count), target, key=lambda code: self._string(file, code))
+        return i if i < count and self._string(file, i) == target else None
+
+    def find(self, index_name, gene, mutation):
+        """Return the first source row whose (gene, mutation) matches, or None"""
+        if not isinstance(gene, str) or not isinstance(mutation, str):
+            return None
+        gene_column, mutation_column = self.manifest['indexes'][index_name]
+        gene_code = self._code(gene_column, gene)
+        mutation_code = self._code(mutation_column, mutation)
+        if gene_code is None or mutation_code is None:
+            return None
+        keys = self._array(f'index_{index_name}.keys')
+        key = (gene_code << 32) | mutation_code
+        i = np.searchsorted(keys, key)
+        if i >= len(keys) or keys[i] != key:
+            return None
+        return int(self._array(f'index_{index_name}.rows')[i])
+
+    def value(self, column, row):
+        info = self.manifest['columns'][column]
+        if info['kind'] == 'numeric':
+            return self._array(info['file'])[row]
+        code = self._array(f"{info['file']}.codes")[row]
+        return self._string(info['file'], code).decode('utf-8') if code >= 0 else np.nan
+
+
+def open_compact_census(dataset, source_path):
+    """Return the shared CompactCensus when the compiled index matches source_path, otherwise None"""
+    if not is_current(dataset, source_path) or not read_manifest(dataset).get('indexes'):
+        return None
+    manifest_path = os.path.join(dataset_dir(dataset), MANIFEST_NAME)
+    return reference_registry.load(f'compact_{dataset}', manifest_path, lambda _: CompactCensus(dataset))
+
+
+def read_census(dataset, source_path, columns):
+    """Load census columns from the compiled store when current, otherwise from the TSV"""
+    if is_current(dataset, source_path):
+        return load_columns(dataset, columns)
+    compression = 'gzip' if source_path.endswith('.gz') else None
+    return pd.read_csv(source_path, sep='\t', encoding='utf-8', compression=compression,
+                       usecols=columns, low_memory=False)[columns]
+
+
+if __name__ == '__main__':
+    # 使い方: cd app && python -m utils.compiled_db build [--dataset cmc_slim]
+    parser = argparse.ArgumentParser(description='Compile reference databases for ExPReSS')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help='compile COSMIC Cancer Mutation Census files')
+    build_parser.add_argument('--dataset', choices=sorted(DATASETS), action='append', help='dataset to build (default: all available)')
+    build_parser.add_argument('--source', help='source file (only with a single --dataset)')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        datasets = args.dataset or sorted(DATASETS)
+        for dataset in datasets:
+            try:
+                manifest = build_dataset(dataset, args.source if len(datasets) == 1 else None)
+            except FileNotFoundError as e:
+                print(f"[SKIP] {dataset}: {e}")
+                continue
+            print(f"Built {dataset}: {manifest['rows']} rows from {manifest['source']} -> {dataset_dir(dataset)}")
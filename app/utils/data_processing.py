@@ -2,48 +2,88 @@ import fnmatch
 import glob
 import json
 import os
-import io
-from io import BytesIO
+from functools import partial
 import xml.etree.ElementTree as ET
 
-import openpyxl
-from openpyxl.utils.dataframe import dataframe_to_rows
 import pandas as pd
 import streamlit as st
 
+from .annotation_executor import run_annotations
+from .compiled_db import read_census
 from .link_generator import link_generator
-from .parameter import Base, Transcript, Database, Gene, Columns
+from .file_handling import tsv_stream
+from .sheet_writer import sheet_frame, write_df_to_sheet
+from .panel_report import Breakpoint, foundationone_report, genminetop_report, guardant360_report, hemesight_report
+from .template_cache import load_template
+from .reference_data import civic_feature_urls, first_row_index, hgnc_entrez_ids, reference_registry
+from .web_scraping import fetch_clinvar_batch, fetch_genebe_batch
+from .parameter import Transcript, Database, Gene, Columns
 
 
-def write_df_to_sheet(data_section, sheet_name, wb):
-    # データを正規化（既にDataFrameならそのまま）
-    if not isinstance(data_section, pd.DataFrame):
-        df = pd.json_normalize(data_section)
-    else:
-        df = data_section
-    # シートが存在するか確認し、なければ新規作成
-    if sheet_name in wb.sheetnames:
-        sheet = wb[sheet_name]
-    else:
-        sheet = wb.create_sheet(title=sheet_name)
-    # DataFrame を Excel シートに書き込み
-    for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            if isinstance(value, list):
-                value = "\n".join(map(str, value))
-            elif isinstance(value, dict):
-                value = json.dumps(value, ensure_ascii=False)
-            sheet.cell(row=r_idx, column=c_idx, value=value)
-
-
-def cancer_gene_census():
-    cosmic_files = glob.glob(Database.COSMIC_PATH)
+def _census_path(pattern):
+    cosmic_files = glob.glob(pattern)
 
     if not cosmic_files:
-        raise FileNotFoundError(f"No file matching pattern: {Database.COSMIC_PATH}")
+        raise FileNotFoundError(f"No file matching pattern: {pattern}")
     
-    cancergenecensus_path = cosmic_files[0]
+    return cosmic_files[0]
 
+
+def cancer_gene_census():
+    cancergenecensus_path = _census_path(Database.COSMIC_PATH)
+    return reference_registry.load('cancer_gene_census', cancergenecensus_path, _read_cancer_gene_census)
+
+
+def cancer_gene_census_roles():
+    """Gene symbol -> 'Role[Tier]' built once per Cancer Gene Census file"""
+    cancergenecensus_path = _census_path(Database.COSMIC_PATH)
+    return reference_registry.load(
+        'cancer_gene_census_roles', cancergenecensus_path,
+        lambda _: first_row_index(cancer_gene_census(), ['geneSymbol'], 'Role')
+    )
+
+
+def gene_annotation_table():
+    """Gene-level annotations (CGC role/tier, CiVIC URL, Entrez ID) indexed by gene symbol"""
+    paths = (_census_path(Database.COSMIC_PATH), Database.CIVIC_PATH, Database.HGNC_PATH)
+    return reference_registry.load('gene_annotation_table', paths, _build_gene_annotation_table)
+
+
+def _build_gene_annotation_table(paths):
+    cgc_roles = cancer_gene_census_roles()
+    df_genes = pd.concat([
+        pd.Series(cgc_roles, name='Role_in_Cancer', dtype=object),
+        pd.Series(civic_feature_urls(), name='CiVIC_URL', dtype=object),
+        pd.Series(hgnc_entrez_ids(), name='Entrez_ID', dtype=object),
+    ], axis=1)
+    # CGC に載っていない遺伝子は空文字（CGC 上の欠損値はそのまま残す）
+    df_genes['Role_in_Cancer'] = df_genes['Role_in_Cancer'].where(df_genes.index.isin(list(cgc_roles)), '')
+    df_genes = df_genes[df_genes.index.notna()]
+    df_genes.index.name = 'geneSymbol'
+    return df_genes
+
+
+def annotate_genes(gene_symbols):
+    """Join the gene annotation table onto gene symbols (as given, not HUGO-normalized) in one merge; rows stay in input order"""
+    genes = pd.Series(list(gene_symbols), dtype=object)
+    df_genes = gene_annotation_table()
+    merged = pd.DataFrame({'geneSymbol': genes}).merge(df_genes, left_on='geneSymbol', right_index=True, how='left')
+    merged['Role_in_Cancer'] = merged['Role_in_Cancer'].where(merged['geneSymbol'].isin(df_genes.index), '')
+    # link_generator では None を「該当なし」として扱う
+    for column in ['CiVIC_URL', 'Entrez_ID']:
+        merged[column] = merged[column].astype(object).where(merged[column].notna(), None)
+    return merged.reset_index(drop=True)
+
+
+def _fill_gene_annotations(rows, gene_key='geneSymbol'):
+    """Set Role_in_Cancer on each row dict from one annotate_genes merge and return the per-row annotations"""
+    gene_annotations = annotate_genes(row.get(gene_key) for row in rows).to_dict('records')
+    for row, gene_annotation in zip(rows, gene_annotations):
+        row['Role_in_Cancer'] = gene_annotation['Role_in_Cancer']
+    return gene_annotations
+
+
+def _read_cancer_gene_census(cancergenecensus_path):
     df_cgc = pd.read_csv(cancergenecensus_path, sep='\t', encoding='utf-8')
     df_cgc = df_cgc[['GENE_SYMBOL', 'ROLE_IN_CANCER', 'TIER']].copy()
     df_cgc['ROLE_IN_CANCER'] = df_cgc['ROLE_IN_CANCER'].replace({'oncogene': 'OG', 'fusion': 'FU'}, regex=True).str.replace(', ', '/', regex=False)
@@ -53,45 +93,58 @@ def cancer_gene_census():
 
 
 def cancer_mutation_census():
-    cosmic_files = glob.glob(Database.COSMIC_37_PATH)
+    mutationcensus_path = _census_path(Database.COSMIC_37_PATH)
+    return reference_registry.load('cancer_mutation_census', mutationcensus_path, _read_cancer_mutation_census)
 
-    if not cosmic_files:
-        raise FileNotFoundError(f"No file matching pattern: {Database.COSMIC_37_PATH}")
-    
-    mutationcensus_path = cosmic_files[0]
 
-    df_cmc = pd.read_csv(mutationcensus_path, sep='\t', encoding='utf-8', compression='gzip')
-    df_cmc = df_cmc[['GENE_NAME', 'Mutation CDS', 'COSMIC_SAMPLE_MUTATED']].copy()
+def cancer_mutation_census_index():
+    """(gene symbol, cDNA change) -> COSMIC sample count built once per Cancer Mutation Census file"""
+    mutationcensus_path = _census_path(Database.COSMIC_37_PATH)
+    return reference_registry.load(
+        'cancer_mutation_census_index', mutationcensus_path,
+        lambda _: first_row_index(cancer_mutation_census(), ['geneSymbol', 'cdsChange'], 'COSMIC_Mutation')
+    )
+
+
+def _read_cancer_mutation_census(mutationcensus_path):
+    # コンパイル済みの列ストアがあれば必要な列だけを読み込む
+    df_cmc = read_census('cmc_slim', mutationcensus_path, ['GENE_NAME', 'Mutation CDS', 'COSMIC_SAMPLE_MUTATED'])
     df_cmc = df_cmc.rename(columns={'GENE_NAME': 'geneSymbol', 'Mutation CDS': 'cdsChange', 'COSMIC_SAMPLE_MUTATED': 'COSMIC_Mutation'})
     return df_cmc
 
 
 def process_hemsight(analysis_type, json_data, template_path, date, normal_sample, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
-    data = json.loads(json_data)
-    wb = openpyxl.load_workbook(template_path)
-    output_stream = BytesIO()
+    data = hemesight_report(json_data)
+    wb = load_template(template_path)
+    # excel_* に渡すシートの DataFrame（ブックを保存して読み直さない）
+    frames = {}
 
     write_df_to_sheet(data.get('testInfo', []), 'TestInfo', wb)
-    write_df_to_sheet(data.get('caseData', []), 'CaseData', wb)
+    frames['CaseData'] = write_df_to_sheet(data.get('caseData', []), 'CaseData', wb)
 
     short_variants = data.get('variants', {}).get('shortVariants', [])
 
-    df_cgc = cancer_gene_census() 
-    
     transcripts_data = []
     for variant in short_variants:
         for transcript in variant.get('transcripts', []):
             flat_data = {**variant, **transcript}
             flat_data.pop('transcripts', None)
             transcripts_data.append(flat_data)
+
+    # 遺伝子単位の注釈を一括で結合
+    gene_annotations = _fill_gene_annotations(transcripts_data)
+
+    # GeneBe・ClinVar への問い合わせをレポート単位でまとめて実行
+    genebe_results = fetch_genebe_batch([(row.get('transcriptId'), row.get('cdsChange')) for row in transcripts_data])
+    clinvar_results = fetch_clinvar_batch(
+        (transcript_id, cds_change, result[6], result[1]) for (transcript_id, cds_change), result in genebe_results.items()
+    )
  
     progress_text = st.empty()        
-    for i, row in enumerate(transcripts_data):
+    tasks = []
+    for row, gene_annotation in zip(transcripts_data, gene_annotations):
         transcript_id = row.get('transcriptId')
         gene_symbol = row.get('geneSymbol')
-        role_row = df_cgc[df_cgc['geneSymbol'] == gene_symbol]
-        role_in_cancer = role_row['Role'].values[0] if not role_row.empty else ''
-        row['Role_in_Cancer'] = role_in_cancer 
         amino_acids_change = row.get('aminoAcidsChange')
         cds_change = row.get('cdsChange')
         chromosome = row.get('chromosome')
@@ -102,12 +155,16 @@ def process_hemsight(analysis_type, json_data, template_path, date, normal_sampl
         dbsnp = row.get('database').get('dbSNP')
         if isinstance(dbsnp, list):
             dbsnp = dbsnp[0] if dbsnp else '' 
-            
-        progress_text.text(f"Processing {i + 1} of {len(transcripts_data)} variants...")
         
-        link_generator(analysis_type, row, gene_id, transcript_id, chromosome, pos, ref, alt, cds_change, gene_symbol, amino_acids_change, dbsnp)
+        tasks.append(partial(link_generator, analysis_type, row, gene_id, transcript_id, chromosome, pos, ref, alt, cds_change, gene_symbol, amino_acids_change, dbsnp,
+                             genebe_result=genebe_results.get((transcript_id, cds_change)),
+                             clinvar_result=clinvar_results.get((transcript_id, cds_change)),
+                             gene_annotation=gene_annotation))
 
-    write_df_to_sheet(transcripts_data, 'ShortVariants', wb)
+    # ネットワーク待ちの多い注釈処理を並列実行
+    run_annotations(tasks, progress_text)
+
+    frames['ShortVariants'] = write_df_to_sheet(transcripts_data, 'ShortVariants', wb)
 
     rearrangements = data.get('variants', {}).get('rearrangements', [])
     breakends_data = []
@@ -118,7 +175,7 @@ def process_hemsight(analysis_type, json_data, template_path, date, normal_sampl
                 flat_data.pop('breakends', None)
                 flat_data.pop('transcripts', None)
                 breakends_data.append(flat_data)
-    write_df_to_sheet(breakends_data, 'Rearrangements', wb)
+    frames['Rearrangements'] = write_df_to_sheet(breakends_data, 'Rearrangements', wb)
 
     write_df_to_sheet(data.get('sequencingSamples', []), 'SequencingSamples', wb)
     write_df_to_sheet(data.get('sampleIdentity', []), 'SampleIdentity', wb)
@@ -150,25 +207,18 @@ def process_hemsight(analysis_type, json_data, template_path, date, normal_sampl
                     flat_data[f'{evidence["type"]}_level'] = evidence.get('level', '-')
                     flat_data[f'{evidence["type"]}_evidence'] = evidence.get('evidence', '-')
             fast_track_data.append(flat_data)
-    write_df_to_sheet(fast_track_data, 'FastTrack', wb)
-
-    wb.save(output_stream)
-    output_stream.seek(0)
+    frames['FastTrack'] = write_df_to_sheet(fast_track_data, 'FastTrack', wb)
 
+    # 中間ブックは保存せずメモリ上のまま引き渡す（シリアライズは excel_hemesight の最後の1回のみ）
     from .excel_handling import excel_hemesight
-    output_stream = excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
-
-    def process_rearrangements(output_stream):
-        df_rearrangements = pd.read_excel(output_stream, sheet_name='Rearrangements')
-        proteinpaint_path = 'proteinpaint.tsv'
-        disco_path = 'disco.tsv'
+    df_rearrangements = sheet_frame(frames['Rearrangements'])
+    output_stream = excel_hemesight(analysis_type, wb, frames, date, normal_sample, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
 
+    def process_rearrangements(df_rearrangements):
         if df_rearrangements.empty or 'geneSymbol' not in df_rearrangements.columns:
             df_empty_pp = pd.DataFrame(columns=['itemId', 'chr_a', 'chr_b', 'gene_a', 'gene_b', 'strand_a', 'strand_b', 'position_a', 'position_b', 'refseq_a', 'refseq_b'])
-            df_empty_pp.to_csv(proteinpaint_path, sep='\t', index=False)
             df_empty_disco = pd.DataFrame(columns=Columns.DISCO)
-            df_empty_disco.to_csv(disco_path, sep='\t', index=False)
-            return proteinpaint_path, disco_path
+            return tsv_stream(df_empty_pp), tsv_stream(df_empty_disco)
 
         df_proteinpaint = df_rearrangements.copy()
         if 'transcriptId' in df_proteinpaint.columns:
@@ -188,136 +238,138 @@ def process_hemsight(analysis_type, json_data, template_path, date, normal_sampl
         df_proteinpaint['refseq_b'] = df_proteinpaint['refseq_b'].str.split('.').str[0]
         df_proteinpaint['strand_a'] = df_proteinpaint['strand_a'].apply(lambda x: '+' if x == 'downstream' else '-')
         df_proteinpaint['strand_b'] = df_proteinpaint['strand_b'].apply(lambda x: '+' if x == 'downstream' else '-')
-        proteinpaint_path = 'proteinpaint.tsv'
-        df_proteinpaint.to_csv(proteinpaint_path, sep='\t', index=False)
         
         df_disco = df_proteinpaint[Columns.PROTEINPAINT].copy()
         df_disco = df_disco[Columns.DISCO].copy()
         df_disco['chr_a'] = 'chr' + df_disco['chr_a'].astype(str)
         df_disco['chr_b'] = 'chr' + df_disco['chr_b'].astype(str)
-        disco_path = 'disco.tsv'
-        df_disco.to_csv(disco_path, sep='\t', index=False)
-        return proteinpaint_path, disco_path
+        return tsv_stream(df_proteinpaint), tsv_stream(df_disco)
     
-    proteinpaint_path, disco_path = process_rearrangements(output_stream)
+    # ProteinPaint / Disco 用 TSV はメモリ上に作成（同時実行のセッション間で作業ディレクトリを共有しない）
+    proteinpaint_stream, disco_stream = process_rearrangements(df_rearrangements)
     output_stream.seek(0)
-    return output_stream, proteinpaint_path, disco_path
+    return output_stream, proteinpaint_stream, disco_stream
 
 
 def process_foundationone(analysis_type, xml_data, template_path, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
-    # Parse XML data with namespace
+    # 各セクションを一回の走査で取得（同じファイルの解析結果は他のページと共有）
     try:
-        root = ET.fromstring(xml_data)
-        ns = Base.NEME_SPACE
+        report = foundationone_report(xml_data)
     except ET.ParseError as e:
         st.error(f"XML解析エラー: {e}")
         return None, None, None, None, None, None, None, None, None, None, None
 
-    wb = openpyxl.load_workbook(template_path)
-    output_stream = BytesIO()
+    wb = load_template(template_path)
+    frames = {}
 
     # Extract variant report
     variant_report = []
-    for variant in root.findall('.//vr:variant-report', ns):
+    for variant in report.variant_reports:
         variant_report.append({
-            'testType': variant.get('test-type', ''),
-            'gender': variant.get('gender', ''),
-            'disease': variant.get('disease', ''),
-            'diseaseOntology': variant.get('disease-ontology', ''),
-            'tissueOfOrigin': variant.get('tissue-of-origin', ''),
-            'pathologyDiagnosis': variant.get('pathology-diagnosis', ''),
-            'percentTumorNuclei': variant.get('percent-tumor-nuclei', ''),
-            'purityAssessment': variant.get('purity-assessment', ''),
-            'specimen': variant.get('specimen', ''),
-            'flowcellAnalysis': variant.get('flowcell-analysis', ''),
-            'pipelineVersion': variant.get('pipeline-version', ''),
-            'study': variant.get('study', ''),
-            'testRequest': variant.get('test-request', ''),
+            'testType': variant.test_type or '',
+            'gender': variant.gender or '',
+            'disease': variant.disease or '',
+            'diseaseOntology': variant.disease_ontology or '',
+            'tissueOfOrigin': variant.tissue_of_origin or '',
+            'pathologyDiagnosis': variant.pathology_diagnosis or '',
+            'percentTumorNuclei': variant.percent_tumor_nuclei or '',
+            'purityAssessment': variant.purity_assessment or '',
+            'specimen': variant.specimen or '',
+            'flowcellAnalysis': variant.flowcell_analysis or '',
+            'pipelineVersion': variant.pipeline_version or '',
+            'study': variant.study or '',
+            'testRequest': variant.test_request or '',
         })
     write_df_to_sheet(variant_report, 'VariantReport', wb)
     
     # Extract sample
     sample_data = []
     sample_id = 1
-    for sample in root.findall('.//vr:sample', ns):
+    for sample in report.samples:
         sample_data.append({
-            'name': sample.get('name', ''),
-            'baitSet': sample.get('bait-set', ''),
-            'nucleicAcidType': sample.get('nucleic-acid-type', ''),
-            'meanExonDepth': sample.get('mean-exon-depth', ''),
+            'name': sample.name or '',
+            'baitSet': sample.bait_set or '',
+            'nucleicAcidType': sample.nucleic_acid_type or '',
+            'meanExonDepth': sample.mean_exon_depth or '',
         })
         sample_id += 1
     write_df_to_sheet(sample_data, 'Sample', wb)
     
     # Extract QC
     qc_data = []
-    for qc in root.findall('.//vr:quality-control', ns):
+    for qc in report.quality_controls:
         qc_data.append({
-            'status': qc.get('status', '')
+            'status': qc.status or ''
         })
         sample_id += 1
     write_df_to_sheet(qc_data, 'QC', wb)
 
-    df_cgc = cancer_gene_census()
-    df_cmc = cancer_mutation_census()
+    cmc_index = cancer_mutation_census_index()
     
     variants_data = []
     variant_id = 1
-    for variant in root.findall('.//vr:short-variant', ns):
-        position = variant.get('position', '')
+    for variant in report.short_variants:
+        position = variant.position or ''
         chromosome = position.split(':')[0].replace('chr', '') if ':' in position else ''
         pos = position.split(':')[1] if ':' in position else ''
-        allele_fraction = float(variant.get('allele-fraction', '0'))
-        depth = int(variant.get('depth', '0'))
-        gene_symbol = variant.get('gene', '')
+        allele_fraction = float(variant.allele_fraction or '0')
+        depth = int(variant.depth or '0')
+        gene_symbol = variant.gene or ''
         gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-        cds_change = 'c.' + variant.get('cds-effect', '')
-        
-        role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
+        cds_change = 'c.' + (variant.cds_effect or '')
         
-        cosmic_mutation = (
-            df_cmc[(df_cmc['geneSymbol'] == gene_symbol) & (df_cmc['cdsChange'] == cds_change)]['COSMIC_Mutation'].values[0]
-            if not df_cmc[(df_cmc['geneSymbol'] == gene_symbol) & (df_cmc['cdsChange'] == cds_change)].empty
-            else ''
-        )
+        cosmic_mutation = cmc_index.get((gene_symbol, cds_change), '')
 
         # aminoacidの値を取得し、p.を追加
-        amino_acid_change = variant.get('protein-effect', '')
+        amino_acid_change = variant.protein_effect or ''
         if amino_acid_change:
             amino_acid_change = 'p.' + amino_acid_change
             amino_acid_change = amino_acid_change.replace('p.splice site ', 'c.')
             amino_acid_change = amino_acid_change.replace('p.promoter ', 'c.')
         
         # cdsの値を取得し、'splice site 'を削除してc.を追加
-        cds_change = variant.get('cds-effect', '')
+        cds_change = variant.cds_effect or ''
         if cds_change:
             cds_change = 'c.' + cds_change
 
         var_data = {
             'geneSymbol': gene_symbol,
-            'Role_in_Cancer': role_in_cancer,
+            'Role_in_Cancer': '',
             'aminoAcidsChange': amino_acid_change,
             'cdsChange': cds_change,
             'alternateAlleleReadDepth': str(round(allele_fraction * depth)),
-            'totalReadDepth': variant.get('depth', ''),
+            'totalReadDepth': variant.depth or '',
             'chromosome': chromosome,
             'position': pos,
-            'transcriptId': variant.get('transcript', ''),
-            'strand': variant.get('strand', ''),
-            'equivocal': variant.get('equivocal', ''),
-            'functional_effect': variant.get('functional-effect', ''),
-            'status': variant.get('status', ''),
+            'transcriptId': variant.transcript or '',
+            'strand': variant.strand or '',
+            'equivocal': variant.equivocal or '',
+            'functional_effect': variant.functional_effect or '',
+            'status': variant.status or '',
             'COSMIC_Mutation': cosmic_mutation,
         }
         variants_data.append(var_data)
         variant_id += 1
 
+    # 遺伝子単位の注釈を一括で結合
+    gene_annotations = _fill_gene_annotations(variants_data)
+
+    # GeneBe・ClinVar への問い合わせをレポート単位でまとめて実行
+    transcript_id_mapping = Transcript.TRANSCRIPT_ID
+    genebe_results = fetch_genebe_batch([
+        (transcript_id_mapping.get(row.get('geneSymbol'), row.get('transcriptId')), row.get('cdsChange'))
+        for row in variants_data
+    ])
+    clinvar_results = fetch_clinvar_batch(
+        (transcript_id, cds_change, result[6], result[1]) for (transcript_id, cds_change), result in genebe_results.items()
+    )
+
     progress_text = st.empty()
-    for i, row in enumerate(variants_data):
+    tasks = []
+    for row, gene_annotation in zip(variants_data, gene_annotations):
         gene_symbol = row.get('geneSymbol')
         transcript_id = row.get('transcriptId')
         # gene_symbolがMUTYHの場合、transcript_idをNM_001048171.1に設定
-        transcript_id_mapping = Transcript.TRANSCRIPT_ID
         if gene_symbol in transcript_id_mapping:
             transcript_id = transcript_id_mapping[gene_symbol]
     
@@ -329,124 +381,126 @@ def process_foundationone(analysis_type, xml_data, template_path, date, ep_insti
         alt = row.get('alternateAllele')
         gene_id = row.get('geneID')
         dbsnp = row.get('dbSNP')
-
-        progress_text.text(f"Processing {i + 1} of {len(variants_data)} variants.... φ(..)")
         
-        link_generator(analysis_type, row, gene_id, transcript_id, chromosome, pos, ref, alt, cds_change, gene_symbol, amino_acids_change, dbsnp)
+        tasks.append(partial(link_generator, analysis_type, row, gene_id, transcript_id, chromosome, pos, ref, alt, cds_change, gene_symbol, amino_acids_change, dbsnp,
+                             genebe_result=genebe_results.get((transcript_id, cds_change)),
+                             clinvar_result=clinvar_results.get((transcript_id, cds_change)),
+                             gene_annotation=gene_annotation))
+
+    # ネットワーク待ちの多い注釈処理を並列実行
+    run_annotations(tasks, progress_text)
 
-    write_df_to_sheet(variants_data, 'SNV_Indel', wb)
+    frames['SNV_Indel'] = write_df_to_sheet(variants_data, 'SNV_Indel', wb)
     
     # Extract CNV
     cnv_data = []
-    for cnv in root.findall('.//vr:copy-number-alteration', ns):
+    for cnv in report.copy_number_alterations:
         
-        gene_symbol = cnv.get('gene', '')
+        gene_symbol = cnv.gene or ''
         gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-        role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
         
         cnv_data.append({
             'geneSymbol': gene_symbol,
-            'Role_in_Cancer': role_in_cancer,
-            'copyNumber': cnv.get('copy-number', ''),
-            'equivocal': cnv.get('equivocal', ''),
-            'numberOfExons': cnv.get('number-of-exons', ''),
-            'position': cnv.get('position', ''),
-            'ratio': cnv.get('ratio', ''),
-            'status': cnv.get('status', ''),
-            'type': cnv.get('type', '')
+            'Role_in_Cancer': '',
+            'copyNumber': cnv.copy_number or '',
+            'equivocal': cnv.equivocal or '',
+            'numberOfExons': cnv.number_of_exons or '',
+            'position': cnv.position or '',
+            'ratio': cnv.ratio or '',
+            'status': cnv.status or '',
+            'type': cnv.type or ''
         })
         variant_id += 1
 
-    write_df_to_sheet(cnv_data, 'CNV', wb)
+    _fill_gene_annotations(cnv_data)
+    frames['CNV'] = write_df_to_sheet(cnv_data, 'CNV', wb)
         
     # Extract rearrangements
     rearrangements_data = []
-    for rearrangement in root.findall('.//vr:rearrangement', ns):
+    for rearrangement in report.rearrangements:
         
-        gene_symbol = rearrangement.get('targeted-gene', '')
-        gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-        role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
         rearrangements_data.append({
-            'geneSymbol': rearrangement.get('targeted-gene', ''),
-            'Role_in_Cancer': role_in_cancer,
-            'alleleFraction': float(rearrangement.get('allele-fraction', '0')),
-            'description': rearrangement.get('description', ''),
-            'equivocal': rearrangement.get('equivocal', ''),
-            'inFrame': rearrangement.get('in-frame', ''),
-            'otherGene': rearrangement.get('other-gene', ''),
-            'percentReads': rearrangement.get('percent-reads', ''),
-            'pos1': rearrangement.get('pos1', ''),
-            'pos2': rearrangement.get('pos2', ''),
-            'status': rearrangement.get('status', ''),
-            'supportingReadPairs': rearrangement.get('supporting-read-pairs', ''),
-            'type': rearrangement.get('type', '')
+            'geneSymbol': rearrangement.targeted_gene or '',
+            'Role_in_Cancer': '',
+            'alleleFraction': float(rearrangement.allele_fraction or '0'),
+            'description': rearrangement.description or '',
+            'equivocal': rearrangement.equivocal or '',
+            'inFrame': rearrangement.in_frame or '',
+            'otherGene': rearrangement.other_gene or '',
+            'percentReads': rearrangement.percent_reads or '',
+            'pos1': rearrangement.pos1 or '',
+            'pos2': rearrangement.pos2 or '',
+            'status': rearrangement.status or '',
+            'supportingReadPairs': rearrangement.supporting_read_pairs or '',
+            'type': rearrangement.type or ''
         })
         variant_id += 1
 
-    write_df_to_sheet(rearrangements_data, 'Fusion', wb)
+    # Role_in_Cancer は HUGO 名に正規化した targeted-gene で結合（geneSymbol 列は元の名前のまま）
+    rearrangement_genes = [Gene.HUGO_SYMBOL.get(row['geneSymbol'], row['geneSymbol']) for row in rearrangements_data]
+    for row, role_in_cancer in zip(rearrangements_data, annotate_genes(rearrangement_genes)['Role_in_Cancer']):
+        row['Role_in_Cancer'] = role_in_cancer
+    frames['Fusion'] = write_df_to_sheet(rearrangements_data, 'Fusion', wb)
         
     # Extract MSI
     msi_data = []
-    for msi in root.findall('.//vr:microsatellite-instability', ns):
+    for msi in report.microsatellite_instabilities:
         msi_data.append({
-            'status': msi.get('status', '')
+            'status': msi.status or ''
         })
         variant_id += 1
-    write_df_to_sheet(msi_data, 'MSI', wb)
+    frames['MSI'] = write_df_to_sheet(msi_data, 'MSI', wb)
     
     # Extract TMB
     tmb_data = []
-    for tmb in root.findall('.//vr:tumor-mutation-burden', ns):
+    for tmb in report.tumor_mutation_burdens:
         tmb_data.append({
-            'score': tmb.get('score', ''),
-            'unit': tmb.get('unit', ''),
-            'status': tmb.get('status', ''),
+            'score': tmb.score or '',
+            'unit': tmb.unit or '',
+            'status': tmb.status or '',
         })
         variant_id += 1
     write_df_to_sheet(tmb_data, 'TMB', wb)
         
     # Extract non-human
     non_human_data = []
-    for non_human in root.findall('.//vr:non-human', ns):
+    for non_human in report.non_humans:
         non_human_data.append({
-            'organism': non_human.get('organism', ''),
-            'Reads-per-million': non_human.get('reads-per-million', ''),
-            'status': non_human.get('status', '')
+            'organism': non_human.organism or '',
+            'Reads-per-million': non_human.reads_per_million or '',
+            'status': non_human.status or ''
         })
         variant_id += 1
         
     write_df_to_sheet(non_human_data, 'nonHuman', wb)
     
-    wb.save(output_stream)
-    output_stream.seek(0)
-    
     from .excel_handling import excel_foundationone
-    output_stream = excel_foundationone(analysis_type, output_stream, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
+    output_stream = excel_foundationone(analysis_type, wb, frames, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
     output_stream.seek(0)
     return output_stream
 
 
 def process_genminetop(analysis_type, xml_data, template_path, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
 
-    root = ET.fromstring(xml_data)
-    wb = openpyxl.load_workbook(template_path)
-    output_stream = BytesIO()
+    # 各セクションを一回の走査で取得（同じファイルの解析結果は他のページと共有）
+    report = genminetop_report(xml_data)
+    wb = load_template(template_path)
+    frames = {}
 
-    df_cgc = cancer_gene_census()
-    df_cmc = cancer_mutation_census()
+    cmc_index = cancer_mutation_census_index()
     
     # Basic Information
     basic_info = []
-    hospital = root.findtext('./report/owner/hospital', '')
-    doctor = root.findtext('./report/owner/doctor', '')
-    sex = root.findtext('./report/patient/sex', '')
-    age = root.findtext('./report/patient/age', '')
-    patient_id = root.findtext('./report/patient/id', '').replace('043000', '')
-    ccat_id = root.findtext('./report/patient/c-cat-id', '')
-    pathology = root.findtext('./report/specimen/pathology', '')
+    hospital = report.field('hospital', '')
+    doctor = report.field('doctor', '')
+    sex = report.field('sex', '')
+    age = report.field('age', '')
+    patient_id = report.field('patient_id', '').replace('043000', '')
+    ccat_id = report.field('c_cat_id', '')
+    pathology = report.field('pathology', '')
     organ = pathology.split(')_')[1].split(' -')[0]
     disease = pathology.split('_')[-1]
-    germline_disclosure = root.findtext('./report/preference/germline-disclosure', '')
+    germline_disclosure = report.field('germline_disclosure', '')
     germline_disclosure = '開示希望あり' if germline_disclosure == 'true' else '開示希望なし'
     
     basic_info.append({
@@ -463,35 +517,33 @@ def process_genminetop(analysis_type, xml_data, template_path, date, ep_institut
     })
     write_df_to_sheet(basic_info, 'Sample', wb)
 
-    reference_sections = {
-        'db': ['./report/reference/db/item', ['name', 'version', 'released-at']],
-        'snp-db': ['./report/reference/snp-db/item', ['name', 'version', 'genome']],
-        'resource': ['./report/reference/resource/item', ['name', 'version']],
-        'program': ['./report/reference/program/item', ['name', 'version']]
+    reference_fields = {
+        'db': ['name', 'version', 'released_at'],
+        'snp-db': ['name', 'version', 'genome'],
+        'resource': ['name', 'version'],
+        'program': ['name', 'version']
     }
 
     all_reference_data = []
 
-    for source, (xpath, fields) in reference_sections.items():
-        for item in root.findall(xpath):
-            entry = {'source': source}
+    for source, fields in reference_fields.items():
+        for item in report.references[source]:
+            entry = {'source': item.source}
             for field in fields:
-                entry[field.replace('-', '_')] = item.findtext(field, '')
+                entry[field] = getattr(item, field) or ''
             all_reference_data.append(entry)
 
     write_df_to_sheet(all_reference_data, 'DB', wb)
 
     # QC以下の全データを取得
     qc_data = []
-    for qc in root.findall('./report/qc'):
+    for qc in report.qc:
         qc_entry = {}
         
         def extract_sample_info(qc_entry, qc, path, prefix):
-            node = qc.find(path)
-            if node is not None:
-                qc_entry[f'{prefix}_id'] = node.findtext('id')
-                sample = node.find('sample')
-                if sample is not None:
+            if qc.has(path):
+                qc_entry[f'{prefix}_id'] = qc.text(f'{path}/id')
+                if qc.has(f'{path}/sample'):
                     for field in [
                         'quantity-qubit',
                         'ddcq',
@@ -502,59 +554,56 @@ def process_genminetop(analysis_type, xml_data, template_path, date, ep_institut
                         'mol-density'
                     ]:
                         key = f'{prefix}_{field.replace("-", "_")}'
-                        qc_entry[key] = sample.findtext(field)
-        extract_sample_info(qc_entry, qc, './library/normal/dna', 'normal')
-        extract_sample_info(qc_entry, qc, './library/tumor/dna', 'tumor')
-        extract_sample_info(qc_entry, qc, './library/tumor/rna', 'rna')
+                        qc_entry[key] = qc.text(f'{path}/sample/{field}')
+        extract_sample_info(qc_entry, qc, 'library/normal/dna', 'normal')
+        extract_sample_info(qc_entry, qc, 'library/tumor/dna', 'tumor')
+        extract_sample_info(qc_entry, qc, 'library/tumor/rna', 'rna')
 
 
         # ---------- SNP Correlation ----------
-        qc_entry['snp_correlation'] = qc.findtext('./sequence/snp-correlation/value')
+        qc_entry['snp_correlation'] = qc.text('sequence/snp-correlation/value')
 
         def extract_sequence_info(qc_entry, qc, path, prefix, depths):
-            seq_node = qc.find(path)
-            if seq_node is not None:
-                qc_entry[f'{prefix}_seq_id'] = seq_node.findtext('id')
-                qc_entry[f'{prefix}_status'] = seq_node.findtext('status')
-                qc_entry[f'{prefix}_num_unique_reads'] = seq_node.findtext('num-unique-reads/value')
-                qc_entry[f'{prefix}_cluster_density'] = seq_node.findtext('cluster-density/value')
-                qc_entry[f'{prefix}_map_ratio'] = seq_node.findtext('map-ratio/value')
-                qc_entry[f'{prefix}_num_mapped_reads'] = seq_node.findtext('num-mapped-reads/value')
-                qc_entry[f'{prefix}_per_gt_q30'] = seq_node.findtext('per-gt-q30/value')
-                qc_entry[f'{prefix}_num_total_reads'] = seq_node.findtext('num-total-reads/value')
-                qc_entry[f'{prefix}_fragment_mean'] = seq_node.findtext('fragment/mean')
-                qc_entry[f'{prefix}_fragment_sd'] = seq_node.findtext('fragment/standard-deviation')
-                qc_entry[f'{prefix}_unique_read_ratio'] = seq_node.findtext('unique-read-ratio/value')
-                qc_entry[f'{prefix}_cluster_pf'] = seq_node.findtext('cluster-pf/value')
-                qc_entry[f'{prefix}_ontarget_ratio'] = seq_node.findtext('ontarget-ratio/value')
-                qc_entry[f'{prefix}_mean_depth'] = seq_node.findtext('mean-depth/value')
+            if qc.has(path):
+                qc_entry[f'{prefix}_seq_id'] = qc.text(f'{path}/id')
+                qc_entry[f'{prefix}_status'] = qc.text(f'{path}/status')
+                qc_entry[f'{prefix}_num_unique_reads'] = qc.text(f'{path}/num-unique-reads/value')
+                qc_entry[f'{prefix}_cluster_density'] = qc.text(f'{path}/cluster-density/value')
+                qc_entry[f'{prefix}_map_ratio'] = qc.text(f'{path}/map-ratio/value')
+                qc_entry[f'{prefix}_num_mapped_reads'] = qc.text(f'{path}/num-mapped-reads/value')
+                qc_entry[f'{prefix}_per_gt_q30'] = qc.text(f'{path}/per-gt-q30/value')
+                qc_entry[f'{prefix}_num_total_reads'] = qc.text(f'{path}/num-total-reads/value')
+                qc_entry[f'{prefix}_fragment_mean'] = qc.text(f'{path}/fragment/mean')
+                qc_entry[f'{prefix}_fragment_sd'] = qc.text(f'{path}/fragment/standard-deviation')
+                qc_entry[f'{prefix}_unique_read_ratio'] = qc.text(f'{path}/unique-read-ratio/value')
+                qc_entry[f'{prefix}_cluster_pf'] = qc.text(f'{path}/cluster-pf/value')
+                qc_entry[f'{prefix}_ontarget_ratio'] = qc.text(f'{path}/ontarget-ratio/value')
+                qc_entry[f'{prefix}_mean_depth'] = qc.text(f'{path}/mean-depth/value')
 
                 for d in depths:
-                    qc_entry[f'{prefix}_cover_depth_{d}'] = seq_node.findtext(f'cover-ratio/value/depth-{d}')
+                    qc_entry[f'{prefix}_cover_depth_{d}'] = qc.text(f'{path}/cover-ratio/value/depth-{d}')
                     
-        extract_sequence_info(qc_entry, qc, './sequence/normal/dna', 'normal', [1, 100, 143, 200])
-        extract_sequence_info(qc_entry, qc, './sequence/tumor/dna', 'tumor', [1, 100, 183, 200])
+        extract_sequence_info(qc_entry, qc, 'sequence/normal/dna', 'normal', [1, 100, 143, 200])
+        extract_sequence_info(qc_entry, qc, 'sequence/tumor/dna', 'tumor', [1, 100, 183, 200])
 
 
         # ---------- Tumor RNA Sequence ----------
-        tumor_rna_seq = qc.find('./sequence/tumor/rna')
-        if tumor_rna_seq is not None:
-            qc_entry['rna_status'] = tumor_rna_seq.findtext('status')
-            qc_entry['rna_seq_id'] = tumor_rna_seq.findtext('id')
-            qc_entry['rna_total_reads'] = tumor_rna_seq.findtext('num-total-reads/value')
-            qc_entry['rna_cluster_density'] = tumor_rna_seq.findtext('cluster-density/value')
-            qc_entry['rna_cluster_pf'] = tumor_rna_seq.findtext('cluster-pf/value')
-            qc_entry['rna_per_gt_q30'] = tumor_rna_seq.findtext('per-gt-q30/value')
+        if qc.has('sequence/tumor/rna'):
+            qc_entry['rna_status'] = qc.text('sequence/tumor/rna/status')
+            qc_entry['rna_seq_id'] = qc.text('sequence/tumor/rna/id')
+            qc_entry['rna_total_reads'] = qc.text('sequence/tumor/rna/num-total-reads/value')
+            qc_entry['rna_cluster_density'] = qc.text('sequence/tumor/rna/cluster-density/value')
+            qc_entry['rna_cluster_pf'] = qc.text('sequence/tumor/rna/cluster-pf/value')
+            qc_entry['rna_per_gt_q30'] = qc.text('sequence/tumor/rna/per-gt-q30/value')
             # ハウスキーピング遺伝子情報
-            hk_gene = tumor_rna_seq.find('hk-gene')
-            if hk_gene is not None:
-                qc_entry['hk_num_reads'] = hk_gene.findtext('num-reads')
-                qc_entry['hk_reads_per_1kbp'] = hk_gene.findtext('num-reads-per-1kbp')
-                qc_entry['hk_cover_ratio'] = hk_gene.findtext('cover-ratio/value')
+            if qc.has('sequence/tumor/rna/hk-gene'):
+                qc_entry['hk_num_reads'] = qc.text('sequence/tumor/rna/hk-gene/num-reads')
+                qc_entry['hk_reads_per_1kbp'] = qc.text('sequence/tumor/rna/hk-gene/num-reads-per-1kbp')
+                qc_entry['hk_cover_ratio'] = qc.text('sequence/tumor/rna/hk-gene/cover-ratio/value')
 
         # ---------- Tumor Content ----------
-        qc_entry['tumor_estimated_content'] = qc.findtext('./tumor-content/estimated/value')
-        qc_entry['tumor_nuclei_content'] = qc.findtext('./tumor-content/nuclei/value')
+        qc_entry['tumor_estimated_content'] = qc.text('tumor-content/estimated/value')
+        qc_entry['tumor_nuclei_content'] = qc.text('tumor-content/nuclei/value')
 
         # ---------- Append ----------
         qc_data.append(qc_entry)
@@ -563,23 +612,22 @@ def process_genminetop(analysis_type, xml_data, template_path, date, ep_institut
     
     # MSI
     msi_data = []
-    for msi in root.findall('./report/result/marker/msi'):
+    for msi in report.msi:
         msi_entry = {
-            'score': msi.findtext('score/value', ''),
-            'status': msi.findtext('status', ''),
+            'score': msi.score or '',
+            'status': msi.status or '',
         }
         msi_data.append(msi_entry)
     write_df_to_sheet(msi_data, 'MSI', wb)
         
     # TMB
     tmb_data = []
-    for tmb in root.findall('./report/result/marker/tmb'):
-        for exon in tmb.findall('exon'):
-            tmb_entry = {
-                'num_non_synonymous_alterations': exon.findtext('num-non-synonymous-alterations', ''),
-                'tmb': exon.findtext('frequency-non-synonymous-alterations', ''),
-            }
-            tmb_data.append(tmb_entry)
+    for tmb in report.tmb:
+        tmb_entry = {
+            'num_non_synonymous_alterations': tmb.count or '',
+            'tmb': tmb.score or '',
+        }
+        tmb_data.append(tmb_entry)
     write_df_to_sheet(tmb_data, 'TMB', wb)
 
 
@@ -590,71 +638,59 @@ def process_genminetop(analysis_type, xml_data, template_path, date, ep_institut
     variants_data_cnv = []
     variants_fusion = []
 
-    # get_text 関数をループ外で定義
-    def get_text(elem, tag):
-        child = elem.find(tag)
-        return child.text if child is not None and child.text is not None else ''
-
-    for item in root.findall('./report/result/alterations/item'):
-        variant_type = get_text(item, 'type')
-        origin = get_text(item, 'origin')
-        locus = get_text(item, 'locus')
+    for item in report.alterations:
+        variant_type = item.type or ''
+        origin = item.origin or ''
+        locus = item.locus or ''
         locus_split = locus.split(':') if ':' in locus else ['', '']
         chromosome = locus_split[0].replace('chr', '') if locus_split[0] else ''
         position = locus_split[1] if len(locus_split) > 1 else ''
-        gene_symbol = get_text(item, 'gene')
+        gene_symbol = item.gene or ''
         gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-        transcript_id = get_text(item, 'transcript')
+        transcript_id = item.transcript or ''
         # gene_symbolがMUTYHの場合、transcript_idをNM_001048171.1に設定
         if gene_symbol == 'MUTYH':
             transcript_id = 'NM_001048171.1'
-        cds_change = get_text(item, 'coding-dna-alteration')
+        cds_change = item.cds_change or ''
         
-        role_in_cancer = (
-            df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0]
-            if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
-        )
-        cosmic_mutation = (
-            df_cmc[(df_cmc['geneSymbol'] == gene_symbol) & (df_cmc['cdsChange'] == cds_change)]['COSMIC_Mutation'].values[0]
-            if not df_cmc[(df_cmc['geneSymbol'] == gene_symbol) & (df_cmc['cdsChange'] == cds_change)].empty
-            else ''
-        )
+        cosmic_mutation = cmc_index.get((gene_symbol, cds_change), '')
 
         # breakpointの下のディレクトリにitem要素が２つある場合、itemの下にあるregion, index, length, gene, transcript, chr, posをそれぞれ_1, _2として取得
-        region_1     = item.findtext("breakpoint/item[1]/region", default="")
-        region_2     = item.findtext("breakpoint/item[2]/region", default="")
-        index_1      = item.findtext("breakpoint/item[1]/index", default="")
-        index_2      = item.findtext("breakpoint/item[2]/index", default="")
-        length_1     = item.findtext("breakpoint/item[1]/length", default="")
-        length_2     = item.findtext("breakpoint/item[2]/length", default="")
-        gene_1       = item.findtext("breakpoint/item[1]/gene", default="")
-        gene_2       = item.findtext("breakpoint/item[2]/gene", default="")
-        transcript_1 = item.findtext("breakpoint/item[1]/transcript", default="")
-        transcript_2 = item.findtext("breakpoint/item[2]/transcript", default="")
-        chr_1        = item.findtext("breakpoint/item[1]/chr", default="")
-        chr_2        = item.findtext("breakpoint/item[2]/chr", default="")
-        pos_1        = item.findtext("breakpoint/item[1]/pos", default="")
-        pos_2        = item.findtext("breakpoint/item[2]/pos", default="")
+        point_1, point_2 = (item.breakpoints + (Breakpoint(), Breakpoint()))[:2]
+        region_1     = point_1.region or ''
+        region_2     = point_2.region or ''
+        index_1      = point_1.index or ''
+        index_2      = point_2.index or ''
+        length_1     = point_1.length or ''
+        length_2     = point_2.length or ''
+        gene_1       = point_1.gene or ''
+        gene_2       = point_2.gene or ''
+        transcript_1 = point_1.transcript or ''
+        transcript_2 = point_2.transcript or ''
+        chr_1        = point_1.chr or ''
+        chr_2        = point_2.chr or ''
+        pos_1        = point_1.pos or ''
+        pos_2        = point_2.pos or ''
 
         variant = {
             'geneSymbol': gene_symbol,
             'transcriptId': transcript_id,
-            'Role_in_Cancer': role_in_cancer,
+            'Role_in_Cancer': '',
             'chromosome': chromosome,
             'position': position,
-            'referenceAllele': get_text(item, 'ref'),
-            'alternateAllele': get_text(item, 'alt'),
-            'transcriptId': get_text(item, 'transcript'),
-            'aminoAcidsChange': get_text(item, 'protein-alteration'),
+            'referenceAllele': item.ref or '',
+            'alternateAllele': item.alt or '',
+            'transcriptId': item.transcript or '',
+            'aminoAcidsChange': item.protein_change or '',
             'cdsChange': cds_change,
             'origin': origin,
-            'alternateAlleleFrequency': get_text(item, 'allele-frequency'),
-            'status': get_text(item, 'status'),
+            'alternateAlleleFrequency': item.allele_frequency or '',
+            'status': item.status or '',
             'type': variant_type,
-            'cytoband': get_text(item, 'cytoband'),
-            'copyNumber': get_text(item, 'num-copy'),
-            'ratio': get_text(item, 'ratio'),
-            'frame': get_text(item, 'frame'),
+            'cytoband': item.cytoband or '',
+            'copyNumber': item.num_copy or '',
+            'ratio': item.ratio or '',
+            'frame': item.frame or '',
             'gene_1': gene_1,
             'gene_2': gene_2,
             'transcript_1': transcript_1,
@@ -682,13 +718,27 @@ def process_genminetop(analysis_type, xml_data, template_path, date, ep_institut
         else:
             variants_data_snv_indel.append(variant)
 
+    # 遺伝子単位の注釈を種類ごとに一括結合
+    snv_indel_annotations = _fill_gene_annotations(variants_data_snv_indel)
+    germline_annotations = _fill_gene_annotations(variants_germine)
+    for variants in (variants_data_cnv, variants_fusion, variants_data_expression):
+        _fill_gene_annotations(variants)
+
+    # GeneBe・ClinVar への問い合わせを SNV/Indel・Germline まとめて実行
+    genebe_results = fetch_genebe_batch([
+        (row.get('transcriptId', ''), row.get('cdsChange', ''))
+        for row in variants_data_snv_indel + variants_germine
+    ])
+    clinvar_results = fetch_clinvar_batch(
+        (transcript_id, cds_change, result[6], result[1]) for (transcript_id, cds_change), result in genebe_results.items()
+    )
+
     # SNV/Indel の処理
-    def process_variants(variants, analysis_type, link_generator, label=""):
+    def process_variants(variants, gene_annotations, analysis_type, link_generator, label=""):
         progress_text = st.empty()
-        for i, row in enumerate(variants):
-            progress_text.text(f"Processing {i + 1} of {len(variants)} variants.... φ(..) {label}")
-
-            link_generator(
+        tasks = [
+            partial(
+                link_generator,
                 analysis_type,
                 row,
                 row.get('geneID', ''),
@@ -700,40 +750,45 @@ def process_genminetop(analysis_type, xml_data, template_path, date, ep_institut
                 row.get('cdsChange', ''),
                 row.get('geneSymbol', ''),
                 row.get('aminoAcidsChange', ''),
-                row.get('dbSNP', '')
+                row.get('dbSNP', ''),
+                genebe_result=genebe_results.get((row.get('transcriptId', ''), row.get('cdsChange', ''))),
+                clinvar_result=clinvar_results.get((row.get('transcriptId', ''), row.get('cdsChange', ''))),
+                gene_annotation=gene_annotation
             )
-    process_variants(variants_data_snv_indel, analysis_type, link_generator, label="SNV/INDEL")
-    process_variants(variants_germine, analysis_type, link_generator, label="Germline")
+            for row, gene_annotation in zip(variants, gene_annotations)
+        ]
+        run_annotations(tasks, progress_text, label)
+    process_variants(variants_data_snv_indel, snv_indel_annotations, analysis_type, link_generator, label="SNV/INDEL")
+    process_variants(variants_germine, germline_annotations, analysis_type, link_generator, label="Germline")
     
     # データをExcelシートへ出力
     if variants_data_snv_indel:
-        write_df_to_sheet(variants_data_snv_indel, 'SNV_Indel', wb)
+        frames['SNV_Indel'] = write_df_to_sheet(variants_data_snv_indel, 'SNV_Indel', wb)
     if variants_data_cnv:
-        write_df_to_sheet(variants_data_cnv, 'CNV', wb)
+        frames['CNV'] = write_df_to_sheet(variants_data_cnv, 'CNV', wb)
     if variants_fusion:
-        write_df_to_sheet(variants_fusion, 'Fusion', wb)
+        frames['Fusion'] = write_df_to_sheet(variants_fusion, 'Fusion', wb)
     if variants_data_expression:
         write_df_to_sheet(variants_data_expression, 'EXP', wb)
     if variants_germine:
-        write_df_to_sheet(variants_germine, 'Germline', wb)
+        frames['Germline'] = write_df_to_sheet(variants_germine, 'Germline', wb)
         
-    # ファイル保存
-    wb.save(output_stream)
-    output_stream.seek(0)
-
     from .excel_handling import excel_genminetop
-    output_stream = excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
+    output_stream = excel_genminetop(analysis_type, wb, frames, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
     output_stream.seek(0)
     return output_stream
 
 
 def process_guardant360(analysis_type, xlsx_data, template_path, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
-    wb = openpyxl.load_workbook(template_path)
+    wb = load_template(template_path)
+    frames = {}
+
+    cmc_index = cancer_mutation_census_index()
 
-    df_cgc = cancer_gene_census()
-    df_cmc = cancer_mutation_census()
+    # ブックは一度だけ開いて全シートを読み込む（同じファイルの結果は他のページと共有するため各シートはコピーして使う）
+    sheets = guardant360_report(xlsx_data)
 
-    df_snv = pd.read_excel(io.BytesIO(xlsx_data), sheet_name='SNV')
+    df_snv = sheets['SNV'].copy()
     df_snv = df_snv[df_snv['call'] == 1]
     
     if not df_snv.empty:
@@ -751,26 +806,8 @@ def process_guardant360(analysis_type, xlsx_data, template_path, date, ep_instit
         df_snv.loc[(df_snv['rm_reportable'] == 0), 'status'] = 'LV4'
         df_snv.loc[(df_snv['rm_reportable'] == 1) & (df_snv['geneSymbol'] == 'KRAS') & (df_snv['aminoAcidsChange'] == 'G12C'), 'status'] = 'LV1'
         df_snv.loc[(df_snv['rm_reportable'] == 1) & ((df_snv['geneSymbol'] != 'KRAS') | (df_snv['aminoAcidsChange'] != 'G12C')), 'status'] = 'LV2'
-        
-        progress_text = st.empty()
-        for i, row in df_snv.iterrows():
-            gene_symbol = row['geneSymbol']
-            gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-            role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
-            df_snv.at[i, 'Role_in_Cancer'] = role_in_cancer
-            cds_change = row['cdsChange']
-            cosmic_mutation = (
-                df_cmc[(df_cmc['geneSymbol'] == gene_symbol) & (df_cmc['cdsChange'] == cds_change)]['COSMIC_Mutation'].values[0]
-                if not df_cmc[(df_cmc['geneSymbol'] == gene_symbol) & (df_cmc['cdsChange'] == cds_change)].empty
-                else ''
-            )
-            df_snv.at[i, 'COSMIC_Mutation'] = str(cosmic_mutation)
-            progress_text.text(f"Processing {i + 1} of {len(df_snv)} variants.... φ(..)")
-            for key, value in results.items():
-                df_snv.at[i, key] = value
-    write_df_to_sheet(df_snv, 'SNV', wb)
 
-    df_indel = pd.read_excel(io.BytesIO(xlsx_data), sheet_name='Indels')
+    df_indel = sheets['Indels'].copy()
     df_indel = df_indel[df_indel['call'] == 1]
     
     if not df_indel.empty:
@@ -788,26 +825,60 @@ def process_guardant360(analysis_type, xlsx_data, template_path, date, ep_instit
         df_indel.loc[(df_indel['rm_reportable'] == 0), 'status'] = 'LV4'
         df_indel.loc[(df_indel['rm_reportable'] == 1) & (df_indel['geneSymbol'] == 'KRAS') & (df_indel['aminoAcidsChange'] == 'G12C'), 'status'] = 'LV1'
         df_indel.loc[(df_indel['rm_reportable'] == 1) & ((df_indel['geneSymbol'] != 'KRAS') | (df_indel['aminoAcidsChange'] != 'G12C')), 'status'] = 'LV2'
+
+    # GeneBe・ClinVar への問い合わせを SNV・Indel まとめて実行
+    genebe_results = fetch_genebe_batch([
+        (transcript_id, cds_change)
+        for df in [df_snv, df_indel] if not df.empty
+        for transcript_id, cds_change in zip(df['transcriptId'], df['cdsChange'])
+    ])
+    clinvar_results = fetch_clinvar_batch(
+        (transcript_id, cds_change, result[6], result[1]) for (transcript_id, cds_change), result in genebe_results.items()
+    )
+
+    if not df_snv.empty:
+        gene_annotations = annotate_genes(df_snv['geneSymbol'])
+        df_snv['Role_in_Cancer'] = gene_annotations['Role_in_Cancer'].to_numpy()
         progress_text = st.empty()
-        for i, row in df_indel.iterrows():
+        indices, tasks = [], []
+        for (i, row), gene_annotation in zip(df_snv.iterrows(), gene_annotations.to_dict('records')):
             gene_symbol = row['geneSymbol']
             gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-            role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
-            df_indel.at[i, 'Role_in_Cancer'] = role_in_cancer
             cds_change = row['cdsChange']
-            cosmic_mutation = (
-                df_cmc[(df_cmc['geneSymbol'] == gene_symbol) & (df_cmc['cdsChange'] == cds_change)]['COSMIC_Mutation'].values[0]
-                if not df_cmc[(df_cmc['geneSymbol'] == gene_symbol) & (df_cmc['cdsChange'] == cds_change)].empty
-                else ''
-            )
+            cosmic_mutation = cmc_index.get((gene_symbol, cds_change), '')
+            df_snv.at[i, 'COSMIC_Mutation'] = str(cosmic_mutation)
+            indices.append(i)
+            tasks.append(partial(link_generator, analysis_type, row, row['geneID'], row['transcriptId'], row['chromosome'], row['position'], row['referenceAllele'], row['alternateAllele'], row['cdsChange'], gene_symbol, row['aminoAcidsChange'], row['dbSNP'],
+                                 genebe_result=genebe_results.get((row['transcriptId'], row['cdsChange'])),
+                                 clinvar_result=clinvar_results.get((row['transcriptId'], row['cdsChange'])),
+                                 gene_annotation=gene_annotation))
+        for i, results in zip(indices, run_annotations(tasks, progress_text)):
+            for key, value in results.items():
+                df_snv.at[i, key] = value
+    frames['SNV'] = write_df_to_sheet(df_snv, 'SNV', wb)
+
+    if not df_indel.empty:
+        gene_annotations = annotate_genes(df_indel['geneSymbol'])
+        df_indel['Role_in_Cancer'] = gene_annotations['Role_in_Cancer'].to_numpy()
+        progress_text = st.empty()
+        indices, tasks = [], []
+        for (i, row), gene_annotation in zip(df_indel.iterrows(), gene_annotations.to_dict('records')):
+            gene_symbol = row['geneSymbol']
+            gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
+            cds_change = row['cdsChange']
+            cosmic_mutation = cmc_index.get((gene_symbol, cds_change), '')
             df_indel.at[i, 'COSMIC_Mutation'] = cosmic_mutation
-            progress_text.text(f"Processing {i + 1} of {len(df_indel)} variants.... φ(..)")
-            results = link_generator(analysis_type, row, row['geneID'], row['transcriptId'], row['chromosome'], row['position'], row['referenceAllele'], row['alternateAllele'], row['cdsChange'], gene_symbol, row['aminoAcidsChange'], row['dbSNP'])
+            indices.append(i)
+            tasks.append(partial(link_generator, analysis_type, row, row['geneID'], row['transcriptId'], row['chromosome'], row['position'], row['referenceAllele'], row['alternateAllele'], row['cdsChange'], gene_symbol, row['aminoAcidsChange'], row['dbSNP'],
+                                 genebe_result=genebe_results.get((row['transcriptId'], row['cdsChange'])),
+                                 clinvar_result=clinvar_results.get((row['transcriptId'], row['cdsChange'])),
+                                 gene_annotation=gene_annotation))
+        for i, results in zip(indices, run_annotations(tasks, progress_text)):
             for key, value in results.items():
                 df_indel.at[i, key] = value
-    write_df_to_sheet(df_indel, 'Indels', wb)
+    frames['Indels'] = write_df_to_sheet(df_indel, 'Indels', wb)
     
-    df_cnv = pd.read_excel(io.BytesIO(xlsx_data), sheet_name='CNAs')
+    df_cnv = sheets['CNAs'].copy()
     df_cnv.columns = ['chromosome', 'geneSymbol', 'copyNumber', 'call']
     df_cnv = df_cnv[df_cnv['call'] != 0]
     
@@ -816,13 +887,7 @@ def process_guardant360(analysis_type, xlsx_data, template_path, date, ep_instit
         df_cnv['Role_in_Cancer'] = ''
         df_cnv['status'] = ''
         df_cnv['type'] = ''
-        
-        progress_text = st.empty()
-        for i, row in df_cnv.iterrows():
-            gene_symbol = row['geneSymbol']
-            gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-            role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
-            df_cnv.at[i, 'Role_in_Cancer'] = role_in_cancer
+        df_cnv['Role_in_Cancer'] = annotate_genes(df_cnv['geneSymbol'])['Role_in_Cancer'].to_numpy()
 
         df_cnv['type'] = df_cnv['call'].apply(lambda x: 'Amplification' if x != 0 else 'Equivocal')
         
@@ -832,9 +897,9 @@ def process_guardant360(analysis_type, xlsx_data, template_path, date, ep_instit
         df_cnv.loc[(df_cnv['call'] == 2) & (df_cnv['geneSymbol'].isin(['ERBB2', 'MET'])), 'status'] = 'LV2'
         df_cnv.loc[(df_cnv['call'] == 2) & (~df_cnv['geneSymbol'].isin(['ERBB2', 'MET'])), 'status'] = 'LV3'
         df_cnv.loc[df_cnv['call'] == 3, 'status'] = 'Aneuploidy'
-    write_df_to_sheet(df_cnv, 'CNAs', wb)
+    frames['CNAs'] = write_df_to_sheet(df_cnv, 'CNAs', wb)
     
-    df_fusion = pd.read_excel(io.BytesIO(xlsx_data), sheet_name='Fusions')
+    df_fusion = sheets['Fusions'].copy()
     df_fusion = df_fusion[df_fusion['call'] == 1]
     
     if not df_fusion.empty:
@@ -843,13 +908,7 @@ def process_guardant360(analysis_type, xlsx_data, template_path, date, ep_instit
         df_fusion['Role_in_Cancer'] = ''
         df_fusion['status'] = ''
         df_fusion['type'] = 'Fusion'
-        
-        progress_text = st.empty()
-        for i, row in df_fusion.iterrows():
-            gene_symbol = row['gene_a']
-            gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-            role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
-            df_fusion.at[i, 'Role_in_Cancer'] = role_in_cancer
+        df_fusion['Role_in_Cancer'] = annotate_genes(df_fusion['gene_a'])['Role_in_Cancer'].to_numpy()
             
         df_fusion['geneSymbol'] = df_fusion['gene_a'] + ' - ' + df_fusion['gene_b']
         df_fusion['type'] = 'Fusion'
@@ -857,19 +916,16 @@ def process_guardant360(analysis_type, xlsx_data, template_path, date, ep_instit
     if not df_fusion.empty:
         df_fusion.loc[df_fusion['gene_a'].isin(['ALK', 'NTRK1', 'RET', 'ROS1']), 'status'] = 'LV2'
         df_fusion.loc[df_fusion['gene_a'].isin(['FGFR2', 'FGFR3']), 'status'] = 'LV3'
-    write_df_to_sheet(df_fusion, 'Fusions', wb)
+    frames['Fusions'] = write_df_to_sheet(df_fusion, 'Fusions', wb)
     
-    df_msi = pd.read_excel(io.BytesIO(xlsx_data), sheet_name='MSI')
-    write_df_to_sheet(df_msi, 'MSI', wb)
+    df_msi = sheets['MSI'].copy()
+    frames['MSI'] = write_df_to_sheet(df_msi, 'MSI', wb)
     
-    df_qc = pd.read_excel(io.BytesIO(xlsx_data), sheet_name='QC')
+    df_qc = sheets['QC'].copy()
     write_df_to_sheet(df_qc, 'QC', wb)
     
-    output_stream = BytesIO()
-    wb.save(output_stream)
-    output_stream.seek(0)
     from .excel_handling import excel_guardant360
-    output_stream = excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
+    output_stream = excel_guardant360(analysis_type, wb, frames, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
     output_stream.seek(0)
     return output_stream
 
@@ -881,8 +937,8 @@ def process_trusight(analysis_type, json_data, template_path, date, ep_instituti
         st.error(f"JSON解析エラー: {e}")
         return None
 
-    wb = openpyxl.load_workbook(template_path)
-    output_stream = BytesIO()
+    wb = load_template(template_path)
+    frames = {}
 
     # パース
     from annotator.parser import parse_trusight_json
@@ -921,18 +977,26 @@ def process_trusight(analysis_type, json_data, template_path, date, ep_instituti
             })
     write_df_to_sheet(qc_data, 'QC', wb)
 
-    # 2. CGC / CMC databases
-    df_cgc = cancer_gene_census()
+    # 2. CGC / CiVIC / HGNC の遺伝子単位の注釈は各セクションで一括結合
     
     # 3. Short Variants Annotation & Link Generator
     variants_data = []
     if not df_sv.empty:
+        gene_annotations = annotate_genes(df_sv['Gene'].map(Gene.HUGO_SYMBOL).fillna(df_sv['Gene'])).to_dict('records')
+        # GeneBe・ClinVar への問い合わせをレポート単位でまとめて実行
+        genebe_results = fetch_genebe_batch([
+            (row.get('Transcript', ''), row.get('CDS_Effect', '')) for row in df_sv.to_dict('records')
+        ])
+        clinvar_results = fetch_clinvar_batch(
+            (transcript_id, cds_change, result[6], result[1]) for (transcript_id, cds_change), result in genebe_results.items()
+        )
         progress_text = st.empty()
-        for i, row_idx in enumerate(df_sv.index):
+        tasks = []
+        for row_idx, gene_annotation in zip(df_sv.index, gene_annotations):
             row = df_sv.loc[row_idx].to_dict()
             gene_symbol = row.get('Gene', '')
             gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-            role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
+            role_in_cancer = gene_annotation['Role_in_Cancer']
             
             # link_generatorのパラメータマッピング
             amino_acid_change = row.get('Protein_Effect', '')
@@ -971,14 +1035,18 @@ def process_trusight(analysis_type, json_data, template_path, date, ep_instituti
                 except ValueError:
                     pass
             
-            progress_text.text(f"Processing {i + 1} of {len(df_sv)} variants.... φ(..)")
-            
-            link_generator(analysis_type, var_data, gene_id, var_data['transcriptId'], chromosome, pos, ref, alt, cds_change, gene_symbol, amino_acid_change, dbsnp)
+            tasks.append(partial(link_generator, analysis_type, var_data, gene_id, var_data['transcriptId'], chromosome, pos, ref, alt, cds_change, gene_symbol, amino_acid_change, dbsnp,
+                                 genebe_result=genebe_results.get((var_data['transcriptId'], cds_change)),
+                                 clinvar_result=clinvar_results.get((var_data['transcriptId'], cds_change)),
+                                 gene_annotation=gene_annotation))
             variants_data.append(var_data)
+        
+        # ネットワーク待ちの多い注釈処理を並列実行（var_data は各タスク内で更新される）
+        run_annotations(tasks, progress_text)
             
-        write_df_to_sheet(variants_data, 'SNV_Indel', wb)
+        frames['SNV_Indel'] = write_df_to_sheet(variants_data, 'SNV_Indel', wb)
     else:
-        write_df_to_sheet([], 'SNV_Indel', wb)
+        frames['SNV_Indel'] = write_df_to_sheet([], 'SNV_Indel', wb)
 
     # 4. CNV
     cnv_data = []
@@ -986,10 +1054,9 @@ def process_trusight(analysis_type, json_data, template_path, date, ep_instituti
         for idx, row in df_cnv.iterrows():
             gene_symbol = row.get('Gene', '')
             gene_symbol = Gene.HUGO_SYMBOL.get(gene_symbol, gene_symbol)
-            role_in_cancer = df_cgc[df_cgc['geneSymbol'] == gene_symbol]['Role'].values[0] if not df_cgc[df_cgc['geneSymbol'] == gene_symbol].empty else ''
             cnv_data.append({
                 'geneSymbol': gene_symbol,
-                'Role_in_Cancer': role_in_cancer,
+                'Role_in_Cancer': '',
                 'copyNumber': row.get('copyNumber', ''),
                 'equivocal': '',
                 'numberOfExons': '',
@@ -998,7 +1065,8 @@ def process_trusight(analysis_type, json_data, template_path, date, ep_instituti
                 'status': row.get('status', ''),
                 'type': row.get('Type', '')
             })
-    write_df_to_sheet(cnv_data, 'CNV', wb)
+        _fill_gene_annotations(cnv_data)
+    frames['CNV'] = write_df_to_sheet(cnv_data, 'CNV', wb)
 
     # 5. Fusion
     fusion_data = []
@@ -1019,7 +1087,7 @@ def process_trusight(analysis_type, json_data, template_path, date, ep_instituti
                 'supportingReadPairs': '',
                 'type': row.get('Type', '')
             })
-    write_df_to_sheet(fusion_data, 'Fusion', wb)
+    frames['Fusion'] = write_df_to_sheet(fusion_data, 'Fusion', wb)
 
     # 6. MSI
     msi_data = []
@@ -1031,7 +1099,7 @@ def process_trusight(analysis_type, json_data, template_path, date, ep_instituti
         msi_data.append({
             'status': status
         })
-    write_df_to_sheet(msi_data, 'MSI', wb)
+    frames['MSI'] = write_df_to_sheet(msi_data, 'MSI', wb)
 
     # 7. TMB
     tmb_data = []
@@ -1048,11 +1116,8 @@ def process_trusight(analysis_type, json_data, template_path, date, ep_instituti
     # 8. Non-human
     write_df_to_sheet([], 'nonHuman', wb)
 
-    wb.save(output_stream)
-    output_stream.seek(0)
-
     from .excel_handling import excel_trusight
-    output_stream = excel_trusight(analysis_type, output_stream, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
+    output_stream = excel_trusight(analysis_type, wb, frames, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel)
     return output_stream
 
 
@@ -2,56 +2,64 @@ import io
 import os
 import re
 import json
+from bisect import bisect_left
 from copy import copy
 from io import BytesIO
 
 import pandas as pd
 import numpy as np
 import pdfplumber
-import openpyxl
-from openpyxl.utils.dataframe import dataframe_to_rows
-from openpyxl.drawing.image import Image
-from openpyxl.styles import Alignment
 import streamlit as st
 
-from .parameter import Abbreviation, Database, Columns, ReadRange
+from .parameter import Database, Columns, Layout, ReadRange
+from .reference_data import disease_matcher, jsh_guideline_index, pgpv_table
+from .sheet_writer import CENTER_WRAP_ALIGNMENT, TOP_ALIGNMENT, AnchorIndex, insert_sections, sheet_frame, sheet_rows, write_rows
+from .template_cache import load_template, logo_image
 
 
-def write_df_to_sheet(data_section, sheet_name, wb):
-    # データを正規化（既にDataFrameならそのまま）
-    if not isinstance(data_section, pd.DataFrame):
-        df = pd.json_normalize(data_section)
-    else:
-        df = data_section
-    # シートが存在するか確認し、なければ新規作成
-    if sheet_name in wb.sheetnames:
-        sheet = wb[sheet_name]
-    else:
-        sheet = wb.create_sheet(title=sheet_name)
-    # DataFrame を Excel シートに書き込み
-    for r_idx, row in enumerate(dataframe_to_rows(df, index=False, header=True), 1):
-        for c_idx, value in enumerate(row, 1):
-            if isinstance(value, list):
-                value = "\n".join(map(str, value))
-            elif isinstance(value, dict):
-                value = json.dumps(value, ensure_ascii=False)
-            sheet.cell(row=r_idx, column=c_idx, value=value)
-
 def add_logo(current_dir, sheet, cell):
     logo_path = os.path.join(current_dir, Database.LOGO_PATH)
     if os.path.exists(logo_path):
-        img = Image(logo_path)
-        orig_w, orig_h = img.width, img.height
-        img.width = 400
-        img.height = int(400 * orig_h / orig_w)
-        sheet.add_image(img, cell)
+        sheet.add_image(logo_image(logo_path), cell)
 
 def delete_blank_lines(sheet):
-    for row in range(sheet.max_row, 0, -1):
-        if all(cell.value is None for cell in sheet[row]):
-            sheet.delete_rows(row, 1)
+    """Remove every row without values, deleting each run of blank rows at once and shifting row heights and merged cells with the rows"""
+    # 値のない行を一度だけ走査し、連続する空行をまとめる
+    blank_rows = [row for row, values in enumerate(sheet.iter_rows(values_only=True), start=1)
+                  if all(value is None for value in values)]
+    if not blank_rows:
+        return
+    runs = []
+    for row in blank_rows:
+        if runs and runs[-1][0] + runs[-1][1] == row:
+            runs[-1][1] += 1
+        else:
+            runs.append([row, 1])
+    blank = set(blank_rows)
+
+    def new_row(row):
+        return row - bisect_left(blank_rows, row)
+
+    # 下の範囲から削除して、まだ消していない範囲の行番号をずらさない
+    for start, amount in reversed(runs):
+        sheet.delete_rows(start, amount)
+
+    # 行の高さなどの行情報（最終行より下の設定も削除した行数だけ上に詰める）
+    dimensions = [(row, dim) for row, dim in sheet.row_dimensions.items() if row not in blank]
+    sheet.row_dimensions.clear()
+    for row, dim in dimensions:
+        dim.index = new_row(row)
+        sheet.row_dimensions[dim.index] = dim
+
+    # 結合セルは残る行の範囲に縮め、すべて空行なら解除
+    for merged in list(sheet.merged_cells.ranges):
+        rows = [row for row in range(merged.min_row, merged.max_row + 1) if row not in blank]
+        if not rows:
+            sheet.merged_cells.remove(merged)
+            continue
+        merged.min_row, merged.max_row = new_row(rows[0]), new_row(rows[-1])
 
-def insert_row(wb, df, sheet_name, start_row, start_col, end_col):
+def insert_row(wb, df, sheet_name, start_row, start_col, end_col, anchors=None):
     if df is None or df.empty:
         return
     sheet = wb[sheet_name]
@@ -72,6 +80,8 @@ def insert_row(wb, df, sheet_name, start_row, start_col, end_col):
     insert_count = len(df) - 1
     if insert_count > 0:
         sheet.insert_rows(start_row, amount=insert_count)
+        if anchors is not None:
+            anchors.insert_rows(start_row, insert_count)
     # スタイルを適用
     for r_idx in range(start_row, start_row + insert_count):
         for c_idx, style in enumerate(styles, start=1):
@@ -82,13 +92,15 @@ def insert_row(wb, df, sheet_name, start_row, start_col, end_col):
             cell.number_format = style['number_format']
             cell.alignment = style['alignment']
 
-def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
+def excel_hemesight(analysis_type, wb, frames, date, normal_sample, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
     current_dir = os.getcwd()
     
-    df_short = pd.read_excel(output_stream, sheet_name='ShortVariants')
+    df_short = sheet_frame(frames.get('ShortVariants'))
     df_short = df_short.copy()
     df_short['aminoAcidsChange'] = df_short['aminoAcidsChange'].fillna(df_short['cdsChange'])
     df_short = df_short.drop(columns=['cdsChange'])
+    for column in ['alternateAlleleReadDepth', 'totalReadDepth']:
+        df_short[column] = pd.to_numeric(df_short[column], errors='coerce')
     df_short['supportingReadCount'] = df_short['alternateAlleleReadDepth'].replace(0, pd.NA)
     df_short['totalReadDepth'] = df_short['totalReadDepth'].replace(0, pd.NA)
     df_short['alternateAlleleFrequency'] = df_short.apply(
@@ -121,7 +133,7 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
     
     required_columns = ['gene', 'cancerType', 'chromosomalChange', 'fastTrackVariant', 'comments', 'analysisType']
     try:
-        df_fast_track = pd.read_excel(output_stream, sheet_name='FastTrack')
+        df_fast_track = sheet_frame(frames.get('FastTrack'))
         missing = [col for col in required_columns if col not in df_fast_track.columns]
         for col in missing:
             df_fast_track[col] = pd.NA
@@ -130,7 +142,6 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
         df_fast_track = pd.DataFrame(columns=required_columns)
 
     ####################################
-    wb = openpyxl.load_workbook(output_stream)
     sheet = wb['FTReport']    
 
     gene_row_map = {'FLT': 12, 'BRAF': 13, 'EZH2': 14, 'IDH1': 15}
@@ -150,7 +161,7 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
             sheet.row_dimensions[row[0].row].height = 100
             sheet.merge_cells(start_row=row[0].row, start_column=10, end_row=row[0].row, end_column=16)
             for cell in row:
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
+                cell.alignment = CENTER_WRAP_ALIGNMENT
                 
     # 基本情報の設定
     add_logo(current_dir, sheet, cell='A1')
@@ -164,7 +175,7 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
 
     ####################################
     # 1. データ読み込み
-    df_rearrangements = pd.read_excel(output_stream, sheet_name='Rearrangements')
+    df_rearrangements = sheet_frame(frames.get('Rearrangements'))
     for col in Columns.HEMESIGHT_REARRANGEMENT:
         if col not in df_rearrangements.columns:
             df_rearrangements[col] = pd.NA
@@ -258,11 +269,8 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
     )
 
     # 5. CaseDataとJSHデータの処理
-    df_case_data = pd.read_excel(output_stream, sheet_name='CaseData')
-    cancer_type = next(
-        (abbr for key, abbr in Abbreviation.ABBR_DISEASE_NAME.items() if key in df_case_data['cancerType'].values[0]),
-        'Other'
-    )
+    df_case_data = sheet_frame(frames.get('CaseData'))
+    cancer_type = disease_matcher.match(df_case_data['cancerType'].values[0])
 
     # 6. 全遺伝子の収集
     all_genes = set(df_gl['geneSymbol']).union(
@@ -274,16 +282,10 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
     )
     all_genes = {gene.split('\n')[0].split(' [')[0] for gene in all_genes}
 
-    # 7. JSHデータのフィルタリング
-    jsh_path = os.path.join(current_dir, Database.JSA_PATH)
-    df_jsh = pd.read_csv(jsh_path, encoding='utf-8')
-    df_jsh = df_jsh[df_jsh['Disease'].str.contains(cancer_type) & df_jsh['Gene'].isin(all_genes)].sort_values('Gene')
-    
-    # 8. JSHエビデンスと薬剤データの作成
-    df_jsh_evidence = df_jsh[Columns.HEMESIGHT_JSA].copy()
-    df_jsh_evidence['Check'] = 'evidence'
-    df_jsh_drugs = df_jsh[['Gene', 'Drugs', 'Comments']].copy()
-    df_jsh_drugs['Check'] = 'drug'
+    # 7-8. JSHエビデンスと薬剤データの作成（病名略語 × 遺伝子の索引から取得）
+    jsh_index = jsh_guideline_index()
+    df_jsh_evidence = jsh_index.evidence_rows(cancer_type, all_genes)
+    df_jsh_drugs = jsh_index.drug_rows(cancer_type, all_genes)
     
     ####################################    
     sheet = wb['Report']
@@ -300,63 +302,38 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
     sheet['J66'] = ep_responsible
     sheet['J69'] = ep_institution + ' ' + ep_department + '\n' + ep_contact + '\n' + '電話番号 ' + ep_tel
 
-    start_row_mt = 16
-    insert_row(wb, df_mt, sheet_name='Report', start_row=start_row_mt, start_col='A', end_col='P')
-    start_row_mnv = start_row_mt + 5 +len(df_mt) - 1 if len(df_mt) > 1 else start_row_mt + 5
-    insert_row(wb, df_mnv, sheet_name='Report', start_row=start_row_mnv, start_col='A', end_col='P')
-    start_row_sv = start_row_mnv + 4 + len(df_mnv) - 1 if len(df_mnv) > 1 else start_row_mnv + 4
-    insert_row(wb, df_sv, sheet_name='Report', start_row=start_row_sv, start_col='A', end_col='P')
-    for insert_pos in [1, 2, 4, 5, 7, 8, 10, 12, 13, 14, 15]:
-        df_sv.insert(insert_pos, chr(96 + insert_pos), '')
-    start_row_fu = start_row_sv + 4 + len(df_sv) - 1 if len(df_sv) > 1 else start_row_sv + 4
-    insert_row(wb, df_fu, sheet_name='Report', start_row=start_row_fu, start_col='A', end_col='P')
-    for insert_pos in [1, 2, 4, 5, 7, 8, 10, 12, 13, 14, 15]:
-        df_fu.insert(insert_pos, chr(96 + insert_pos), '')
-    start_row_du = start_row_fu + 4 + len(df_fu) - 1 if len(df_fu) > 1 else start_row_fu + 4
-    insert_row(wb, df_du, sheet_name='Report', start_row=start_row_du, start_col='A', end_col='P')
-    for insert_pos in [1, 2, 4, 5, 7, 8, 10, 12, 13, 14, 15]:
-        df_du.insert(insert_pos, chr(96 + insert_pos), '')
-    start_row_gl = start_row_du + 4 + len(df_du) - 1 if len(df_du) > 1 else start_row_du + 4
-    insert_row(wb, df_gl, sheet_name='Report', start_row=start_row_gl, start_col='A', end_col='P')
-    start_row_up = start_row_gl + 4 + len(df_gl) - 1 if len(df_gl) > 1 else start_row_gl + 4
-    insert_row(wb, df_up, sheet_name='Report', start_row=start_row_up, start_col='A', end_col='P')    
-    start_row_up_sv = start_row_up + 4 + len(df_up) - 1 if len(df_up) > 1 else start_row_up + 4
-    insert_row(wb, df_up_sv, sheet_name='Report', start_row=start_row_up_sv, start_col='A', end_col='P')
-    for insert_pos in [1, 2, 4, 5, 7, 8, 10, 12, 13, 14, 15]:
-        df_up_sv.insert(insert_pos, chr(96 + insert_pos), '')
-    start_row_jsh_evidence = start_row_up_sv + 4 + len(df_up_sv) - 1 if len(df_up_sv) > 1 else start_row_up_sv + 4
-    insert_row(wb, df_jsh_evidence, sheet_name='Report', start_row=start_row_jsh_evidence, start_col='A', end_col='P')
+    sections = {'mt': df_mt, 'mnv': df_mnv, 'sv': df_sv, 'fu': df_fu, 'du': df_du, 'gl': df_gl,
+                'up': df_up, 'up_sv': df_up_sv, 'jsh_evidence': df_jsh_evidence, 'jsh_drugs': df_jsh_drugs}
+    start_rows = insert_sections(sheet, Layout.HEMESIGHT_REPORT, sections, start_col='A', end_col='P')
+    for df_section in [df_sv, df_fu, df_du, df_up_sv]:
+        for insert_pos in [1, 2, 4, 5, 7, 8, 10, 12, 13, 14, 15]:
+            df_section.insert(insert_pos, chr(96 + insert_pos), '')
     for insert_pos in [2, 3, 5, 7, 8, 9, 11, 12, 13, 15]:
         df_jsh_evidence.insert(insert_pos, chr(96 + insert_pos), '')
-    start_row_jsh_drugs = start_row_jsh_evidence + 4 + len(df_jsh_evidence) - 1 if len(df_jsh_evidence) > 1 else start_row_jsh_evidence + 4
-    insert_row(wb, df_jsh_drugs, sheet_name='Report', start_row=start_row_jsh_drugs, start_col='A', end_col='P')
     for insert_pos in [2, 3, 4, 5, 6, 7, 8, 9, 10, 12, 13, 14, 15]:
         df_jsh_drugs.insert(insert_pos, chr(96 + insert_pos), '')
 
-    for df_section, start_row in [(df_mt, start_row_mt), (df_mnv, start_row_mnv), (df_sv, start_row_sv), 
-                                  (df_fu, start_row_fu), (df_du, start_row_du), (df_gl, start_row_gl), 
-                                  (df_up, start_row_up), (df_up_sv, start_row_up_sv), 
-                                  (df_jsh_evidence, start_row_jsh_evidence), (df_jsh_drugs, start_row_jsh_drugs)
-                                  ]:
-        for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-            for c_idx, value in enumerate(row, 1):
-                sheet.cell(row=r_idx, column=c_idx, value=value)
-                sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+    for name, df_section in sections.items():
+        write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_rows[name], alignment=TOP_ALIGNMENT)
 
     # 空行削除
     # delete_blank_lines(sheet)
 
-    for row in sheet.iter_rows():
-        row_values = [cell.value for cell in row]
-        contains_expert_panel = any('エキスパートパネルレポート' in str(value) for value in row_values)
-        contains_tohoku = any('Tohoku' in str(value) for value in row_values)
-        contains_postal_code = any('〒' in str(value) for value in row_values)
-        check_sv = 'SV' in str(row[16].value)
-        check_up_sv = 'UP_SV' in str(row[16].value)
-        check_fu = 'FU_RNA' in str(row[16].value)
-        check_du = 'DU' in str(row[16].value)
-        check_evidence = 'evidence' in str(row[16].value)
-        check_drug = 'drug' in str(row[16].value)
+    # 目印の文字列を含む行を一度の走査で索引化し、該当行のみ書式設定（17列目は各行の種別）
+    row_types = ['SV', 'UP_SV', 'FU_RNA', 'DU', 'evidence', 'drug']
+    text_markers = ['〒', 'Tohoku', 'エキスパートパネルレポート']
+    anchors = AnchorIndex(sheet, text_markers + ['::', 'FDA', 'PMDA'], column_markers={17: row_types})
+    for r in anchors.rows(*row_types, *text_markers):
+        row = sheet[r]
+        contains_expert_panel = anchors.has(r, 'エキスパートパネルレポート')
+        contains_tohoku = anchors.has(r, 'Tohoku')
+        contains_postal_code = anchors.has(r, '〒')
+        check_sv = anchors.has(r, 'SV')
+        check_up_sv = anchors.has(r, 'UP_SV')
+        check_fu = anchors.has(r, 'FU_RNA')
+        check_du = anchors.has(r, 'DU')
+        check_evidence = anchors.has(r, 'evidence')
+        check_drug = anchors.has(r, 'drug')
 
         if check_sv or check_up_sv or check_du:
             sheet.row_dimensions[row[0].row].height = 50
@@ -366,7 +343,7 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
             sheet.merge_cells(start_row=row[0].row, start_column=10, end_row=row[0].row, end_column=11)
             sheet.merge_cells(start_row=row[0].row, start_column=12, end_row=row[0].row, end_column=14)
             for cell in row:
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
+                cell.alignment = CENTER_WRAP_ALIGNMENT
         elif check_fu:
             sheet.row_dimensions[row[0].row].height = 50
             sheet.merge_cells(start_row=row[0].row, start_column=1, end_row=row[0].row, end_column=3)
@@ -375,7 +352,7 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
             sheet.merge_cells(start_row=row[0].row, start_column=10, end_row=row[0].row, end_column=11)
             sheet.merge_cells(start_row=row[0].row, start_column=12, end_row=row[0].row, end_column=14)
             for cell in row:
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
+                cell.alignment = CENTER_WRAP_ALIGNMENT
         elif check_evidence:
             sheet.row_dimensions[row[0].row].height = 125
             sheet.merge_cells(start_row=row[0].row, start_column=2, end_row=row[0].row, end_column=4)
@@ -384,28 +361,29 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
             sheet.merge_cells(start_row=row[0].row, start_column=11, end_row=row[0].row, end_column=14)
             sheet.merge_cells(start_row=row[0].row, start_column=15, end_row=row[0].row, end_column=16)
             for cell in row:
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
+                cell.alignment = CENTER_WRAP_ALIGNMENT
         elif check_drug:
             sheet.row_dimensions[row[0].row].height = 50
             sheet.merge_cells(start_row=row[0].row, start_column=2, end_row=row[0].row, end_column=11)
             sheet.merge_cells(start_row=row[0].row, start_column=12, end_row=row[0].row, end_column=16)
             for cell in row:
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
+                cell.alignment = CENTER_WRAP_ALIGNMENT
         elif contains_postal_code:
             sheet.row_dimensions[row[0].row].height = 100
             sheet.merge_cells(start_row=row[0].row, start_column=10, end_row=row[0].row, end_column=16)
             for cell in row:
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
+                cell.alignment = CENTER_WRAP_ALIGNMENT
         elif contains_tohoku:
             sheet.row_dimensions[row[0].row].height = 125
             sheet.merge_cells(start_row=row[0].row, start_column=1, end_row=row[0].row, end_column=16)
             for cell in row:
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
+                cell.alignment = CENTER_WRAP_ALIGNMENT
         elif contains_expert_panel:
             sheet.row_dimensions[row[0].row].height = 100
 
-    for row in sheet.iter_rows():
-        if 'evidence' not in str(row[16].value):
+    for r in anchors.rows('::', 'FDA', 'PMDA'):
+        row = sheet[r]
+        if not anchors.has(r, 'evidence'):
             count = sum(cell.value.count('::') for cell in row if cell.value and isinstance(cell.value, str) and '::' in cell.value)
             if count > 1:
                 sheet.row_dimensions[row[0].row].height = count * 25
@@ -459,13 +437,14 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
 
     start_row_for_pts = 15
 
+    # 郵便番号行の位置は行挿入に合わせて更新
+    anchors = AnchorIndex(sheet, ['〒'])
+
     insert_row(wb, df_for_pts, sheet_name='For_pts',
-            start_row=start_row_for_pts, start_col='A', end_col='N') 
+            start_row=start_row_for_pts, start_col='A', end_col='N', anchors=anchors) 
 
-    for r_idx, row in enumerate(dataframe_to_rows(df_for_pts, index=False, header=False), start_row_for_pts):
-        for c_idx, value in enumerate(row, 1):
-            cell = sheet.cell(row=r_idx, column=c_idx, value=value)
-            cell.alignment = Alignment(wrap_text=False, vertical='top')
+    write_rows(sheet, sheet_rows(df_for_pts, header=False), start_row=start_row_for_pts, alignment=TOP_ALIGNMENT)
+    anchors.scan_rows(range(start_row_for_pts, start_row_for_pts + len(df_for_pts)))
 
     for r_idx in range(start_row_for_pts, start_row_for_pts + len(df_for_pts)):
         sheet.row_dimensions[r_idx].height = 35
@@ -484,13 +463,11 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
         # 重複削除
         df_tmp = df_tmp.drop_duplicates(subset=['ForPTS'])
 
-        insert_row(wb, df_tmp, sheet_name=sheet_name, start_row=start_row, start_col='A', end_col='N')
+        insert_row(wb, df_tmp, sheet_name=sheet_name, start_row=start_row, start_col='A', end_col='N', anchors=anchors)
 
         # データの書き込みと書式設定
-        for r_idx, row in enumerate(dataframe_to_rows(df_tmp, index=False, header=False), start=start_row):
-            for c_idx, value in enumerate(row, 1): 
-                cell = sheet.cell(row=r_idx, column=c_idx, value=value)
-                cell.alignment = Alignment(wrap_text=False, vertical='top')
+        write_rows(sheet, sheet_rows(df_tmp, header=False), start_row=start_row, alignment=TOP_ALIGNMENT)
+        anchors.scan_rows(range(start_row, start_row + len(df_tmp)))
                 
         for r_idx in range(start_row, start_row + len(df_tmp)):
             sheet.row_dimensions[r_idx].height = 35
@@ -505,14 +482,11 @@ def excel_hemesight(analysis_type, output_stream, date, normal_sample, ep_instit
     process_and_insert(df_du, start_row_du_for_pts, wb, sheet)
 
     # 郵便番号行の高さ・セル結合処理（既存コード）
-    for row in sheet.iter_rows():
-        row_values = [cell.value for cell in row]
-        contains_postal_code = any('〒' in str(value) for value in row_values if value is not None)
-        if contains_postal_code:
-            sheet.row_dimensions[row[0].row].height = 100
-            sheet.merge_cells(start_row=row[0].row, start_column=10, end_row=row[0].row, end_column=14)
-            for cell in row:
-                cell.alignment = Alignment(vertical='center', wrap_text=True)
+    for r in anchors.rows('〒'):
+        sheet.row_dimensions[r].height = 100
+        sheet.merge_cells(start_row=r, start_column=10, end_row=r, end_column=14)
+        for cell in sheet[r]:
+            cell.alignment = CENTER_WRAP_ALIGNMENT
 
             
     # 印刷範囲
@@ -601,7 +575,7 @@ def excel_fasttrack(analysis_type, pdf_data, template_path, date, ep_institution
         except KeyError:
             df_sv = pd.DataFrame(columns=Columns.HEMESIGHT_FASTTRACK_CNV)
 
-        wb = openpyxl.load_workbook(template_path)
+        wb = load_template(template_path)
         sheet = wb["FTReport"]
 
         # Insert expert panel inputs
@@ -629,31 +603,30 @@ def excel_fasttrack(analysis_type, pdf_data, template_path, date, ep_institution
                 df_sv.insert(col_pos, f"Col_{col_pos}", "")
 
         for df_section, start_row in [(df_snv_indel, start_row), (df_sv, star_row_sv)]:
-            for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-                for c_idx, value in enumerate(row, 1):
-                    sheet.cell(row=r_idx, column=c_idx, value=value)
-                    sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+            write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_row, alignment=TOP_ALIGNMENT)
 
         # 空行削除
         # delete_blank_lines(sheet)
 
         # Adjust formatting
-        for row in sheet.iter_rows():
-            row_values = [str(cell.value) if cell.value else "" for cell in row]
-            contains_expert_panel = any('Fast-track持ち回り協議結果報告書' in val for val in row_values)
-            contains_summary = any('以上の遺伝子異常を確認しました。' in val for val in row_values)
-            contains_postal_code = any('〒' in val for val in row_values)
+        markers = ['Fast-track持ち回り協議結果報告書', '以上の遺伝子異常を確認しました。', '〒']
+        anchors = AnchorIndex(sheet, markers)
+        for r in anchors.rows(*markers):
+            row = sheet[r]
+            contains_expert_panel = anchors.has(r, 'Fast-track持ち回り協議結果報告書')
+            contains_summary = anchors.has(r, '以上の遺伝子異常を確認しました。')
+            contains_postal_code = anchors.has(r, '〒')
 
             if contains_postal_code:
                 sheet.row_dimensions[row[0].row].height = 100
                 sheet.merge_cells(start_row=row[0].row, start_column=8, end_row=row[0].row, end_column=16)
                 for cell in row:
-                    cell.alignment = Alignment(vertical='center', wrap_text=True)
+                    cell.alignment = CENTER_WRAP_ALIGNMENT
             elif contains_summary:
                 sheet.row_dimensions[row[0].row].height = 100
                 sheet.merge_cells(start_row=row[0].row, start_column=1, end_row=row[0].row, end_column=16)
                 for cell in row:
-                    cell.alignment = Alignment(vertical='center', wrap_text=True)
+                    cell.alignment = CENTER_WRAP_ALIGNMENT
             elif contains_expert_panel:
                 sheet.row_dimensions[row[0].row].height = 100
 
@@ -669,18 +642,20 @@ def excel_fasttrack(analysis_type, pdf_data, template_path, date, ep_institution
     
     
 
-def excel_foundationone(analysis_type, output_stream, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
+def excel_foundationone(analysis_type, wb, frames, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
     current_dir = os.getcwd()
 
-    xlsx = pd.read_excel(output_stream, sheet_name=None)
-    df_short = xlsx['SNV_Indel']
-    df_cnv = xlsx['CNV']
-    df_fusion = xlsx['Fusion']
-    df_msi = xlsx['MSI']
+    df_short = sheet_frame(frames.get('SNV_Indel'))
+    df_cnv = sheet_frame(frames.get('CNV'))
+    df_fusion = sheet_frame(frames.get('Fusion'))
+    df_msi = sheet_frame(frames.get('MSI'))
     
     df_snv = pd.DataFrame(columns=Columns.SNV_INDEL)
     if not df_short.empty:
         df_short = df_short.copy()
+        # 深度はレポートの文字列のまま渡されるので数値にしてから割る
+        for column in ['alternateAlleleReadDepth', 'totalReadDepth']:
+            df_short[column] = pd.to_numeric(df_short[column], errors='coerce')
         df_short['alternateAlleleFrequency'] = df_short.apply(lambda x: x['alternateAlleleReadDepth'] / x['totalReadDepth'] if pd.notna(x['alternateAlleleReadDepth']) and pd.notna(x['totalReadDepth']) and x['totalReadDepth'] != 0 else None, axis=1)
         df_short['GeneBe_ClinVar_Germline'] = df_short['GeneBe_ClinVar_Germline'].fillna('').astype(str) + ' ' + df_short['GeneBe_ClinVar_Germline_Status'].fillna('').astype(str)
         df_short['GeneBe_ClinVar_Somatic'] = df_short['GeneBe_ClinVar_Somatic'].fillna('').astype(str) + ' ' + df_short['GeneBe_ClinVar_Somatic_Status'].fillna('').astype(str)   
@@ -704,8 +679,7 @@ def excel_foundationone(analysis_type, output_stream, date, ep_institution, ep_d
     df_germline = pd.DataFrame(columns=['Merged'])
     if not df_short.empty and all(col in df_short.columns for col in Columns.FOUNDATION_GERMLINE):
         df_germline = df_short[Columns.FOUNDATION_GERMLINE].copy()
-        base_path = os.path.dirname(__file__)
-        df_pgpv = pd.read_csv(os.path.join(base_path, Database.PGPV_PATH))
+        df_pgpv = pgpv_table()
         df_germline = pd.merge(df_germline, df_pgpv, on='geneSymbol', how='left')
         if analysis_type == 'FoundationOne':
             if df_germline['cdsChange'].str.contains('>', na=False).any():
@@ -727,7 +701,6 @@ def excel_foundationone(analysis_type, output_stream, date, ep_institution, ep_d
     
     
     ####################################
-    wb = openpyxl.load_workbook(output_stream)
     sheet = wb['Summary']
     
     # 基本情報の入力
@@ -741,51 +714,41 @@ def excel_foundationone(analysis_type, output_stream, date, ep_institution, ep_d
     sheet['J55'] = ep_responsible
     sheet['J58'] = f'{ep_institution} {ep_department}\n{ep_contact}\n電話番号 {ep_tel}'
 
-    start_row_snv = 22
-    insert_row(wb, df_snv, sheet_name='Summary', start_row=start_row_snv, start_col='A', end_col='O')
+    sections = {'snv': df_snv, 'cnv': df_cnv, 'fusion': df_fusion, 'germline': df_germline}
+    start_rows = insert_sections(sheet, Layout.FOUNDATION_SUMMARY, sections, start_col='A', end_col='O')
     for insert_pos in [2, 3, 7]:
         df_snv.insert(insert_pos, chr(96 + insert_pos), '')
-    start_row_cnv = start_row_snv + 5 + len(df_snv) - 1 if len(df_snv) > 1 else start_row_snv + 5
-    insert_row(wb, df_cnv, sheet_name='Summary', start_row=start_row_cnv, start_col='A', end_col='O')
     for insert_pos in [2, 4, 7, 8, 10]:
         col_name = chr(96 + insert_pos)
         if 0 <= insert_pos <= df_cnv.shape[1]:
             df_cnv.insert(insert_pos, col_name, '')
         else:
             df_cnv[col_name] = ''
-    start_row_fusion = start_row_cnv + 4 + len(df_cnv) - 1 if len(df_cnv) > 1 else start_row_cnv + 4
-    insert_row(wb, df_fusion, sheet_name='Summary', start_row=start_row_fusion, start_col='A', end_col='O')
     for insert_pos in [1, 2, 3, 4, 7, 8, 10]:
         col_name = chr(96 + insert_pos)      
         if 0 <= insert_pos <= df_fusion.shape[1]:
             df_fusion.insert(insert_pos, col_name, '')
         else:
             df_fusion[col_name] = ''
-    start_row_germline = start_row_fusion+ 15 + len(df_fusion) - 1 if len(df_fusion) > 1 else start_row_fusion + 15
-    insert_row(wb, df_germline, sheet_name='Summary', start_row=start_row_germline, start_col='A', end_col='O')
-    for df_section, start_row in [(df_snv, start_row_snv), (df_cnv, start_row_cnv), (df_fusion, start_row_fusion), (df_germline, start_row_germline)]:
-        for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-            for c_idx, value in enumerate(row, 1):
-                sheet.cell(row=r_idx, column=c_idx, value=value)
-                sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
-
-    # 条件に応じた行処理
-    for row in sheet.iter_rows():
-        values = [cell.value for cell in row]
-        r = row[0].row
-
-        if any('〒' in str(v) for v in values):
+    for name, df_section in sections.items():
+        write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_rows[name], alignment=TOP_ALIGNMENT)
+
+    # 条件に応じた行処理（目印の文字列を含む行のみ）
+    markers = ['〒', 'Tohoku', 'エキスパートパネルレポート', '生殖細胞系列由来']
+    anchors = AnchorIndex(sheet, markers)
+    for r in anchors.rows(*markers):
+        if anchors.has(r, '〒'):
             sheet.row_dimensions[r].height = 100
             sheet.merge_cells(start_row=r, start_column=10, end_row=r, end_column=15)
-        elif 'Tohoku' in str(values):
+        elif anchors.has(r, 'Tohoku'):
             sheet.row_dimensions[r].height = 150
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=15)
-        elif 'エキスパートパネルレポート' in str(values):
+        elif anchors.has(r, 'エキスパートパネルレポート'):
             sheet.row_dimensions[r].height = 100
-        elif '生殖細胞系列由来' in str(values) :
+        elif anchors.has(r, '生殖細胞系列由来'):
             sheet.row_dimensions[r].height = 100
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=15)
-            sheet.cell(row=r, column=1).alignment = Alignment(vertical='center', wrap_text=True)
+            sheet.cell(row=r, column=1).alignment = CENTER_WRAP_ALIGNMENT
 
     # 固定セル結合
     sheet.merge_cells(start_row=3, start_column=17, end_row=15, end_column=26)
@@ -823,27 +786,24 @@ def excel_foundationone(analysis_type, output_stream, date, ep_institution, ep_d
     insert_row(wb, df_germline, sheet_name='For_pts', start_row=start_row_germline, start_col='A', end_col='F')
 
     for df_section, start_row in [(df_patient, start_row_patient), (df_germline, start_row_germline)]:
-        for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-            for c_idx, value in enumerate(row, 1):
-                sheet.cell(row=r_idx, column=c_idx, value=value)
-                sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+        write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_row, alignment=TOP_ALIGNMENT)
 
     # 空行削除
     # delete_blank_lines(sheet)
 
-    # 条件に応じた行処理
-    for row in sheet.iter_rows():
-        values = [cell.value for cell in row]
-        r = row[0].row
-        if any('〒' in str(v) for v in values):
+    # 条件に応じた行処理（目印の文字列を含む行のみ）
+    markers = ['〒', 'がん遺伝子パネル検査説明書', '生殖細胞系列由来']
+    anchors = AnchorIndex(sheet, markers)
+    for r in anchors.rows(*markers):
+        if anchors.has(r, '〒'):
             sheet.row_dimensions[r].height = 100
             sheet.merge_cells(start_row=r, start_column=5, end_row=r, end_column=6)
-        elif 'がん遺伝子パネル検査説明書' in str(values):
+        elif anchors.has(r, 'がん遺伝子パネル検査説明書'):
             sheet.row_dimensions[r].height = 100
-        elif '生殖細胞系列由来' in str(values) :
+        elif anchors.has(r, '生殖細胞系列由来'):
             sheet.row_dimensions[r].height = 100
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=6)
-            sheet.cell(row=r, column=1).alignment = Alignment(vertical='center', wrap_text=True)        
+            sheet.cell(row=r, column=1).alignment = CENTER_WRAP_ALIGNMENT        
 
     # 印刷範囲を設定（A1からF列までの最大行）
     sheet.print_area = f'A1:F{sheet.max_row}'
@@ -856,14 +816,13 @@ def excel_foundationone(analysis_type, output_stream, date, ep_institution, ep_d
     return output_stream
 
 
-def excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
+def excel_genminetop(analysis_type, wb, frames, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
     current_dir = os.getcwd()
 
-    xlsx = pd.read_excel(output_stream, sheet_name=None)
-    df_short = xlsx['SNV_Indel']
-    df_cnv = xlsx['CNV']
-    df_fusion = xlsx['Fusion']
-    df_germline = xlsx['Germline']
+    df_short = sheet_frame(frames.get('SNV_Indel'))
+    df_cnv = sheet_frame(frames.get('CNV'))
+    df_fusion = sheet_frame(frames.get('Fusion'))
+    df_germline = sheet_frame(frames.get('Germline'))
 
     # process_variant_df 関数を excel_genminetop 内に定義
     def process_variant_df(df):
@@ -903,7 +862,6 @@ def excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_depa
         return df_out
 
     ####################################    
-    wb = openpyxl.load_workbook(output_stream)
     sheet = wb['Summary']
                     
     # 基本情報の入力
@@ -946,8 +904,7 @@ def excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_depa
     
     # df_germline_comment の処理（df_germline が空でない場合）
     if not df_germline.empty:            
-        base_path = os.path.dirname(__file__)
-        df_pgpv = pd.read_csv(os.path.join(base_path, Database.PGPV_PATH))
+        df_pgpv = pgpv_table()
         df_germline_comment = pd.merge(df_germline, df_pgpv, on='geneSymbol', how='left')
         df_germline_comment = df_germline_comment[['geneSymbol', 'aminoAcidsChange', 'Comment_GPV']].copy()
         df_germline_comment['Merged'] = df_germline_comment['geneSymbol'] + ' ' + df_germline_comment['aminoAcidsChange'] + ' ' + df_germline_comment['Comment_GPV']
@@ -956,26 +913,12 @@ def excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_depa
         # 空の DataFrame を作成
         df_germline_comment = pd.DataFrame(columns=['Merged'])
 
-    start_row_germline = 17
-    insert_row(wb, df_germline, sheet_name='Summary', start_row=start_row_germline, start_col='A', end_col='O')
-    start_row_short = start_row_germline + 6 + len(df_germline) - 1 if len(df_germline) > 1 else start_row_germline + 6
-    insert_row(wb, df_short, sheet_name='Summary', start_row=start_row_short, start_col='A', end_col='O')
-    
-    df_short_len = len(df_short) if df_short is not None else 0
-    start_row_cnv = start_row_short + 5 + df_short_len - 1 if df_short_len > 1 else start_row_short + 5
-    insert_row(wb, df_cnv, sheet_name='Summary', start_row=start_row_cnv, start_col='A', end_col='O')
-    start_row_fusion = start_row_cnv + 4 + len(df_cnv) - 1 if len(df_cnv) > 1 else start_row_cnv + 4
-    insert_row(wb, df_fusion, sheet_name='Summary', start_row=start_row_fusion, start_col='A', end_col='O')
-    start_row_germline_comment = start_row_fusion + 15 + len(df_fusion) - 1 if len(df_fusion) > 1 else start_row_fusion + 15
-    insert_row(wb, df_germline_comment, sheet_name='Summary', start_row=start_row_germline_comment, start_col='A', end_col='O')
-    
-    for df_section, start_row in [(df_germline, start_row_germline), (df_short, start_row_short), (df_cnv, start_row_cnv), 
-                                  (df_fusion, start_row_fusion), (df_germline_comment, start_row_germline_comment)]:
+    sections = {'germline': df_germline, 'short': df_short, 'cnv': df_cnv, 'fusion': df_fusion,
+                'germline_comment': df_germline_comment}
+    start_rows = insert_sections(sheet, Layout.GENMINE_SUMMARY, sections, start_col='A', end_col='O')
+    for name, df_section in sections.items():
         if df_section is not None and not df_section.empty:
-            for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-                for c_idx, value in enumerate(row, 1):
-                    sheet.cell(row=r_idx, column=c_idx, value=value)
-                    sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+            write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_rows[name], alignment=TOP_ALIGNMENT)
 
     # 空行削除
     # delete_blank_lines(sheet)
@@ -994,7 +937,7 @@ def excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_depa
             sheet.row_dimensions[r].height = 100
         elif '生殖細胞系列由来' in str(values):
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=15)
-            sheet.cell(row=r, column=1).alignment = Alignment(vertical='center', wrap_text=True)
+            sheet.cell(row=r, column=1).alignment = CENTER_WRAP_ALIGNMENT
         elif 'ACMG' in str(values):
             sheet.row_dimensions[r].height = 50       
 
@@ -1026,20 +969,14 @@ def excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_depa
         df_patient = pd.DataFrame(columns=['geneSymbol', 'aminoAcidsChange'])
 
     # df_patient
-    start_row_patient = 26
-    insert_row(wb, df_patient, sheet_name='For_pts', start_row=start_row_patient, start_col='A', end_col='F')
+    sections = {'patient': df_patient, 'germline': df_germline_comment}
+    start_rows = insert_sections(sheet, Layout.GENMINE_FOR_PTS, sections, start_col='A', end_col='F')
     for insert_pos in [1]:
         df_patient.insert(insert_pos, f'column_{chr(96 + insert_pos)}', '')
 
-    start_row_germline = start_row_patient + 5 + len(df_patient) - 1 if len(df_patient) > 1 else start_row_patient + 5
-    insert_row(wb, df_germline_comment, sheet_name='For_pts', start_row=start_row_germline, start_col='A', end_col='F')
-
-    for df_section, start_row in [(df_patient, start_row_patient), (df_germline_comment, start_row_germline)]:
+    for name, df_section in sections.items():
         if df_section is not None and not df_section.empty:
-            for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-                for c_idx, value in enumerate(row, 1):
-                    sheet.cell(row=r_idx, column=c_idx, value=value)
-                    sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+            write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_rows[name], alignment=TOP_ALIGNMENT)
 
     # 空行削除
     # delete_blank_lines(sheet)
@@ -1055,7 +992,7 @@ def excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_depa
             sheet.row_dimensions[r].height = 100
         elif '生殖細胞系列由来' in str(values):
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=6)
-            sheet.cell(row=r, column=1).alignment = Alignment(vertical='center', wrap_text=True)        
+            sheet.cell(row=r, column=1).alignment = CENTER_WRAP_ALIGNMENT        
 
     # 印刷範囲を設定
     sheet.print_area = f'A1:F{sheet.max_row}'
@@ -1068,11 +1005,10 @@ def excel_genminetop(analysis_type, output_stream, date, ep_institution, ep_depa
     return output_stream
 
 
-def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
+def excel_guardant360(analysis_type, wb, frames, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
     current_dir = os.getcwd()
-    xlsx = pd.read_excel(output_stream, sheet_name=None)
-    df_snv = xlsx.get('SNV', pd.DataFrame())
-    df_indel = xlsx.get('Indels', pd.DataFrame())
+    df_snv = sheet_frame(frames.get('SNV'))
+    df_indel = sheet_frame(frames.get('Indels'))
     
     if not df_snv.empty and not df_indel.empty:
         df_short = pd.concat([df_snv, df_indel], ignore_index=True)
@@ -1083,15 +1019,14 @@ def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_dep
     else:
         df_short = pd.DataFrame()
     
-    df_cnv = xlsx.get('CNAs', pd.DataFrame())
-    df_fusion = xlsx.get('Fusions', pd.DataFrame())
-    df_msi = xlsx.get('MSI', pd.DataFrame())
+    df_cnv = sheet_frame(frames.get('CNAs'))
+    df_fusion = sheet_frame(frames.get('Fusions'))
+    df_msi = sheet_frame(frames.get('MSI'))
 
     df_germline = pd.DataFrame(columns=['Merged'])
     if not df_short.empty:
         df_germline = df_short.copy()
-        base_path = os.path.dirname(__file__)
-        df_pgpv = pd.read_csv(os.path.join(base_path, Database.PGPV_PATH))
+        df_pgpv = pgpv_table()
         df_germline = pd.merge(df_germline, df_pgpv, on='geneSymbol', how='left')
         if 'alternateAlleleFrequency' in df_germline.columns:
             df_germline = df_germline[df_germline['alternateAlleleFrequency'].astype(float) > 30]
@@ -1137,7 +1072,6 @@ def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_dep
         df_cnv = pd.DataFrame(columns=Columns.GUARDANT_CNV)
 
     ####################################
-    wb = openpyxl.load_workbook(output_stream)
     sheet = wb['Summary']
 
     # 基本情報の入力
@@ -1168,10 +1102,7 @@ def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_dep
     insert_row(wb, df_germline, sheet_name='Summary', start_row=start_row_germline, start_col='A', end_col='O')
     
     for df_section, start_row in [(df_short, start_row_short), (df_cnv, start_row_cnv), (df_germline, start_row_germline)]:
-        for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-            for c_idx, value in enumerate(row, 1):
-                sheet.cell(row=r_idx, column=c_idx, value=value)
-                sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+        write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_row, alignment=TOP_ALIGNMENT)
 
     # 空行削除
     # delete_blank_lines(sheet)
@@ -1183,7 +1114,7 @@ def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_dep
         if any('〒' in str(v) for v in values):
             sheet.row_dimensions[r].height = 100
             sheet.merge_cells(start_row=r, start_column=8, end_row=r, end_column=15)
-            sheet.cell(row=r, column=8).alignment = Alignment(vertical='center', wrap_text=True)
+            sheet.cell(row=r, column=8).alignment = CENTER_WRAP_ALIGNMENT
         elif 'Tohoku' in str(values):
             sheet.row_dimensions[r].height = 180
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=15)
@@ -1192,7 +1123,7 @@ def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_dep
         elif '生殖細胞系列由来' in str(values) :
             sheet.row_dimensions[r].height = 80
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=15)
-            sheet.cell(row=r, column=1).alignment = Alignment(vertical='center', wrap_text=True)
+            sheet.cell(row=r, column=1).alignment = CENTER_WRAP_ALIGNMENT
         elif 'ACMG' in str(values):
             sheet.row_dimensions[r].height = 50       
 
@@ -1231,10 +1162,7 @@ def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_dep
     insert_row(wb, df_germline, sheet_name='For_pts', start_row=start_row_germline, start_col='A', end_col='F')
 
     for df_section, start_row in [(df_patient, start_row_patient), (df_germline, start_row_germline)]:
-        for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-            for c_idx, value in enumerate(row, 1):
-                sheet.cell(row=r_idx, column=c_idx, value=value)
-                sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+        write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_row, alignment=TOP_ALIGNMENT)
 
     # 空行削除
     # delete_blank_lines(sheet)
@@ -1251,7 +1179,7 @@ def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_dep
         elif '生殖細胞系列由来' in str(values) :
             sheet.row_dimensions[r].height = 80
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=6)
-            sheet.cell(row=r, column=1).alignment = Alignment(vertical='center', wrap_text=True)        
+            sheet.cell(row=r, column=1).alignment = CENTER_WRAP_ALIGNMENT        
                     
     # 印刷範囲を設定（A1からF列までの最大行）
     sheet.print_area = f'A1:F{sheet.max_row}'
@@ -1264,20 +1192,22 @@ def excel_guardant360(analysis_type, output_stream, date, ep_institution, ep_dep
     return output_stream
 
 
-def excel_trusight(analysis_type, output_stream, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
+def excel_trusight(analysis_type, wb, frames, date, ep_institution, ep_department, ep_responsible, ep_contact, ep_tel):
     current_dir = os.getcwd()
 
-    xlsx = pd.read_excel(output_stream, sheet_name=None)
-    df_short = xlsx['SNV_Indel']
-    df_cnv = xlsx['CNV']
-    df_fusion = xlsx['Fusion']
-    df_msi = xlsx['MSI']
+    df_short = sheet_frame(frames.get('SNV_Indel'))
+    df_cnv = sheet_frame(frames.get('CNV'))
+    df_fusion = sheet_frame(frames.get('Fusion'))
+    df_msi = sheet_frame(frames.get('MSI'))
     
     # Initialize empty dataframes with columns to avoid errors if empty
     df_snv = pd.DataFrame(columns=Columns.SNV_INDEL)
     
     if not df_short.empty:
         df_short = df_short.copy()
+        # 深度はレポートの文字列のまま渡されるので数値にしてから割る
+        for column in ['alternateAlleleReadDepth', 'totalReadDepth']:
+            df_short[column] = pd.to_numeric(df_short[column], errors='coerce')
         df_short['alternateAlleleFrequency'] = df_short.apply(lambda x: x['alternateAlleleReadDepth'] / x['totalReadDepth'] if pd.notna(x['alternateAlleleReadDepth']) and pd.notna(x['totalReadDepth']) and x['totalReadDepth'] != 0 else None, axis=1)
         df_short['GeneBe_ClinVar_Germline'] = df_short['GeneBe_ClinVar_Germline'].fillna('').astype(str) + ' ' + df_short['GeneBe_ClinVar_Germline_Status'].fillna('').astype(str)
         df_short['GeneBe_ClinVar_Somatic'] = df_short['GeneBe_ClinVar_Somatic'].fillna('').astype(str) + ' ' + df_short['GeneBe_ClinVar_Somatic_Status'].fillna('').astype(str)   
@@ -1301,8 +1231,7 @@ def excel_trusight(analysis_type, output_stream, date, ep_institution, ep_depart
     df_germline = pd.DataFrame(columns=['Merged'])
     if not df_short.empty:
         df_germline = df_short[Columns.FOUNDATION_GERMLINE].copy()
-        base_path = os.path.dirname(__file__)
-        df_pgpv = pd.read_csv(os.path.join(base_path, Database.PGPV_PATH))
+        df_pgpv = pgpv_table()
         df_germline = pd.merge(df_germline, df_pgpv, on='geneSymbol', how='left')
         
         # Germline filtering
@@ -1335,7 +1264,6 @@ def excel_trusight(analysis_type, output_stream, date, ep_institution, ep_depart
     
     
     ####################################
-    wb = openpyxl.load_workbook(output_stream)
     sheet = wb['Summary']
         
     # 基本情報の入力
@@ -1349,13 +1277,11 @@ def excel_trusight(analysis_type, output_stream, date, ep_institution, ep_depart
     sheet['J55'] = ep_responsible
     sheet['J58'] = f'{ep_institution} {ep_department}\n{ep_contact}\n電話番号 {ep_tel}'
 
-    start_row_snv = 22
-    insert_row(wb, df_snv, sheet_name='Summary', start_row=start_row_snv, start_col='A', end_col='O')
+    sections = {'snv': df_snv, 'cnv': df_cnv, 'fusion': df_fusion, 'germline': df_germline}
+    start_rows = insert_sections(sheet, Layout.TRUSIGHT_SUMMARY, sections, start_col='A', end_col='O')
     for insert_pos in [2, 3, 7]:
         df_snv.insert(insert_pos, chr(96 + insert_pos), '')
     
-    start_row_cnv = start_row_snv + 5 + len(df_snv) - 1 if len(df_snv) > 1 else start_row_snv + 5
-    insert_row(wb, df_cnv, sheet_name='Summary', start_row=start_row_cnv, start_col='A', end_col='O')
     for insert_pos in [2, 4, 7, 8, 10]:
         col_name = chr(96 + insert_pos)
         if 0 <= insert_pos <= df_cnv.shape[1]:
@@ -1363,25 +1289,17 @@ def excel_trusight(analysis_type, output_stream, date, ep_institution, ep_depart
         else:
             df_cnv[col_name] = ''
             
-    start_row_fusion = start_row_cnv + 4 + len(df_cnv) - 1 if len(df_cnv) > 1 else start_row_cnv + 4
-    insert_row(wb, df_fusion, sheet_name='Summary', start_row=start_row_fusion, start_col='A', end_col='O')
     for insert_pos in [1, 2, 3, 4, 7, 8, 10]:
         col_name = chr(96 + insert_pos)
         if 0 <= insert_pos <= df_fusion.shape[1]:
             df_fusion.insert(insert_pos, col_name, '')
         else:
             df_fusion[col_name] = ''
-            
-    start_row_germline = start_row_fusion + 15 + len(df_fusion) - 1 if len(df_fusion) > 1 else start_row_fusion + 15
-    insert_row(wb, df_germline, sheet_name='Summary', start_row=start_row_germline, start_col='A', end_col='O')
 
-    for df_section, start_row in [(df_snv, start_row_snv), (df_cnv, start_row_cnv), (df_fusion, start_row_fusion), (df_germline, start_row_germline)]:
+    for name, df_section in sections.items():
         if df_section.empty:
             continue
-        for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-            for c_idx, value in enumerate(row, 1):
-                sheet.cell(row=r_idx, column=c_idx, value=value)
-                sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+        write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_rows[name], alignment=TOP_ALIGNMENT)
 
     # 条件に応じた行処理
     for row in sheet.iter_rows():
@@ -1399,7 +1317,7 @@ def excel_trusight(analysis_type, output_stream, date, ep_institution, ep_depart
         elif '生殖細胞系列由来' in str(values) :
             sheet.row_dimensions[r].height = 100
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=15)
-            sheet.cell(row=r, column=1).alignment = Alignment(vertical='center', wrap_text=True)
+            sheet.cell(row=r, column=1).alignment = CENTER_WRAP_ALIGNMENT
 
     # 固定セル結合
     sheet.merge_cells(start_row=3, start_column=17, end_row=15, end_column=26)
@@ -1435,10 +1353,7 @@ def excel_trusight(analysis_type, output_stream, date, ep_institution, ep_depart
     for df_section, start_row in [(df_patient, start_row_patient), (df_germline, start_row_germline)]:
         if df_section.empty:
             continue
-        for r_idx, row in enumerate(dataframe_to_rows(df_section, index=False, header=False), start_row):
-            for c_idx, value in enumerate(row, 1):
-                sheet.cell(row=r_idx, column=c_idx, value=value)
-                sheet.cell(row=r_idx, column=c_idx).alignment = Alignment(wrap_text=False, vertical='top')
+        write_rows(sheet, sheet_rows(df_section, header=False), start_row=start_row, alignment=TOP_ALIGNMENT)
 
     # 条件に応じた行処理
     for row in sheet.iter_rows():
@@ -1452,7 +1367,7 @@ def excel_trusight(analysis_type, output_stream, date, ep_institution, ep_depart
         elif '生殖細胞系列由来' in str(values) :
             sheet.row_dimensions[r].height = 80
             sheet.merge_cells(start_row=r, start_column=1, end_row=r, end_column=6)
-            sheet.cell(row=r, column=1).alignment = Alignment(vertical='center', wrap_text=True)        
+            sheet.cell(row=r, column=1).alignment = CENTER_WRAP_ALIGNMENT        
 
     # 印刷範囲を設定
     sheet.print_area = f'A1:F{sheet.max_row}'
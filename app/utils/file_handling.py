@@ -1,13 +1,18 @@
 import io
 import zipfile
 
-def create_zip_file(json_name, output_stream, proteinpaint_path, disco_path):
+
+def tsv_stream(df):
+    """DataFrame as a tab-separated file held in memory"""
+    return io.BytesIO(df.to_csv(sep='\t', index=False).encode('utf-8'))
+
+
+def create_zip_file(json_name, output_stream, proteinpaint_stream, disco_stream):
     zip_buffer = io.BytesIO()
     with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        zip_file.writestr(json_name + '.xlsx', output_stream.getvalue())
-        with open(proteinpaint_path, 'rb') as f:
-            zip_file.writestr(json_name + 'proteinpaint.tsv', f.read())
-        with open(disco_path, 'rb') as f:
-            zip_file.writestr(json_name + 'disco.tsv', f.read())
+        # 各バッファの内容をそのまま格納（ファイルの再読み込みやコピーを行わない）
+        zip_file.writestr(json_name + '.xlsx', output_stream.getbuffer())
+        zip_file.writestr(json_name + 'proteinpaint.tsv', proteinpaint_stream.getbuffer())
+        zip_file.writestr(json_name + 'disco.tsv', disco_stream.getbuffer())
     zip_buffer.seek(0)
-    return zip_buffer
\ No newline at end of file
+    return zip_buffer
@@ -0,0 +1,78 @@
+import os
+import threading
+
+try:
+    from cyvcf2 import VCF
+except ImportError:
+    VCF = None
+
+from .parameter import FrequencyLocal
+
+
+class FrequencyStore:
+    """Allele-frequency lookups by chr-pos-ref-alt against bgzip + tabix indexed VCFs"""
+
+    def __init__(self, sources):
+        self.sources = sources
+        # cyvcf2 の VCF オブジェクトはスレッド間で共有できないためスレッドごとに開く
+        self.local = threading.local()
+
+    def _indexed(self, path):
+        return os.path.exists(path) and (os.path.exists(path + '.tbi') or os.path.exists(path + '.csi'))
+
+    def available(self):
+        return VCF is not None and any(self._indexed(path) for _, path, _ in self.sources)
+
+    def _reader(self, path):
+        readers = getattr(self.local, 'readers', None)
+        if readers is None:
+            readers = self.local.readers = {}
+        if path not in readers:
+            vcf = VCF(path, lazy=True, threads=1)
+            readers[path] = (vcf, set(vcf.seqnames))
+        return readers[path]
+
+    def _query(self, path, af_key, chromosome, position, ref, alt):
+        vcf, seqnames = self._reader(path)
+        chromosome = str(chromosome).replace('chr', '')
+        contig = f'chr{chromosome}' if f'chr{chromosome}' in seqnames else chromosome
+        if contig not in seqnames:
+            return None
+        for record in vcf(f'{contig}:{position}-{position}'):
+            if record.POS != int(position) or record.REF != ref or alt not in record.ALT:
+                continue
+            af = record.INFO.get(af_key)
+            if isinstance(af, tuple):
+                af = af[record.ALT.index(alt)]
+            if af is not None:
+                return float(af)
+        return None
+
+    def lookup(self, variant):
+        """Return (source, allele frequency) from the first source that has the variant, or None"""
+        if VCF is None or not variant or len(str(variant).split('-')) != 4:
+            return None
+        chromosome, position, ref, alt = str(variant).split('-')
+        for name, path, af_key in self.sources:
+            if not self._indexed(path):
+                continue
+            try:
+                af = self._query(path, af_key, chromosome, position, ref, alt)
+            except Exception as e:
+                print(f"[Frequency lookup error] {e} - {name}: {variant}")
+                continue
+            if af is not None:
+                return name, af
+        return None
+
+
+frequency_store = FrequencyStore(FrequencyLocal.SOURCES)
+
+
+def local_frequency_mode():
+    """Return 'local', 'auto' (local first, dbSNP page as fallback) or None when only the scraper is used"""
+    if FrequencyLocal.BACKEND == 'local':
+        return 'local'
+    if FrequencyLocal.BACKEND == 'auto' and frequency_store.available():
+        return 'auto'
+    return None
@@ -1,21 +1,23 @@
-import os
-
-import pandas as pd
-
+from .reference_data import civic_feature_urls, hgnc_entrez_ids, tp53_classes
 from .web_scraping import fetch_genebe, fetch_tommo, fetch_clinvar
-from .parameter import Abbreviation, Database, Hyperlink
+from .parameter import Abbreviation, Hyperlink
 
 def link_generator(analysis_type, row, gene_id, transcript_id, chromosome, pos, ref, alt,
-                   cds_change, gene_symbol, amino_acids_change, dbsnp):
+                   cds_change, gene_symbol, amino_acids_change, dbsnp, genebe_result=None, clinvar_result=None, gene_annotation=None):
 
-    # GeneBe データ取得
-    genebe_json, variant, chromosome, position, ref, alt, dbsnp = fetch_genebe(analysis_type, transcript_id, cds_change)
+    # GeneBe データ取得（一括取得済みの結果があればそれを使用）
+    if genebe_result is None:
+        genebe_result = fetch_genebe(analysis_type, transcript_id, cds_change)
+    genebe_json, variant, chromosome, position, ref, alt, dbsnp = genebe_result
     variant_data = genebe_json[0] if genebe_json else {}
 
     consequences = variant_data.get('consequences', [])
     first_consequence = consequences[0] if consequences else {}
 
-    clinvar_data = fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp)
+    # ClinVar データ取得（一括取得済みの結果があればそれを使用）
+    clinvar_data = clinvar_result
+    if clinvar_data is None:
+        clinvar_data = fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp, variant)
     germline_sig = clinvar_data[0] if len(clinvar_data) > 0 else None
     germline_review = clinvar_data[1] if len(clinvar_data) > 1 else None
     somatic_sig = clinvar_data[2] if len(clinvar_data) > 2 else None
@@ -53,28 +55,26 @@ def link_generator(analysis_type, row, gene_id, transcript_id, chromosome, pos,
             'GeneBe_AlphaMissense_Prediction': variant_data.get('alphamissense_prediction'),
             'GeneBe_gnomAD_Exomes_AF': f"{variant_data.get('gnomad_exomes_af', 0):.3e}" if variant_data.get('gnomad_exomes_af') is not None else "N/A",
             'GeneBe_gnomAD_Genomes_AF': f"{variant_data.get('gnomad_genomes_af', 0):.3e}" if variant_data.get('gnomad_genomes_af') is not None else "N/A",
-            'GeneBe_TOMMO_dbSNP': fetch_tommo(transcript_id, cds_change, alt, dbsnp)
+            'GeneBe_TOMMO_dbSNP': fetch_tommo(transcript_id, cds_change, alt, dbsnp, variant)
         }
     if analysis_type != 'Guardant360':
         row.update(genebe_dic)
     else:
         row = genebe_dic        
         
+    # 遺伝子単位の注釈（レポート単位で結合済みならそれを使用）
+    if gene_annotation is None:
+        gene_annotation = {'CiVIC_URL': civic_feature_urls().get(gene_symbol), 'Entrez_ID': hgnc_entrez_ids().get(gene_symbol)}
+
     # CiVIC処理
-    base_path = os.path.dirname(__file__)
-    civic_file_path = os.path.join(base_path, Database.CIVIC_PATH)
-    civic_df = pd.read_csv(civic_file_path, sep='\t', encoding='utf-8', low_memory=False)
-    match = civic_df[civic_df['name'] == gene_symbol]
-    if not match.empty:
-        row['CiVIC'] = f'=HYPERLINK("{match.iloc[0]["feature_civic_url"]}", "CiVIC")'
+    civic_url = gene_annotation.get('CiVIC_URL')
+    if civic_url is not None:
+        row['CiVIC'] = f'=HYPERLINK("{civic_url}", "CiVIC")'
     else:
         row['CiVIC'] = '-'
     
-    hgnc_file_path = os.path.join(base_path, Database.HGNC_PATH)
-    civic_df = pd.read_csv(hgnc_file_path, sep='\t', encoding='utf-8', low_memory=False)
-    civic_gene = civic_df[civic_df['symbol'] == gene_symbol]
-    if not civic_gene.empty:
-        gene_id = str(civic_gene['entrez_id'].values[0])
+    if gene_annotation.get('Entrez_ID') is not None:
+        gene_id = gene_annotation['Entrez_ID']
             
     row['CKB CORE'] = f'=HYPERLINK("{Hyperlink.CKB_LINK}{gene_id}", "CKB CORE")'
     row['ClinGen'] = f'=HYPERLINK("{Hyperlink.CLINGEN_LINK}{transcript_id}:{cds_change}", "ClinGen")'
@@ -115,14 +115,8 @@ def link_generator(analysis_type, row, gene_id, transcript_id, chromosome, pos,
     row['St.Jude'] = f'=HYPERLINK("{Hyperlink.STJUDE_LINK}{gene_symbol}", "St.Jude")'
     
     # TP53処理
-    tp53_file_path = os.path.join(base_path, Database.TP53_PATH)
     if gene_symbol == 'TP53':
-        tp53_df = pd.read_csv(tp53_file_path, sep=',', encoding='utf-8')
-        tp53_df['TP53_h19'] = tp53_df['g_description'].str.replace('g.', '', regex=False)
-        tp53_dict = {row_data['TP53_h19']: row_data['TransactivationClass'] for _, row_data in tp53_df.iterrows() if pd.notna(row_data['TP53_h19'])}
-        
-        tp53_key = f"{pos}{ref}>{alt}"
-        row['TP53'] = tp53_dict.get(tp53_key, 'NA')
+        row['TP53'] = tp53_classes(pos, ref, alt).get('TransactivationClass', 'NA')
 
     else:
         row['TP53'] = '-' if gene_symbol != 'TP53' else 'NA'
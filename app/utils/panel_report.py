@@ -0,0 +1,408 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from io import BytesIO
+
+import pandas as pd
+
+try:
+    import python_calamine
+except ImportError:
+    python_calamine = None
+
+from .parameter import Base, Cache
+from .xml_sections import iter_sections
+
+
+class ReportCache:
+    """Parsed reports keyed by the SHA-256 of the file content, shared by every page of the process
+
+    Entries are weighed by the size of their file and the least recently used are dropped once the total exceeds max_bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.entries = OrderedDict()
+
+    def load(self, name, content, reader):
+        """Return reader(file object) for content (str, bytes or an uploaded file), parsing each distinct file once"""
+        digest, source, size = _digest_and_source(content)
+        key = (name, digest)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key][0]
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # 同じファイルを複数のページ・スレッドが同時に解析しないようキー単位でロック
+        with key_lock:
+            with self.lock:
+                if key in self.entries:
+                    return self.entries[key][0]
+            try:
+                value = reader(source)
+                # キーのロックを外す前に格納し、待っていたスレッドが再解析しないようにする
+                with self.lock:
+                    self._store(key, value, size)
+            finally:
+                with self.lock:
+                    self.key_locks.pop(key, None)
+            return value
+
+    def _store(self, key, value, size):
+        if size > self.max_bytes:
+            return
+        self.entries[key] = (value, size)
+        self.total_bytes += size
+        # 最終参照が古いものから破棄
+        while self.total_bytes > self.max_bytes:
+            _, (_, dropped) = self.entries.popitem(last=False)
+            self.total_bytes -= dropped
+
+
+def _digest_and_source(content):
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return hashlib.sha256(content).hexdigest(), BytesIO(content), len(content)
+    # アップロードされたファイル（BytesIO）はバッファをコピーせずにハッシュし、先頭から読み直す
+    with content.getbuffer() as buffer:
+        digest = hashlib.sha256(buffer).hexdigest()
+        size = buffer.nbytes
+    content.seek(0)
+    return digest, content, size
+
+
+# 解析結果は全ページで共有するため、呼び出し側で変更しないこと
+report_cache = ReportCache(Cache.REPORT_MAX_BYTES)
+
+
+def _slot_names(names):
+    # 'cds-effect' -> 'cds_effect'
+    return tuple(name.replace('-', '_') for name in names)
+
+
+class _Record:
+    """One entry of a report with a slot per field, filled while the file is read (missing fields are None)"""
+
+    __slots__ = ()
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            setattr(self, name, values.get(name))
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class _AttributeRecord(_Record):
+    """FoundationOne entry read from the attributes of its start tag"""
+
+    __slots__ = ()
+    ATTRIBUTES = ()
+
+    @classmethod
+    def from_attrib(cls, attrib):
+        return cls(**{name.replace('-', '_'): attrib.get(name) for name in cls.ATTRIBUTES})
+
+
+class VariantReport(_AttributeRecord):
+    ATTRIBUTES = (
+        'test-type', 'gender', 'disease', 'disease-ontology', 'tissue-of-origin', 'pathology-diagnosis', 'percent-tumor-nuclei',
+        'purity-assessment', 'specimen', 'flowcell-analysis', 'pipeline-version', 'study', 'test-request',
+    )
+    __slots__ = _slot_names(ATTRIBUTES)
+
+
+class Sample(_AttributeRecord):
+    ATTRIBUTES = ('name', 'bait-set', 'nucleic-acid-type', 'mean-exon-depth')
+    __slots__ = _slot_names(ATTRIBUTES)
+
+
+class QC(_AttributeRecord):
+    ATTRIBUTES = ('status',)
+    __slots__ = _slot_names(ATTRIBUTES)
+
+
+class ShortVariant(_AttributeRecord):
+    ATTRIBUTES = (
+        'gene', 'position', 'transcript', 'strand', 'cds-effect', 'protein-effect', 'functional-effect',
+        'allele-fraction', 'depth', 'equivocal', 'status',
+    )
+    __slots__ = _slot_names(ATTRIBUTES)
+
+
+class CNV(_AttributeRecord):
+    ATTRIBUTES = ('gene', 'position', 'copy-number', 'ratio', 'number-of-exons', 'type', 'equivocal', 'status')
+    __slots__ = _slot_names(ATTRIBUTES)
+
+
+class Rearrangement(_AttributeRecord):
+    ATTRIBUTES = (
+        'targeted-gene', 'other-gene', 'description', 'type', 'in-frame', 'pos1', 'pos2', 'allele-fraction',
+        'percent-reads', 'supporting-read-pairs', 'equivocal', 'status',
+    )
+    __slots__ = _slot_names(ATTRIBUTES)
+
+
+class Biomarker(_Record):
+    """MSI or TMB result; count is the number of non-synonymous alterations behind a GenMineTOP TMB"""
+
+    __slots__ = ('score', 'unit', 'count', 'status')
+
+    @classmethod
+    def from_attrib(cls, attrib):
+        return cls(score=attrib.get('score'), unit=attrib.get('unit'), status=attrib.get('status'))
+
+
+class NonHuman(_AttributeRecord):
+    ATTRIBUTES = ('organism', 'reads-per-million', 'status')
+    __slots__ = _slot_names(ATTRIBUTES)
+
+
+class FoundationOneReport:
+    """FoundationOne XML sections as lists of records"""
+
+    __slots__ = (
+        'reference_id', 'variant_reports', 'samples', 'quality_controls', 'short_variants', 'copy_number_alterations',
+        'rearrangements', 'microsatellite_instabilities', 'tumor_mutation_burdens', 'non_humans',
+    )
+
+    # XML 上のパス -> (属性名, レコードの型)
+    SECTIONS = {
+        './/vr:variant-report': ('variant_reports', VariantReport),
+        './/vr:sample': ('samples', Sample),
+        './/vr:quality-control': ('quality_controls', QC),
+        './/vr:short-variant': ('short_variants', ShortVariant),
+        './/vr:copy-number-alteration': ('copy_number_alterations', CNV),
+        './/vr:rearrangement': ('rearrangements', Rearrangement),
+        './/vr:microsatellite-instability': ('microsatellite_instabilities', Biomarker),
+        './/vr:tumor-mutation-burden': ('tumor_mutation_burdens', Biomarker),
+        './/vr:non-human': ('non_humans', NonHuman),
+    }
+
+    def __init__(self):
+        self.reference_id = None
+        for name, _ in self.SECTIONS.values():
+            setattr(self, name, [])
+
+
+def _read_foundationone(source):
+    report = FoundationOneReport()
+    # 各セクションは属性のみを使うため開始タグでレコードにし、要素は保持しない
+    for path, elem in iter_sections(source, ['.//rr:ReferenceID'], Base.NEME_SPACE, start_paths=list(FoundationOneReport.SECTIONS)):
+        if path == './/rr:ReferenceID':
+            if report.reference_id is None:
+                report.reference_id = elem.text or ''
+        else:
+            name, record = FoundationOneReport.SECTIONS[path]
+            getattr(report, name).append(record.from_attrib(elem.attrib))
+    return report
+
+
+def foundationone_report(content):
+    """FoundationOneReport for an XML file (str, bytes or uploaded file), parsed once per distinct content"""
+    return report_cache.load('foundationone', content, _read_foundationone)
+
+
+class _ElementRecord(_Record):
+    """GenMineTOP entry read from the texts under its element"""
+
+    __slots__ = ()
+    # 属性名 -> 最初に一致した要素のテキストのパス（要素がなければ None）
+    PATHS = {}
+    # 属性名 -> 繰り返し要素のテキストのタプルのパス
+    LISTS = {}
+
+    @classmethod
+    def from_element(cls, elem, **values):
+        values.update({name: elem.findtext(path) for name, path in cls.PATHS.items()})
+        values.update({name: tuple(item.text for item in elem.iterfind(path)) for name, path in cls.LISTS.items()})
+        return cls(**values)
+
+
+class Reference(_ElementRecord):
+    PATHS = {'name': 'name', 'version': 'version', 'released_at': 'released-at', 'genome': 'genome'}
+    __slots__ = ('source',) + tuple(PATHS)
+
+
+class Breakpoint(_ElementRecord):
+    PATHS = {name: name for name in ('region', 'index', 'length', 'gene', 'transcript', 'chr', 'pos')}
+    __slots__ = tuple(PATHS)
+
+
+class Alteration(_ElementRecord):
+    """One GenMineTOP alterations/item; which fields are set depends on its type (snv, cnv-*, fusion, expression, ...)"""
+
+    PATHS = {
+        'type': 'type',
+        'origin': 'origin',
+        'gene': 'gene',
+        'transcript': 'transcript',
+        'locus': 'locus',
+        'cytoband': 'cytoband',
+        'ref': 'ref',
+        'alt': 'alt',
+        'cds_change': 'coding-dna-alteration',
+        'protein_change': 'protein-alteration',
+        'allele_frequency': 'allele-frequency',
+        'status': 'status',
+        'ag_class': 'ag-class',
+        'clinvar_id': './/clinvar/id/item',
+        'cosmic_id': './/cosmic/id/item',
+        'clinical_significance': './/clinical-significance/item',
+        'num_copy': 'num-copy',
+        'ratio': 'ratio',
+        'num_reads': 'num-reads',
+        'frame': 'frame',
+        'vendor_id': './/id/vendor',
+        'tpm': 'tpm',
+        'normal_tpm_mean': './/normal-expression/tpm/mean',
+        'normal_tpm_sd': './/normal-expression/tpm/sd',
+        'normal_n': './/normal-expression/tpm/n',
+    }
+    # 融合遺伝子・発現では gene / transcript などが item の並びになる
+    LISTS = {
+        'gene_items': 'gene/item',
+        'transcript_items': './/transcript/item',
+        'locus_items': './/locus/item',
+        'cytoband_items': './/cytoband/item',
+    }
+    __slots__ = tuple(PATHS) + tuple(LISTS) + ('breakpoints',)
+
+    @classmethod
+    def from_element(cls, elem, **values):
+        breakpoints = tuple(Breakpoint.from_element(item) for item in elem.iterfind('breakpoint/item'))
+        return super().from_element(elem, breakpoints=breakpoints, **values)
+
+
+class SequencingQC(_Record):
+    """Texts of the elements under a GenMineTOP report/qc, keyed by their path below qc ('sequence/tumor/dna/status')"""
+
+    __slots__ = ('texts',)
+
+    @classmethod
+    def from_element(cls, elem):
+        texts = {}
+
+        def walk(node, prefix):
+            for child in node:
+                path = f'{prefix}{child.tag}'
+                # 同じパスが複数あれば find と同じく最初の要素を使う
+                texts.setdefault(path, child.text or '')
+                walk(child, f'{path}/')
+
+        walk(elem, '')
+        return cls(texts=texts)
+
+    def has(self, path):
+        return path in self.texts
+
+    def text(self, path, default=None):
+        """Text of the element at path below qc, or default when there is none"""
+        return self.texts.get(path, default)
+
+
+class GenMineTopReport:
+    """GenMineTOP XML: the first text of each header field, and the records of each repeated section"""
+
+    __slots__ = ('fields', 'references', 'qc', 'msi', 'tmb', 'signature_values', 'alterations')
+
+    # 属性名 -> XML 上のパス（最初に一致した要素のテキスト）
+    FIELDS = {
+        'report_id': './/id',
+        'hospital': './/report/owner/hospital',
+        'doctor': './/report/owner/doctor',
+        'sex': './/report/patient/sex',
+        'age': './/report/patient/age',
+        'patient_id': './/report/patient/id',
+        'c_cat_id': './/report/patient/c-cat-id',
+        'pathology': './/report/specimen/pathology',
+        'germline_disclosure': './/report/preference/germline-disclosure',
+        'snp_correlation': './/report/qc/sequence/snp-correlation/value',
+    }
+    REFERENCES = {
+        'db': './/report/reference/db/item',
+        'snp-db': './/report/reference/snp-db/item',
+        'resource': './/report/reference/resource/item',
+        'program': './/report/reference/program/item',
+    }
+    QC = './/report/qc'
+    MSI = './/report/result/marker/msi'
+    TMB = './/report/result/marker/tmb'
+    ALTERATIONS = './/report/result/alterations/item'
+    SIGNATURE_VALUES = './/report/result/marker/signature/values/item'
+
+    def __init__(self):
+        self.fields = {}
+        self.references = {source: [] for source in self.REFERENCES}
+        self.qc = []
+        self.msi = []
+        # exon ごとの TMB
+        self.tmb = []
+        self.signature_values = []
+        self.alterations = []
+
+    def field(self, name, default=None):
+        """First text of a header field, or default when the element is missing"""
+        return self.fields.get(name, default)
+
+
+def _read_genminetop(source):
+    report = GenMineTopReport()
+    field_names = {path: name for name, path in GenMineTopReport.FIELDS.items()}
+    reference_sources = {path: source for source, path in GenMineTopReport.REFERENCES.items()}
+    sections = [GenMineTopReport.QC, GenMineTopReport.MSI, GenMineTopReport.TMB, GenMineTopReport.ALTERATIONS, GenMineTopReport.SIGNATURE_VALUES]
+    # 部分木は読み終えた時点でレコードにし、要素は iter_sections が木から外す
+    for path, elem in iter_sections(source, list(field_names) + list(reference_sources) + sections):
+        if path in field_names:
+            report.fields.setdefault(field_names[path], elem.text or '')
+        elif path in reference_sources:
+            source_name = reference_sources[path]
+            report.references[source_name].append(Reference.from_element(elem, source=source_name))
+        elif path == GenMineTopReport.ALTERATIONS:
+            report.alterations.append(Alteration.from_element(elem))
+        elif path == GenMineTopReport.QC:
+            report.qc.append(SequencingQC.from_element(elem))
+        elif path == GenMineTopReport.MSI:
+            report.msi.append(Biomarker(score=elem.findtext('score/value'), status=elem.findtext('status')))
+        elif path == GenMineTopReport.TMB:
+            report.tmb.extend(
+                Biomarker(count=exon.findtext('num-non-synonymous-alterations'), score=exon.findtext('frequency-non-synonymous-alterations'))
+                for exon in elem.iterfind('exon')
+            )
+        else:
+            report.signature_values.append(elem.text)
+    return report
+
+
+def genminetop_report(content):
+    """GenMineTopReport for an XML file (str, bytes or uploaded file), parsed once per distinct content"""
+    return report_cache.load('genminetop', content, _read_genminetop)
+
+
+def _read_hemesight(source):
+    return json.load(source)
+
+
+def hemesight_report(content):
+    """Decoded HemeSight JSON (str, bytes or uploaded file), parsed once per distinct content"""
+    return report_cache.load('hemesight', content, _read_hemesight)
+
+
+def _read_guardant360(source):
+    # python-calamine があれば高速な読み取り専用エンジンで読み込む
+    engine = 'calamine' if python_calamine is not None else 'openpyxl'
+    return pd.read_excel(source, sheet_name=None, engine=engine)
+
+
+def guardant360_report(content):
+    """{sheet name: DataFrame} of a Guardant360 Interim workbook (bytes or uploaded file), opened once to read every sheet
+
+    The DataFrames are shared between pages; copy one before changing it in place.
+    """
+    return report_cache.load('guardant360', content, _read_guardant360)
@@ -175,13 +175,60 @@ class Database:
     CIVIC_PATH = os.path.join(BASE_DIR, 'app', 'db', 'nightly-FeatureSummaries.tsv')
     COSMIC_PATH = os.path.join(BASE_DIR, 'app', 'db', 'Cosmic_CancerGeneCensus_v*_GRCh38.tsv')
     COSMIC_37_PATH = os.path.join(BASE_DIR, 'app', 'db', 'CancerMutationCensus_Slim_v*_GRCh37.tsv.gz')
+    COSMIC_37_ALLDATA_PATH = os.path.join(BASE_DIR, 'app', 'db', 'CancerMutationCensus_AllData_v*_GRCh37*.tsv.gz')
+    COMPILED_DIR = os.path.join(BASE_DIR, 'app', 'db', 'compiled')
     HGNC_PATH = os.path.join(BASE_DIR, 'app', 'db', 'protein-coding_gene.tsv')
     JSA_PATH = os.path.join(BASE_DIR, 'app', 'db', 'JSH_Guidelines.csv')
     LOGO_PATH = os.path.join(BASE_DIR, 'app', 'template', 'Logo.png')
     PGPV_PATH = os.path.join(BASE_DIR, 'app', 'db', 'pgpv.csv')
     TP53_PATH = os.path.join(BASE_DIR, 'app', 'db', 'MutationView_r21.csv')
 
-    
+
+
+class RateLimit:
+    # NCBI E-utilities の APIキー（環境変数 NCBI_API_KEY で設定）
+    NCBI_API_KEY = os.environ.get('NCBI_API_KEY', '')
+    # ホストごとの1秒あたりの最大リクエスト数（NCBI は APIキーなしで3回、ありで10回）
+    HOST_LIMITS = {
+        'ncbi.nlm.nih.gov': 10 if NCBI_API_KEY else 3,
+    }
+    # バリアント注釈を並列実行するスレッド数
+    MAX_WORKERS = 8
+    # esummary 1回あたりの取得件数
+    CLINVAR_SUMMARY_RETMAX = 500
+
+
+class Cache:
+    # アノテーションキャッシュの保存先（環境変数 EXPRESS_CACHE_PATH で変更可）
+    PATH = os.environ.get('EXPRESS_CACHE_PATH', os.path.join(Database.BASE_DIR, 'app', 'db', 'annotation_cache.sqlite'))
+    # データソースごとの有効期限（秒）
+    TTL = {
+        'genebe': 30 * 24 * 60 * 60,
+        'clinvar': 7 * 24 * 60 * 60,
+        'tommo': 90 * 24 * 60 * 60,
+    }
+    # 保持する最大件数（超えた分は最終参照が古い順に削除）
+    MAX_ENTRIES = 200000
+    # 解析済みレポート（ファイル内容のハッシュ単位）をプロセス内に保持する上限（元ファイルの合計バイト数）
+    REPORT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class ClinVarLocal:
+    # variant_summary.txt.gz / ClinVar VCF から作成するローカルストア
+    PATH = os.environ.get('EXPRESS_CLINVAR_DB', os.path.join(Database.BASE_DIR, 'app', 'db', 'clinvar_local.sqlite'))
+    # 'remote': E-utilities のみ / 'local': ローカルストアのみ / 'auto': ローカルストアがあれば使用
+    BACKEND = os.environ.get('EXPRESS_CLINVAR_BACKEND', 'auto')
+
+
+class FrequencyLocal:
+    # 'remote': dbSNP ページから取得 / 'local': ローカルVCFのみ / 'auto': ローカルVCFを優先し、見つからなければ dbSNP
+    BACKEND = os.environ.get('EXPRESS_FREQUENCY_BACKEND', 'auto')
+    # bgzip + tabix 済みのアレル頻度VCF（上から優先、名前は ToMMo の primary_keys / fallback_key に対応）
+    SOURCES = [
+        ('60KJPN', os.environ.get('EXPRESS_TOMMO_VCF', os.path.join(Database.BASE_DIR, 'app', 'db', 'tommo_60kjpn.vcf.gz')), 'AF'),
+        ('GnomAD_exomes', os.environ.get('EXPRESS_GNOMAD_VCF', os.path.join(Database.BASE_DIR, 'app', 'db', 'gnomad_exomes.vcf.gz')), 'AF'),
+    ]
+
     
 class Hyperlink:
     CKB_LINK = 'https://ckb.genomenon.com/gene/show?geneId='
@@ -241,6 +288,16 @@ class Columns:
                    'GeneBe_gnomAD_Exomes_AF', 'GeneBe_gnomAD_Genomes_AF', 'GeneBe_TOMMO_dbSNP']
     
 
+class Layout:
+    # テンプレート上の各セクションの行番号（行挿入前）
+    HEMESIGHT_REPORT = {'mt': 16, 'mnv': 21, 'sv': 25, 'fu': 29, 'du': 33, 'gl': 37,
+                        'up': 41, 'up_sv': 45, 'jsh_evidence': 49, 'jsh_drugs': 53}
+    FOUNDATION_SUMMARY = {'snv': 22, 'cnv': 27, 'fusion': 31, 'germline': 46}
+    GENMINE_SUMMARY = {'germline': 17, 'short': 23, 'cnv': 28, 'fusion': 32, 'germline_comment': 47}
+    GENMINE_FOR_PTS = {'patient': 26, 'germline': 31}
+    TRUSIGHT_SUMMARY = {'snv': 22, 'cnv': 27, 'fusion': 31, 'germline': 46}
+
+
 class ReadRange:
     FASTTRACK = [
         {
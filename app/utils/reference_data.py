@@ -0,0 +1,183 @@
+import os
+import re
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .parameter import Abbreviation, Columns, Database
+
+
+class ReferenceRegistry:
+    """Load each reference table once per process and reload it only when the file changes"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key_locks = {}
+        self.entries = {}
+
+    def load(self, name, path, loader):
+        """Return loader(path), cached on (name, path) and invalidated by the file's mtime
+
+        path may also be a tuple of files for tables derived from several sources.
+        """
+        if isinstance(path, tuple):
+            key = (name, tuple(os.path.abspath(p) for p in path))
+            mtime = tuple(os.path.getmtime(p) for p in path)
+        else:
+            key = (name, os.path.abspath(path))
+            mtime = os.path.getmtime(path)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        # 同じテーブルを複数スレッドが同時に読み込まないようキー単位でロック
+        with key_lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == mtime:
+                return entry[1]
+            value = loader(path)
+            self.entries[key] = (mtime, value)
+            return value
+
+
+# 読み込んだ DataFrame / dict は全スレッドで共有するため、呼び出し側で変更しないこと
+reference_registry = ReferenceRegistry()
+
+
+def first_row_index(df, key_columns, value_column):
+    """Map each key (a value, or a tuple for several columns) to value_column of its first row"""
+    df = df.dropna(subset=key_columns).drop_duplicates(subset=key_columns, keep='first')
+    if len(key_columns) == 1:
+        keys = df[key_columns[0]]
+    else:
+        keys = zip(*(df[column] for column in key_columns))
+    return dict(zip(keys, df[value_column].to_numpy()))
+
+
+def _read_civic_feature_urls(path):
+    df_civic = pd.read_csv(path, sep='\t', encoding='utf-8', low_memory=False, usecols=['name', 'feature_civic_url'])
+    df_civic = df_civic.drop_duplicates(subset='name', keep='first')
+    return dict(zip(df_civic['name'], df_civic['feature_civic_url']))
+
+
+def civic_feature_urls(path=Database.CIVIC_PATH):
+    """Gene symbol -> CiVIC feature URL"""
+    return reference_registry.load('civic_feature_urls', path, _read_civic_feature_urls)
+
+
+def _read_hgnc_entrez_ids(path):
+    df_hgnc = pd.read_csv(path, sep='\t', encoding='utf-8', low_memory=False, usecols=['symbol', 'entrez_id'])
+    df_hgnc = df_hgnc.drop_duplicates(subset='symbol', keep='first')
+    return dict(zip(df_hgnc['symbol'], df_hgnc['entrez_id'].astype(str)))
+
+
+def hgnc_entrez_ids(path=Database.HGNC_PATH):
+    """Gene symbol -> Entrez gene ID (as string)"""
+    return reference_registry.load('hgnc_entrez_ids', path, _read_hgnc_entrez_ids)
+
+
+def _read_pgpv(path):
+    return pd.read_csv(path)
+
+
+def pgpv_table(path=Database.PGPV_PATH):
+    """Presumed germline pathogenic variant thresholds and comments per gene (pgpv.csv)"""
+    return reference_registry.load('pgpv', path, _read_pgpv)
+
+
+class DiseaseMatcher:
+    """Map a free-text disease name to its abbreviation with one precompiled pattern"""
+
+    def __init__(self, abbreviations, default='Other'):
+        self.abbreviations = abbreviations
+        self.default = default
+        self.order = {name: i for i, name in enumerate(abbreviations)}
+        # 先読みで全位置の一致を拾い、辞書順で最初に登録された病名を採用（従来の線形走査と同じ結果）
+        self.pattern = re.compile('(?=(' + '|'.join(map(re.escape, abbreviations)) + '))')
+
+    def match(self, disease_name):
+        if not isinstance(disease_name, str):
+            return self.default
+        found = {m.group(1) for m in self.pattern.finditer(disease_name)}
+        if not found:
+            return self.default
+        return self.abbreviations[min(found, key=self.order.get)]
+
+
+disease_matcher = DiseaseMatcher(Abbreviation.ABBR_DISEASE_NAME)
+
+
+class GuidelineIndex:
+    """JSH guideline evidence and drug rows pre-sliced by disease abbreviation and gene"""
+
+    def __init__(self, df_jsh, abbreviations):
+        self.evidence = df_jsh[Columns.HEMESIGHT_JSA].assign(Check='evidence')
+        self.drugs = df_jsh[['Gene', 'Drugs', 'Comments']].assign(Check='drug')
+        # 略語ごとに Disease の部分一致（従来の str.contains と同じ正規表現）を一度だけ評価
+        self.rows = {}
+        genes = df_jsh['Gene'].to_numpy()
+        for abbreviation in abbreviations:
+            with warnings.catch_warnings():
+                # 'ALCL (ALK+)' などグループを含む略語の警告を抑止
+                warnings.simplefilter('ignore', UserWarning)
+                positions = np.flatnonzero(df_jsh['Disease'].str.contains(abbreviation, na=False).to_numpy())
+            by_gene = {}
+            for position in positions:
+                by_gene.setdefault(genes[position], []).append(position)
+            self.rows[abbreviation] = by_gene
+
+    def _positions(self, cancer_type, genes):
+        by_gene = self.rows.get(cancer_type, {})
+        # Gene 順（同じ遺伝子内はファイル順）に並べる
+        return [position for gene in sorted(set(genes) & by_gene.keys()) for position in by_gene[gene]]
+
+    def evidence_rows(self, cancer_type, genes):
+        return self.evidence.iloc[self._positions(cancer_type, genes)]
+
+    def drug_rows(self, cancer_type, genes):
+        return self.drugs.iloc[self._positions(cancer_type, genes)]
+
+
+def _read_guideline_index(path):
+    df_jsh = pd.read_csv(path, encoding='utf-8')
+    abbreviations = list(dict.fromkeys(Abbreviation.ABBR_DISEASE_NAME.values())) + [disease_matcher.default]
+    return GuidelineIndex(df_jsh, abbreviations)
+
+
+def jsh_guideline_index(path=Database.JSA_PATH):
+    """JSH_Guidelines.csv indexed by (disease abbreviation, gene), built once per file"""
+    return reference_registry.load('jsh_guideline_index', path, _read_guideline_index)
+
+
+# MutationView の機能分類列（ファイルに存在する列のみ索引化）
+TP53_CLASS_COLUMNS = ['TransactivationClass', 'DNE_LOFclass', 'StructureFunctionClass', 'AGVGDClass', 'SIFTClass', 'Polyphen2']
+TP53_GENOMIC_COLUMNS = {'GRCh37': 'g_description', 'GRCh38': 'g_description_GRCh38'}
+
+
+def _tp53_key(position, ref, alt):
+    return f"{position}{ref}>{alt}"
+
+
+def _read_tp53_index(path):
+    df_tp53 = pd.read_csv(path, sep=',', encoding='utf-8', low_memory=False)
+    class_columns = [column for column in TP53_CLASS_COLUMNS if column in df_tp53.columns]
+    index = {}
+    for genome, column in TP53_GENOMIC_COLUMNS.items():
+        if column not in df_tp53.columns:
+            index[genome] = {}
+            continue
+        # 'g.7578406C>T' -> '7578406C>T'（同じ変化が複数行ある場合は先頭行を採用）
+        keys = df_tp53[column].str.strip().str.replace('g.', '', regex=False)
+        df_keyed = df_tp53[class_columns].assign(key=keys).dropna(subset=['key']).drop_duplicates(subset='key', keep='first')
+        index[genome] = dict(zip(df_keyed['key'], df_keyed[class_columns].to_dict('records')))
+    return index
+
+
+def tp53_index(path=Database.TP53_PATH):
+    """{'GRCh37' | 'GRCh38': {'{pos}{ref}>{alt}': {class column: value}}} built once per MutationView file"""
+    return reference_registry.load('tp53_index', path, _read_tp53_index)
+
+
+def tp53_classes(position, ref, alt, genome='GRCh37', path=Database.TP53_PATH):
+    """Return every MutationView class for a TP53 genomic change, or {} when it is not listed"""
+    return tp53_index(path)[genome].get(_tp53_key(position, ref, alt), {})
@@ -0,0 +1,181 @@
+import json
+from copy import copy
+
+import numpy as np
+import pandas as pd
+from openpyxl.styles import Alignment
+
+
+# レポート欄で共通に使うスタイル（セルごとに生成せず同じオブジェクトを共有）
+TOP_ALIGNMENT = Alignment(wrap_text=False, vertical='top')
+CENTER_WRAP_ALIGNMENT = Alignment(vertical='center', wrap_text=True)
+
+
+def _cell_text(value):
+    if isinstance(value, list):
+        return "\n".join(map(str, value))
+    if isinstance(value, dict):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _column_values(series):
+    # 数値・文字列列はそのまま Python の値に変換し、object 列だけリスト・辞書を文字列化する
+    values = series.tolist()
+    if series.dtype == object:
+        values = [_cell_text(value) for value in values]
+    return values
+
+
+def sheet_rows(df, header=True):
+    """Rows of cell values for df (like dataframe_to_rows without index), converted column by column"""
+    columns = [_column_values(df.iloc[:, i]) for i in range(df.shape[1])]
+    rows = [list(row) for row in zip(*columns)]
+    if header:
+        rows.insert(0, list(df.columns.values))
+    return rows
+
+
+def write_rows(sheet, rows, start_row=1, start_col=1, alignment=None):
+    """Write rows of values into sheet from (start_row, start_col), applying one shared alignment"""
+    for r_idx, row in enumerate(rows, start_row):
+        for c_idx, value in enumerate(row, start_col):
+            cell = sheet.cell(row=r_idx, column=c_idx, value=value)
+            if alignment is not None:
+                cell.alignment = alignment
+
+
+def write_df_to_sheet(data_section, sheet_name, wb):
+    # データを正規化（既にDataFrameならそのまま）
+    if not isinstance(data_section, pd.DataFrame):
+        df = pd.json_normalize(data_section)
+    else:
+        df = data_section
+    rows = sheet_rows(df)
+    # テンプレートにあるシートは見出し等を残すため既存セルに上書き、新規シートは行単位で追記
+    if sheet_name in wb.sheetnames:
+        write_rows(wb[sheet_name], rows)
+    else:
+        sheet = wb.create_sheet(title=sheet_name)
+        for row in rows:
+            sheet.append(row)
+    return df
+
+
+# シートでは空欄として扱う値（ClinVar・GeneBe は情報なしを "NA" / "N/A" で書く）
+MISSING_TEXT = ['', 'NA', 'N/A']
+
+
+def sheet_frame(df):
+    """df with cells as written to its sheet: list/dict cells as text, MISSING_TEXT as NaN, all-empty rows dropped
+
+    df is None for a template sheet nothing was written to, which gives an empty DataFrame.
+    """
+    if df is None:
+        return pd.DataFrame()
+    df = df.copy()
+    for i in range(df.shape[1]):
+        if df.dtypes.iloc[i] == object:
+            df.isetitem(i, _column_values(df.iloc[:, i]))
+    return df.replace(MISSING_TEXT, np.nan).dropna(how='all', ignore_index=True)
+
+
+def insert_sections(sheet, anchors, frames, start_col, end_col):
+    """Make room for every section and return {section: start row} after insertion
+
+    anchors maps each section to its row in the template, frames maps it to its DataFrame (or None).
+    Like chained insert_row calls, len(df) - 1 rows are inserted at each anchor and the anchor row's
+    style is copied to them; merged cells and row heights are not shifted.
+    """
+    counts = {}
+    for name in anchors:
+        frame = frames.get(name)
+        counts[name] = max(len(frame) - 1, 0) if frame is not None else 0
+    names = sorted(anchors, key=anchors.get)
+
+    # 下のセクションから挿入し、上側のアンカー行番号をずらさずに済ませる
+    for name in reversed(names):
+        anchor, count = anchors[name], counts[name]
+        if count == 0:
+            continue
+        styles = [
+            {
+                'font': copy(cell.font),
+                'border': copy(cell.border),
+                'fill': copy(cell.fill),
+                'number_format': copy(cell.number_format),
+                'alignment': copy(cell.alignment)
+            }
+            for cell in sheet[f'{start_col}{anchor}:{end_col}{anchor}'][0]
+        ]
+        sheet.insert_rows(anchor, amount=count)
+        for r_idx in range(anchor, anchor + count):
+            for c_idx, style in enumerate(styles, start=1):
+                cell = sheet.cell(row=r_idx, column=c_idx)
+                cell.font = style['font']
+                cell.border = style['border']
+                cell.fill = style['fill']
+                cell.number_format = style['number_format']
+                cell.alignment = style['alignment']
+
+    start_rows, offset = {}, 0
+    for name in names:
+        start_rows[name] = anchors[name] + offset
+        offset += counts[name]
+    return start_rows
+
+
+class AnchorIndex:
+    """Rows whose cells contain each marker string, collected in one scan and kept in step with row insertions
+
+    markers are searched in every column; column_markers ({column number: [marker, ...]}) only in that column.
+    """
+
+    def __init__(self, sheet, markers, column_markers=None):
+        self.sheet = sheet
+        self.markers = list(markers)
+        self.column_markers = column_markers or {}
+        self.found = {marker: set() for marker in self.markers}
+        for column_marker_list in self.column_markers.values():
+            for marker in column_marker_list:
+                self.found[marker] = set()
+        self.scan_rows(range(1, sheet.max_row + 1))
+
+    def _add(self, row, column, value):
+        if value is None:
+            return
+        text = str(value)
+        for marker in self.markers:
+            if marker in text:
+                self.found[marker].add(row)
+        for marker in self.column_markers.get(column, ()):
+            if marker in text:
+                self.found[marker].add(row)
+
+    def scan_rows(self, rows):
+        """Index newly written rows"""
+        rows = list(rows)
+        if not rows:
+            return
+        # 対象範囲を iter_rows で一度だけ読み、値のあるセルを索引に加える
+        values = self.sheet.iter_rows(min_row=min(rows), max_row=max(rows), values_only=True)
+        wanted = set(rows)
+        for row, row_values in enumerate(values, start=min(rows)):
+            if row not in wanted:
+                continue
+            for column, value in enumerate(row_values, start=1):
+                self._add(row, column, value)
+
+    def insert_rows(self, idx, amount):
+        """Shift indexed rows as sheet.insert_rows(idx, amount) shifts the cells"""
+        if amount <= 0:
+            return
+        for marker, rows in self.found.items():
+            self.found[marker] = {row + amount if row >= idx else row for row in rows}
+
+    def has(self, row, marker):
+        return row in self.found[marker]
+
+    def rows(self, *markers):
+        """Sorted rows containing any of the markers"""
+        return sorted(set().union(*(self.found[marker] for marker in markers)))
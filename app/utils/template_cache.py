@@ -0,0 +1,48 @@
+import copyreg
+import pickle
+from io import BytesIO
+
+import openpyxl
+from openpyxl.drawing.image import Image
+from openpyxl.worksheet.table import TableList
+
+from .reference_data import reference_registry
+
+
+LOGO_WIDTH = 400
+
+
+def _reduce_table_list(tables):
+    # TableList.items() は (名前, 範囲) を返すため、dict の items で Table オブジェクトごと保存
+    return TableList, (), None, None, iter(dict.items(tables))
+
+
+def _read_template_snapshot(path):
+    # 解析済みのブックを直列化して保持（レポートごとに復元して独立したコピーを渡す）
+    buffer = BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = copyreg.dispatch_table.copy()
+    pickler.dispatch_table[TableList] = _reduce_table_list
+    pickler.dump(openpyxl.load_workbook(path))
+    return buffer.getvalue()
+
+
+def load_template(path):
+    """Return a fresh copy of the Template_*.xlsx workbook, parsed once per file and restored from a snapshot"""
+    return pickle.loads(reference_registry.load('template_snapshot', path, _read_template_snapshot))
+
+
+def _read_logo(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    image = Image(BytesIO(data))
+    return data, LOGO_WIDTH, int(LOGO_WIDTH * image.height / image.width)
+
+
+def logo_image(path):
+    """Return a new Image of the logo scaled to LOGO_WIDTH, reading and measuring the file once"""
+    data, width, height = reference_registry.load('logo', path, _read_logo)
+    img = Image(BytesIO(data))
+    img.width = width
+    img.height = height
+    return img
@@ -1,9 +1,12 @@
 import re
-import requests
 from bs4 import BeautifulSoup
 import genebe as gnb
 
-from .parameter import Hyperlink
+from .annotation_cache import annotation_cache
+from .annotation_executor import host_limiter
+from .clinvar_local import clinvar_store, use_local_clinvar
+from .frequency_local import frequency_store, local_frequency_mode
+from .parameter import Hyperlink, RateLimit
 
 
 
@@ -13,6 +16,9 @@ def fetch_genebe(analysis_type, transcript_id, cds_change):
 
     # gnb.parse_variants を使って HGVS 形式から chr-pos-ref-alt を取得
     hgvs = f'{transcript_id}:{cds_change}'
+    cached = annotation_cache.get('genebe', hgvs, grc)
+    if cached is not None:
+        return tuple(cached)
     try:
         parsed = gnb.parse_variants([hgvs], genome=grc)
         if not parsed or parsed[0] is None:
@@ -36,10 +42,94 @@ def fetch_genebe(analysis_type, transcript_id, cds_change):
         print(f"[GeneBe annotate error] {e} - variant: {variant}")
         return None, None, None, None, None, None, None
 
+    if genebe_json:
+        annotation_cache.set('genebe', hgvs, [genebe_json, variant, chromosome, position, ref, alt, dbsnp], grc)
     return genebe_json, variant, chromosome, position, ref, alt, dbsnp
-    
 
-def fetch_tommo(transcript_id, cds_change, alt, dbsnp):
+
+def fetch_genebe_batch(transcript_cds_pairs):
+    """Resolve and annotate all transcript:cDNA pairs of a report with GeneBe in one pass"""
+
+    grc = "hg38"
+    empty = (None, None, None, None, None, None, None)
+
+    # 重複を除いた HGVS のリストを作成（入力順を保持）
+    pairs = list(dict.fromkeys(transcript_cds_pairs))
+    results = {pair: empty for pair in pairs}
+
+    # キャッシュ済みのものは問い合わせ対象から除外
+    for pair in list(pairs):
+        cached = annotation_cache.get('genebe', f'{pair[0]}:{pair[1]}', grc)
+        if cached is not None:
+            results[pair] = tuple(cached)
+    pairs = [pair for pair in pairs if results[pair] is empty]
+    if not pairs:
+        return results
+    hgvs_list = [f'{transcript_id}:{cds_change}' for transcript_id, cds_change in pairs]
+
+    # gnb.parse_variants を使って HGVS 形式から chr-pos-ref-alt を一括取得
+    try:
+        parsed = gnb.parse_variants(hgvs_list, genome=grc, progress=False, ignore_errors=True)
+    except Exception as e:
+        print(f"[GeneBe parse_variants error] {e} - {len(hgvs_list)} variants")
+        return results
+
+    parsed_pairs = {}
+    for pair, hgvs, variant in zip(pairs, hgvs_list, parsed):
+        if not variant:
+            print(f"[GeneBe parse_variants] Could not parse: {hgvs}")
+            continue
+        if len(variant.split('-')) != 4:
+            print(f"[GeneBe parse_variants] Unexpected format: {variant}")
+            continue
+        parsed_pairs[pair] = variant
+    if not parsed_pairs:
+        return results
+
+    # 解析できたバリアントをまとめてアノテーション
+    variants = list(dict.fromkeys(parsed_pairs.values()))
+    try:
+        genebe_list = gnb.annotate_variants_list(variants, flatten_consequences=False, genome=grc, progress_bar=False)
+    except Exception as e:
+        print(f"[GeneBe annotate error] {e} - {len(variants)} variants")
+        return results
+    annotations = dict(zip(variants, genebe_list))
+
+    for pair, variant in parsed_pairs.items():
+        chromosome, position, ref, alt = variant.split('-')
+        chromosome = chromosome.replace('chr', '')
+        annotation = annotations.get(variant)
+        genebe_json = [annotation] if annotation else None
+        dbsnp = annotation.get('dbsnp') if annotation else None
+        results[pair] = (genebe_json, variant, chromosome, position, ref, alt, dbsnp)
+        if genebe_json:
+            annotation_cache.set('genebe', f'{pair[0]}:{pair[1]}', list(results[pair]), grc)
+
+    return results
+
+
+def fetch_tommo(transcript_id, cds_change, alt, dbsnp, variant=None):
+    # ローカルの頻度VCFを優先し、dbSNP ページの取得は予備として使う
+    mode = local_frequency_mode()
+    if mode:
+        found = frequency_store.lookup(variant)
+        if found:
+            return f"{round(found[1] * 100, 2)}%"
+        if mode == 'local':
+            return "-"
+
+    cache_key = f'{transcript_id}:{cds_change}|{alt}|{dbsnp}'
+    cached = annotation_cache.get('tommo', cache_key)
+    if cached is not None:
+        return cached
+    frequency = _fetch_tommo(transcript_id, cds_change, alt, dbsnp)
+    # 取得失敗と区別できないため "-" はキャッシュしない
+    if frequency != "-":
+        annotation_cache.set('tommo', cache_key, frequency)
+    return frequency
+
+
+def _fetch_tommo(transcript_id, cds_change, alt, dbsnp):
     url = f'{Hyperlink.DBSNP_LINK}{transcript_id}:{cds_change}'
     url_dbsnp = f'{Hyperlink.DBSNP_LINK}{dbsnp}'
 
@@ -73,14 +163,14 @@ def fetch_tommo(transcript_id, cds_change, alt, dbsnp):
         return "-"
 
     try:
-        r = requests.get(url)
+        r = host_limiter.get(url)
         r.raise_for_status()
         soup = BeautifulSoup(r.text, 'html.parser')
         supp_section = soup.find(class_="supp")
         if supp_section:
             return extract_frequency(supp_section.get_text(strip=True), url)
 
-        r_dbsnp = requests.get(url_dbsnp)
+        r_dbsnp = host_limiter.get(url_dbsnp)
         r_dbsnp.raise_for_status()
         soup_dbsnp = BeautifulSoup(r_dbsnp.text, 'html.parser')
         supp_section_dbsnp = soup_dbsnp.find(class_="supp")
@@ -93,17 +183,43 @@ def fetch_tommo(transcript_id, cds_change, alt, dbsnp):
 
 
 
-def fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp):
+def fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp, variant=None):
     """Fetch ClinVar data and pathogenicity using Entrez API"""
+    # ローカルの ClinVar ストアを使う設定であればネットワークに問い合わせない
+    if use_local_clinvar():
+        return clinvar_store.lookup(transcript_id, cds_change, dbsnp, variant)
+    cache_key = f'{transcript_id}:{cds_change}|{dbsnp}'
+    cached = annotation_cache.get('clinvar', cache_key)
+    if cached is not None:
+        return tuple(cached)
+    clinvar_data = _fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp)
+    annotation_cache.set('clinvar', cache_key, list(clinvar_data))
+    return clinvar_data
+
 
+def _normalize_cds_change(cds_change):
+    # ClinVar の variant_name 検索用に挿入・欠失以降の塩基表記を除く
     if 'delins' in cds_change:
-        cds_change = cds_change.split('delins')[0] + 'delins'
+        return cds_change.split('delins')[0] + 'delins'
     elif 'dup' in cds_change:
-        cds_change = cds_change.split('dup')[0] + 'dup'
+        return cds_change.split('dup')[0] + 'dup'
     elif 'del' in cds_change:
-        cds_change = cds_change.split('del')[0] + 'del'
+        return cds_change.split('del')[0] + 'del'
     elif 'ins' in cds_change:
-        cds_change = cds_change.split('ins')[0] + 'ins'
+        return cds_change.split('ins')[0] + 'ins'
+    return cds_change
+
+
+def _clinvar_classification(summary, clinvar_id):
+    germline_sig = summary.get("germline_classification", {}).get("description", "NA")
+    germline_status = summary.get("germline_classification", {}).get("review_status", "NA")
+    somatic_sig = summary.get("oncogenicity_classification", {}).get("description", "NA")
+    somatic_status = summary.get("oncogenicity_classification", {}).get("review_status", "NA")
+    return germline_sig, germline_status, somatic_sig, somatic_status, clinvar_id
+
+
+def _fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp):
+    cds_change = _normalize_cds_change(cds_change)
 
     def fetch_clinvar_id(query):
         base_url = Hyperlink.CLINVAR_SEARCH
@@ -112,7 +228,9 @@ def fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp):
             "term": query,
             "retmode": "json"
         }
-        response = requests.get(base_url, params=params)
+        if RateLimit.NCBI_API_KEY:
+            params["api_key"] = RateLimit.NCBI_API_KEY
+        response = host_limiter.get(base_url, params=params)
         if response.status_code != 200:
             raise Exception(f"Error fetching data from ClinVar: {response.status_code}")
         data = response.json()
@@ -137,7 +255,9 @@ def fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp):
             "id": clinvar_id,
             "retmode": "json"
         }
-        response = requests.get(url, params=params)
+        if RateLimit.NCBI_API_KEY:
+            params["api_key"] = RateLimit.NCBI_API_KEY
+        response = host_limiter.get(url, params=params)
         if response.status_code != 200:
             continue  # 次のIDを試す
 
@@ -147,17 +267,239 @@ def fetch_clinvar(transcript_id, gene_symbol, cds_change, dbsnp):
         cdna_change = variation_set[0].get("cdna_change", "NA") if variation_set else "NA"
 
         if cds_change in cdna_change:
-            germline_sig = summary.get("germline_classification", {}).get("description", "NA")
-            germline_status = summary.get("germline_classification", {}).get("review_status", "NA")
-            somatic_sig = summary.get("oncogenicity_classification", {}).get("description", "NA")
-            somatic_status = summary.get("oncogenicity_classification", {}).get("review_status", "NA")
-            return germline_sig, germline_status, somatic_sig, somatic_status, clinvar_id
+            return _clinvar_classification(summary, clinvar_id)
 
     # 該当するcds_changeがなかった場合でも最後のClinVar IDの情報を返す
     summary = response.json().get("result", {}).get(clinvar_id, {})
-    germline_sig = summary.get("germline_classification", {}).get("description", "NA")
-    germline_status = summary.get("germline_classification", {}).get("review_status", "NA")
-    somatic_sig = summary.get("oncogenicity_classification", {}).get("description", "NA")
-    somatic_status = summary.get("oncogenicity_classification", {}).get("review_status", "NA")
-    
-    return germline_sig, germline_status, somatic_sig, somatic_status, clinvar_id
+    return _clinvar_classification(summary, clinvar_id)
+
+
+def fetch_clinvar_batch(transcript_cds_dbsnp_variant):
+    """Fetch ClinVar data for all variants of a report with one combined esearch on the history server
+
+    Summaries are read back by WebEnv/query_key and mapped to each variant by transcript, cDNA change and dbSNP ID.
+    Variants whose record would depend on the per-term hit order are searched one term at a time as fetch_clinvar does;
+    variants whose lookups fail are left to fetch_clinvar.
+    """
+
+    results = {}
+    pending = []
+    local = use_local_clinvar()
+    for transcript_id, cds_change, dbsnp, variant in dict.fromkeys(transcript_cds_dbsnp_variant):
+        if not transcript_id or not cds_change:
+            continue
+        if local:
+            results[(transcript_id, cds_change)] = clinvar_store.lookup(transcript_id, cds_change, dbsnp, variant)
+            continue
+        cached = annotation_cache.get('clinvar', f'{transcript_id}:{cds_change}|{dbsnp}')
+        if cached is not None:
+            results[(transcript_id, cds_change)] = tuple(cached)
+        else:
+            pending.append((transcript_id, cds_change, dbsnp))
+    if not pending:
+        return results
+
+    def store(transcript_id, cds_change, dbsnp, clinvar_data):
+        results[(transcript_id, cds_change)] = clinvar_data
+        annotation_cache.set('clinvar', f'{transcript_id}:{cds_change}|{dbsnp}', list(clinvar_data))
+
+    try:
+        # variant_name・dbSNP ID の検索語をまとめて1回の esearch に送り、結果は history server から esummary で取得
+        terms = [_variant_name_term(transcript_id, cds_change) for transcript_id, cds_change, _ in pending]
+        terms += [_dbsnp_term(dbsnp) for _, _, dbsnp in pending if dbsnp]
+        summaries = _fetch_clinvar_history(*_search_clinvar_history(terms))
+    except Exception as e:
+        # 取得できなかったバリアントは link_generator 側で個別に問い合わせる
+        print(f"[ClinVar batch error] {e} - {len(pending)} variants")
+        return results
+
+    records = _ClinVarRecords(summaries)
+    ambiguous = []
+    for transcript_id, cds_change, dbsnp in pending:
+        clinvar_data = records.match(transcript_id, _normalize_cds_change(cds_change), dbsnp)
+        if clinvar_data is None:
+            ambiguous.append((transcript_id, cds_change, dbsnp))
+        else:
+            store(transcript_id, cds_change, dbsnp, clinvar_data)
+    if not ambiguous:
+        return results
+
+    try:
+        # 候補が複数あり検索順で結果が変わるバリアントだけ、fetch_clinvar と同じく検索語ごとに esearch を実行
+        hits = _search_clinvar_ids(_variant_name_term(transcript_id, cds_change) for transcript_id, cds_change, _ in ambiguous)
+        # variant_name で見つからなかったものだけ dbSNP ID で再検索
+        hits.update(_search_clinvar_ids(
+            _dbsnp_term(dbsnp) for transcript_id, cds_change, dbsnp in ambiguous
+            if dbsnp and not hits[_variant_name_term(transcript_id, cds_change)]
+        ))
+        clinvar_ids = {}
+        for transcript_id, cds_change, dbsnp in ambiguous:
+            ids = hits[_variant_name_term(transcript_id, cds_change)]
+            if not ids and dbsnp:
+                ids = hits[_dbsnp_term(dbsnp)]
+            clinvar_ids[(transcript_id, cds_change, dbsnp)] = ids
+        missing = [uid for ids in clinvar_ids.values() for uid in ids if uid not in summaries]
+        summaries.update(_fetch_clinvar_summaries(list(dict.fromkeys(missing))))
+    except Exception as e:
+        print(f"[ClinVar batch error] {e} - {len(ambiguous)} variants")
+        return results
+
+    for (transcript_id, cds_change, dbsnp), ids in clinvar_ids.items():
+        clinvar_data = _match_clinvar_summary(summaries, ids, _normalize_cds_change(cds_change))
+        if clinvar_data is not None:
+            store(transcript_id, cds_change, dbsnp, clinvar_data)
+
+    return results
+
+
+def _variant_name_term(transcript_id, cds_change):
+    return f'"{transcript_id}:{_normalize_cds_change(cds_change)}"[variant_name]'
+
+
+def _dbsnp_term(dbsnp):
+    return f'"{dbsnp}"[dbsnp_id]'
+
+
+def _eutils_params():
+    params = {"db": "clinvar", "retmode": "json"}
+    if RateLimit.NCBI_API_KEY:
+        params["api_key"] = RateLimit.NCBI_API_KEY
+    return params
+
+
+def _search_clinvar_history(terms):
+    """Run one esearch for all terms joined with OR and return (WebEnv, query_key, count) of the stored result"""
+
+    # 検索語が多いと URL が長くなるため POST で送る
+    response = host_limiter.post(Hyperlink.CLINVAR_SEARCH, data={
+        **_eutils_params(),
+        "term": " OR ".join(dict.fromkeys(terms)),
+        "usehistory": "y",
+        "retmax": 0,
+    })
+    if response.status_code != 200:
+        raise Exception(f"Error fetching data from ClinVar: {response.status_code}")
+    result = response.json().get("esearchresult", {})
+    if "ERROR" in result:
+        raise Exception(f"Error fetching data from ClinVar: {result['ERROR']}")
+    return result.get("webenv"), result.get("querykey"), int(result.get("count", 0))
+
+
+def _fetch_clinvar_history(webenv, query_key, count):
+    """{ClinVar ID: esummary record} for a search stored on the history server"""
+
+    summaries = {}
+    for start in range(0, count, RateLimit.CLINVAR_SUMMARY_RETMAX):
+        response = host_limiter.get(Hyperlink.CLINVAR_SUMMARY, params={
+            **_eutils_params(),
+            "WebEnv": webenv,
+            "query_key": query_key,
+            "retstart": start,
+            "retmax": RateLimit.CLINVAR_SUMMARY_RETMAX,
+        })
+        if response.status_code != 200:
+            raise Exception(f"Error fetching data from ClinVar: {response.status_code}")
+        result = response.json().get("result", {})
+        summaries.update((uid, result[uid]) for uid in result.get("uids", []) if uid in result)
+    return summaries
+
+
+class _ClinVarRecords:
+    """Summaries of a combined search indexed by transcript accession and dbSNP ID"""
+
+    def __init__(self, summaries):
+        self.summaries = summaries
+        self.by_transcript = {}
+        self.by_dbsnp = {}
+        for clinvar_id, summary in summaries.items():
+            variation_set = summary.get("variation_set", [])
+            if not variation_set:
+                continue
+            # 'NM_000546.6(TP53):c.743G>A (p.Arg248Gln)' -> 'NM_000546.6'
+            name = variation_set[0].get("variation_name", "")
+            transcript_id = name.split("(")[0].split(":")[0]
+            self.by_transcript.setdefault(transcript_id, []).append(clinvar_id)
+            for xref in variation_set[0].get("variation_xrefs", []):
+                if xref.get("db_source") == "dbSNP":
+                    self.by_dbsnp.setdefault(f'rs{xref.get("db_id")}', []).append(clinvar_id)
+
+    def _cdna_matches(self, clinvar_ids, cds_change):
+        matched = []
+        for clinvar_id in clinvar_ids:
+            variation_set = self.summaries[clinvar_id].get("variation_set", [])
+            cdna_change = variation_set[0].get("cdna_change", "NA") if variation_set else "NA"
+            if cds_change in cdna_change:
+                matched.append(clinvar_id)
+        return matched
+
+    def _classification(self, clinvar_id):
+        return _clinvar_classification(self.summaries[clinvar_id], clinvar_id)
+
+    def match(self, transcript_id, cds_change, dbsnp):
+        """The record fetch_clinvar would return, or None when it depends on the order of the per-term hits"""
+
+        # variant_name の一致は転写産物と cDNA 変化で判定（1件なら検索順によらず fetch_clinvar と同じ）
+        by_name = self._cdna_matches(self.by_transcript.get(transcript_id, []), cds_change)
+        if len(by_name) == 1:
+            return self._classification(by_name[0])
+        if by_name:
+            return None
+        # variant_name で見つからなければ dbSNP ID で引く
+        by_dbsnp = self.by_dbsnp.get(dbsnp if str(dbsnp).startswith('rs') else f'rs{dbsnp}', []) if dbsnp else []
+        if not by_dbsnp:
+            return "", "", "", "", ""
+        if len(by_dbsnp) == 1:
+            return self._classification(by_dbsnp[0])
+        matched = self._cdna_matches(by_dbsnp, cds_change)
+        if len(matched) == 1:
+            return self._classification(matched[0])
+        return None
+
+
+def _search_clinvar_ids(terms):
+    """{term: ClinVar IDs in esearch order} with the same query parameters as fetch_clinvar"""
+
+    base_params = _eutils_params()
+
+    hits = {}
+    for term in dict.fromkeys(terms):
+        response = host_limiter.get(Hyperlink.CLINVAR_SEARCH, params={**base_params, "term": term})
+        if response.status_code != 200:
+            raise Exception(f"Error fetching data from ClinVar: {response.status_code}")
+        hits[term] = response.json().get("esearchresult", {}).get("idlist", [])
+    return hits
+
+
+def _fetch_clinvar_summaries(clinvar_ids):
+    """{ClinVar ID: esummary record}, fetched with as few esummary calls as possible"""
+
+    base_params = _eutils_params()
+
+    summaries = {}
+    for start in range(0, len(clinvar_ids), RateLimit.CLINVAR_SUMMARY_RETMAX):
+        chunk = clinvar_ids[start:start + RateLimit.CLINVAR_SUMMARY_RETMAX]
+        response = host_limiter.post(Hyperlink.CLINVAR_SUMMARY, data={**base_params, "id": ",".join(chunk)})
+        if response.status_code != 200:
+            raise Exception(f"Error fetching data from ClinVar: {response.status_code}")
+        result = response.json().get("result", {})
+        summaries.update((uid, result[uid]) for uid in result.get("uids", []) if uid in result)
+    return summaries
+
+
+def _match_clinvar_summary(summaries, clinvar_ids, cds_change):
+    """Pick the ClinVar record for one variant from its search hits as fetch_clinvar does, or None if a summary is missing"""
+
+    if not clinvar_ids:
+        return "", "", "", "", ""
+    if any(clinvar_id not in summaries for clinvar_id in clinvar_ids):
+        return None
+
+    for clinvar_id in clinvar_ids:
+        summary = summaries[clinvar_id]
+        variation_set = summary.get("variation_set", [])
+        cdna_change = variation_set[0].get("cdna_change", "NA") if variation_set else "NA"
+        if cds_change in cdna_change:
+            return _clinvar_classification(summary, clinvar_id)
+
+    # 該当するcds_changeがなかった場合でも最後のClinVar IDの情報を返す
+    return _clinvar_classification(summaries[clinvar_ids[-1]], clinvar_ids[-1])
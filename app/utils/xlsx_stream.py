@@ -0,0 +1,50 @@
+import datetime
+import math
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+
+# DataFrame.to_excel と同じ見出し書式
+HEADER_FORMAT = {'bold': True, 'border': 1, 'align': 'center', 'valign': 'top'}
+
+
+def _xlsx_value(value):
+    # 欠損値は空セル、それ以外は pandas の xlsxwriter 出力と同じ型で書き込む
+    if value is None or value is pd.NaT or value is pd.NA:
+        return None
+    if isinstance(value, (bool, np.bool_)):
+        return bool(value)
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        if math.isnan(value):
+            return None
+        # to_excel の inf_rep と同じく無限大は文字列で出力
+        if math.isinf(value):
+            return 'inf' if value > 0 else '-inf'
+        return float(value)
+    if isinstance(value, (str, datetime.date, datetime.time)):
+        return value
+    return str(value)
+
+
+def write_frames(output, frames, constant_memory=True):
+    """Write {sheet name: DataFrame} to output like DataFrame.to_excel(index=False), one row at a time
+
+    With constant_memory each row is flushed when the next one starts, so memory use does not grow with the row count.
+    """
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': constant_memory,
+        'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+    })
+    header_format = workbook.add_format(HEADER_FORMAT)
+    for sheet_name, df in frames.items():
+        worksheet = workbook.add_worksheet(sheet_name)
+        worksheet.write_row(0, 0, [str(column) for column in df.columns], header_format)
+        # constant_memory では行の順に書き込む必要があるため行単位で出力
+        for r_idx, row in enumerate(df.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(r_idx, 0, [_xlsx_value(value) for value in row])
+    workbook.close()
+    return output
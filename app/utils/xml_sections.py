@@ -0,0 +1,68 @@
+import xml.etree.ElementTree as ET
+
+
+def _qualify(tag, namespaces):
+    # 'vr:short-variant' -> '{名前空間URI}short-variant'
+    if namespaces and ':' in tag:
+        prefix, local = tag.split(':', 1)
+        return f'{{{namespaces[prefix]}}}{local}'
+    return tag
+
+
+def _path_steps(paths, namespaces):
+    patterns = []
+    for path in paths:
+        if not path.startswith('.//'):
+            raise ValueError(f"Unsupported path: {path}")
+        patterns.append((path, tuple(_qualify(step, namespaces) for step in path[len('.//'):].split('/'))))
+    return patterns
+
+
+def _by_last_step(patterns):
+    by_last = {}
+    for path, steps in patterns:
+        by_last.setdefault(steps[-1], []).append((path, steps))
+    return by_last
+
+
+def _matches(by_last, tags):
+    # 末尾のタグが一致するパスだけを照合（先頭の要素 root は findall と同じく対象外）
+    return [
+        path for path, steps in by_last.get(tags[-1], ())
+        if len(tags) > len(steps) and tuple(tags[-len(steps):]) == steps
+    ]
+
+
+def iter_sections(source, paths, namespaces=None, start_paths=()):
+    """Read source (a file object or path) with iterparse and yield (path, element) as each element matching a './/a/b/...' path ends
+
+    Yielded elements are complete. Once consumed they, and everything read outside a match, are dropped from the tree,
+    so memory is bounded by the largest matching element rather than the whole document.
+    Elements matching start_paths are yielded when they start, with only their attributes read, and their contents are not kept.
+    """
+    patterns = _by_last_step(_path_steps(paths, namespaces))
+    start_patterns = _by_last_step(_path_steps(start_paths, namespaces))
+
+    tags = []
+    stack = []
+    open_matches = 0
+    for event, elem in ET.iterparse(source, events=('start', 'end')):
+        if event == 'start':
+            tags.append(elem.tag)
+            for path in _matches(start_patterns, tags):
+                yield path, elem
+            matched = _matches(patterns, tags)
+            stack.append((elem, matched))
+            if matched:
+                open_matches += 1
+            continue
+
+        tags.pop()
+        elem, matched = stack.pop()
+        if matched:
+            open_matches -= 1
+            for path in matched:
+                yield path, elem
+        # 一致した要素の内側は親要素の処理まで残し、それ以外は読み終えた時点で木から外す
+        if stack and open_matches == 0:
+            stack[-1][0].remove(elem)